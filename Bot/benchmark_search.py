@@ -0,0 +1,193 @@
+"""Бенчмарк поиска соревнований в боте.
+
+Заполняет базу синтетическими соревнованиями (по умолчанию 50 000) в транзакции,
+сравнивает задержку прежних запросов поиска (CTE по всем соревнованиям, дисциплина
+по названию и формат, подставленный в текст запроса) и текущих (search_competitions,
+дисциплина по ID из справочника), затем откатывает данные.
+
+Запуск:
+```shell
+python benchmark_search.py --competitions 50000 --repeat 200
+```
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import asyncpg
+
+from bot import ALL_REGIONS_COUNT, DB_CONFIG, search_competitions
+
+DISCIPLINES = 5
+
+SEED_COMPETITIONS = '''
+INSERT INTO win_competition (
+    max_participants, max_participants_in_team, min_age, max_age, name,
+    competition_type, status, discipline_id, description, type, permissions
+)
+SELECT 100, 5, (g / 13) % 18, 100, 'Бенчмарк ' || g,
+       (ARRAY['online', 'offline'])[1 + g % 2],
+       (ARRAY['pending', 'waiting', 'registration', 'running', 'finished'])[1 + (g / 3) % 5],
+       ($2::bigint[])[1 + (g / 7) % array_length($2::bigint[], 1)],
+       '', (ARRAY['individual', 'team'])[1 + (g / 2) % 2],
+       CASE g % 3
+           WHEN 0 THEN '[]'::jsonb
+           WHEN 1 THEN jsonb_build_array($3::bigint)
+           ELSE (SELECT jsonb_agg(i) FROM generate_series(1, $4::int) i)
+       END
+FROM generate_series(1, $1::int) g
+'''
+
+SEED_DATES = '''
+INSERT INTO win_competitiondate (competition_id, registration_start, registration_end, start_date, end_date)
+SELECT wc.id, now() - interval '14 days', now() - interval '1 day', now(), now() + interval '2 days'
+FROM win_competition wc
+WHERE wc.discipline_id = ANY($1::bigint[])
+'''
+
+# Запросы поиска до перехода на search_competitions
+LEGACY_REGIONAL_SQL = '''
+with comp as
+(SELECT wc.id,
+wc.max_participants, wc.max_participants_in_team,
+wc.min_age, wc.max_age, wc."name", wc.competition_type,
+wc.status, wc.description, wc."type", wc.permissions, wd."name" AS discipline,
+win_competitiondate.start_date, win_competitiondate.end_date,
+win_competitiondate.registration_start, win_competitiondate.registration_end
+FROM win_competition wc
+LEFT JOIN win_discipline wd
+ON wc.discipline_id = wd.id
+LEFT JOIN win_competitiondate
+ON wc.id = win_competitiondate.competition_id)
+SELECT
+c.max_participants, c.max_participants_in_team,
+c.min_age, c.max_age, c.name, c.competition_type,
+c.status, c.description, c."type", c.discipline,
+c.start_date, c.end_date, c.registration_start, c.registration_end
+FROM comp c
+WHERE c.permissions @> jsonb_build_array((select id from win_region where "name" = $1)) and c.discipline = $2 and c.competition_type IN {format} and c.min_age<=$3 and c.type = $4;
+'''
+
+LEGACY_ALL_REGIONS_SQL = '''
+with comp as
+(SELECT wc.id,
+wc.max_participants, wc.max_participants_in_team,
+wc.min_age, wc.max_age, wc."name", wc.competition_type,
+wc.status, wc.description, wc."type", wc.permissions, wd."name" AS discipline,
+win_competitiondate.start_date, win_competitiondate.end_date,
+win_competitiondate.registration_start, win_competitiondate.registration_end
+FROM win_competition wc
+LEFT JOIN win_discipline wd
+ON wc.discipline_id = wd.id
+LEFT JOIN win_competitiondate
+ON wc.id = win_competitiondate.competition_id)
+SELECT
+c.max_participants, c.max_participants_in_team,
+c.min_age, c.max_age, c.name, c.competition_type,
+c.status, c.description, c."type", c.discipline, c.permissions,
+c.start_date, c.end_date, c.registration_start, c.registration_end,
+jsonb_array_length(c.permissions) as count_reg
+FROM comp c
+WHERE
+jsonb_array_length(c.permissions) in (0, $4)
+AND c.discipline = $1
+AND c.competition_type IN {format}
+AND c.min_age <= $2
+AND c.type = $3;
+'''
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_format(formats):
+    return "(" + ",".join(f"'{value}'" for value in formats) + ")"
+
+
+async def legacy_search(conn, discipline, formats, age, type_, region=None):
+    format = legacy_format(formats)
+    if region is not None:
+        return await conn.fetch(LEGACY_REGIONAL_SQL.format(format=format), region, discipline, age, type_)
+    return await conn.fetch(LEGACY_ALL_REGIONS_SQL.format(format=format), discipline, age, type_, ALL_REGIONS_COUNT)
+
+
+async def seed(conn, competitions):
+    """Создаёт дисциплины, регион и соревнования с датами; возвращает (дисциплины, регион)"""
+    suffix = random.randrange(10 ** 9)
+    disciplines = await conn.fetch(
+        "INSERT INTO win_discipline (name) SELECT 'Бенчмарк ' || $1::text || ' ' || g "
+        "FROM generate_series(1, $2::int) g RETURNING id, name",
+        str(suffix), DISCIPLINES
+    )
+    region = await conn.fetchrow(
+        "INSERT INTO win_region (name) VALUES ($1) RETURNING id, name", f'Бенчмарк {suffix}'
+    )
+    discipline_ids = [row['id'] for row in disciplines]
+    await conn.execute(SEED_COMPETITIONS, competitions, discipline_ids, region['id'], ALL_REGIONS_COUNT)
+    await conn.execute(SEED_DATES, discipline_ids)
+    await conn.execute("ANALYZE win_competition")
+    await conn.execute("ANALYZE win_competitiondate")
+    await conn.execute("ANALYZE win_discipline")
+    return disciplines, region
+
+
+async def measure(search, params):
+    """Задержки (мс) поиска по каждому набору параметров"""
+    timings = []
+    for args in params:
+        started = time.perf_counter()
+        await search(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+async def main(competitions, repeat, dsn=None):
+    config = {'dsn': dsn} if dsn else DB_CONFIG
+    pool = await asyncpg.create_pool(**config, min_size=1, max_size=1)
+    try:
+        async with pool.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    print(f"Заполнение: {competitions} соревнований...")
+                    disciplines, region = await seed(conn, competitions)
+
+                    rnd = random.Random(0)
+                    params = []
+                    for _ in range(repeat):
+                        formats = rnd.choice([['online'], ['offline'], ['online', 'offline']])
+                        regional = rnd.random() < 0.5
+                        params.append((
+                            rnd.choice(disciplines), formats, rnd.randint(10, 30),
+                            rnd.choice(['individual', 'team']), regional
+                        ))
+
+                    variants = [
+                        ('прежний поиск', lambda d, f, a, t, regional: legacy_search(
+                            conn, d['name'], f, a, t, region['name'] if regional else None)),
+                        ('search_competitions', lambda d, f, a, t, regional: search_competitions(
+                            conn, d['id'], f, a, t, region['id'] if regional else None)),
+                    ]
+                    print(f"{'вариант':<24}{'p50, мс':>10}{'p95, мс':>10}{'среднее, мс':>14}")
+                    for name, search in variants:
+                        await measure(search, params[:10])  # прогрев и подготовка запросов
+                        timings = await measure(search, params)
+                        p95 = timings[int(len(timings) * 0.95) - 1]
+                        print(f"{name:<24}{statistics.median(timings):>10.2f}{p95:>10.2f}{statistics.mean(timings):>14.2f}")
+                    raise Rollback
+            except Rollback:
+                pass
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска соревнований в боте")
+    parser.add_argument('--competitions', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--dsn', help="Строка подключения вместо DB_CONFIG из bot.py")
+    args = parser.parse_args()
+    asyncio.run(main(args.competitions, args.repeat, args.dsn))
@@ -17,6 +17,10 @@ import asyncpg
 from telegram import ReplyKeyboardMarkup, Update, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, ConversationHandler
 
+from bot_app import BotNewsletter
+from outbox import run_outbox, stop_outbox
+from reference import ReferenceCache
+
 # Параметры подключения к PostgreSQL
 DB_CONFIG = {
     "database": "sbp",
@@ -26,19 +30,134 @@ DB_CONFIG = {
     "port": "5432"
 }
 
+# Пул соединений создаётся один раз при запуске бота (on_startup) и закрывается
+# при остановке (on_shutdown); обработчики берут соединения из него
+DB_POOL_CONFIG = {
+    "min_size": 2,
+    "max_size": 10,                          # не больше соединений с PostgreSQL при любой нагрузке
+    "statement_cache_size": 256,             # подготовленные запросы кэшируются на каждом соединении
+    "max_inactive_connection_lifetime": 300, # простаивающие соединения закрываются через 5 минут
+    "command_timeout": 30,
+}
+DB_POOL_CLOSE_TIMEOUT = 10  # секунды на завершение запросов при остановке
+
+# Соревнование открыто для всех регионов, если в permissions перечислены все
+# (то же, что Competition.ALL_REGIONS_COUNT в Django-приложении)
+ALL_REGIONS_COUNT = 89
+
+# Справочники регионов и дисциплин хранятся в памяти и перечитываются раз в 5 минут
+REFERENCE_REFRESH_INTERVAL = 300
+
+# Значки дисциплин на клавиатуре опроса (дисциплины без значка выводятся без него)
+DISCIPLINE_ICONS = {
+    "Продуктовое программирование": "🧑‍💻",
+    "Программирование систем информационной безопасности": "🛡️",
+    "Программирование робототехники": "🤖",
+    "Программирование алгоритмическое": "🧠",
+    "Программирование БАС": "✈️",
+}
 
 
 QUESTION_1, QUESTION_2, QUESTION_3, QUESTION_4, QUESTION_5, QUESTION_6 = range(6)
 
+
+def get_pool(context: ContextTypes.DEFAULT_TYPE) -> asyncpg.Pool:
+    """Пул соединений приложения (создаётся в on_startup)"""
+    return context.application.bot_data['db_pool']
+
+
+def get_reference(context: ContextTypes.DEFAULT_TYPE) -> ReferenceCache:
+    """Справочники регионов и дисциплин (загружаются в on_startup)"""
+    return context.application.bot_data['reference']
+
+
+def discipline_keyboard(reference: ReferenceCache):
+    """Клавиатура выбора дисциплины по справочнику, по две кнопки в ряд"""
+    buttons = [
+        f"{DISCIPLINE_ICONS[name]} {name}" if name in DISCIPLINE_ICONS else name
+        for name in sorted(reference.disciplines.values())
+    ]
+    return [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+
+
+# Статусы соревнований, которые показываются в поиске (не на модерации и не завершённые)
+SEARCH_STATUSES = ['waiting', 'registration', 'running']
+# Не больше стольких ближайших соревнований (по одному сообщению на каждое);
+# если найдено больше, пользователю сообщается, что показаны не все
+SEARCH_LIMIT = 20
+
+# Запросы поиска соревнований. Текст запросов не зависит от ответов пользователя,
+# поэтому asyncpg подготавливает каждый один раз на соединение (statement_cache_size),
+# а все фильтры - параметры, в т.ч. массивы (= ANY($n)). Дисциплина передаётся
+# по ID из справочника, поэтому win_discipline в запросе не нужна
+SEARCH_COLUMNS = '''
+SELECT wc.max_participants, wc.max_participants_in_team,
+       wc.min_age, wc.max_age, wc.name, wc.competition_type,
+       wc.status, wc.description, wc.type,
+       jsonb_array_length(wc.permissions) AS count_reg,
+       cd.start_date, cd.end_date, cd.registration_start, cd.registration_end
+FROM win_competition wc
+JOIN win_competitiondate cd ON cd.competition_id = wc.id
+WHERE wc.discipline_id = $1
+  AND wc.competition_type = ANY($2::varchar[])
+  AND wc.min_age <= $3
+  AND wc.type = $4
+  AND wc.status = ANY($5::varchar[])
+'''
+
+# Соревнования, открытые для региона (GIN-индекс по permissions)
+SEARCH_REGIONAL_SQL = SEARCH_COLUMNS + '''
+  AND wc.permissions @> jsonb_build_array($6::bigint)
+ORDER BY cd.start_date
+LIMIT $7
+'''
+
+# Закрытые (пустой permissions) и всероссийские (все регионы) соревнования
+SEARCH_ALL_REGIONS_SQL = SEARCH_COLUMNS + '''
+  AND jsonb_array_length(wc.permissions) = ANY($6::int[])
+ORDER BY cd.start_date
+LIMIT $7
+'''
+
+
+async def search_competitions(pool: asyncpg.Pool, discipline_id: int, formats: list, age: int,
+                              type_: str, region_id: int = None):
+    """Поиск соревнований по ответам опроса.
+    
+    Args:
+        pool: Пул соединений приложения
+        discipline_id: ID дисциплины (ReferenceCache.discipline_id)
+        formats: Форматы проведения (online/offline)
+        age: Возраст участника
+        type_: Тип соревнований (individual/team)
+        region_id: ID региона для региональных соревнований, иначе - всероссийские и закрытые
+        
+    Returns:
+        tuple: (до SEARCH_LIMIT найденных соревнований, ближайшие первыми;
+            True, если найдено больше и список обрезан)
+
+    Note:
+        pool.fetch возвращает соединение в пул сразу после запроса, поэтому
+        результаты отправляются пользователю без занятого соединения.
+    """
+    # Одна лишняя строка показывает, что найдено больше SEARCH_LIMIT
+    if region_id is not None:
+        rows = await pool.fetch(
+            SEARCH_REGIONAL_SQL, discipline_id, formats, age, type_, SEARCH_STATUSES, region_id, SEARCH_LIMIT + 1
+        )
+    else:
+        rows = await pool.fetch(
+            SEARCH_ALL_REGIONS_SQL, discipline_id, formats, age, type_, SEARCH_STATUSES,
+            [0, ALL_REGIONS_COUNT], SEARCH_LIMIT + 1
+        )
+    return rows[:SEARCH_LIMIT], len(rows) > SEARCH_LIMIT
+
+
 async def find_competitions_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало опроса - первый вопрос"""
     context.user_data['answers'] = {}
     
-    keyboard = [
-        ["🧑‍💻 Продуктовое программирование", "🛡️ Программирование систем информационной безопасности"],
-        ["🤖 Программирование робототехники", "🧠 Программирование алгоритмическое"],
-        ["✈️ Программирование БАС"]
-    ]
+    keyboard = discipline_keyboard(get_reference(context))
     await update.message.reply_text(
         "🏆 Давай найдем подходящие соревнования!\n"
         "Какая дисциплина тебя интересует?",
@@ -48,7 +167,16 @@ async def find_competitions_start(update: Update, context: ContextTypes.DEFAULT_
 
 async def handle_question_1(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка первого вопроса"""
-    context.user_data['answers']['discipline'] = update.message.text
+    reference = get_reference(context)
+    discipline_id = reference.discipline_id(update.message.text)
+    if discipline_id is None:
+        await update.message.reply_text(
+            "Выберите дисциплину на клавиатуре:",
+            reply_markup=ReplyKeyboardMarkup(discipline_keyboard(reference), resize_keyboard=True, one_time_keyboard=True)
+        )
+        return QUESTION_1
+    context.user_data['answers']['discipline'] = reference.disciplines[discipline_id]
+    context.user_data['answers']['discipline_id'] = discipline_id
     
     keyboard = [["💻 Онлайн", "🏟️ Офлайн", "✨ Все"]]
     await update.message.reply_text(
@@ -113,36 +241,26 @@ async def handle_question_5(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_question_6(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка вопроса о регионе (только для региональных)"""
-    region = update.message.text
-    conn = await asyncpg.connect(**DB_CONFIG)
-    try:
-        # Здесь ваша логика запроса к базе данных
-        reg_ = await conn.fetch(
-            "SELECT * FROM win_region WHERE name = $1", 
-            region
-        )
-        print(reg_)
-        if reg_:
-            context.user_data['answers']['region'] = update.message.text
-            return await finish_questionnaire(update, context)
-        else:
-            await update.message.reply_text("Вы ввели неверное название региона.\nВведите заново (например: Республика Татарстан):")
-            return QUESTION_6
-    finally:
-        await conn.close()
+    # Регион ищется в справочнике в памяти: без учёта регистра и с допуском опечаток
+    region = get_reference(context).match_region(update.message.text)
+    if region is not None:
+        context.user_data['answers']['region_id'], context.user_data['answers']['region'] = region
+        return await finish_questionnaire(update, context)
+    else:
+        await update.message.reply_text("Вы ввели неверное название региона.\nВведите заново (например: Республика Татарстан):")
+        return QUESTION_6
     
 
 async def finish_questionnaire(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Завершение опроса и вывод результатов"""
     answers = context.user_data['answers']
-    discipline = re.sub(r'[^\w\s]', '', answers['discipline']).strip()
     format = answers['format']
     if format == 'Онлайн':
-        format = "('online')"
+        formats = ['online']
     elif format == 'Офлайн':
-        format = "('offline')"
+        formats = ['offline']
     else:
-        format = "('online','offline')"
+        formats = ['online', 'offline']
     scale = answers['scale']
     age = int(answers['age'])
     type_ = answers['type']
@@ -170,110 +288,55 @@ async def finish_questionnaire(update: Update, context: ContextTypes.DEFAULT_TYP
         f"{report}\n\nИщем подходящие варианты...",
         reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     )
-    print(discipline,format,int(age),type_)
-    print('гружу')
-    conn = await asyncpg.connect(**DB_CONFIG)
-    print('загрузил')
-    print(discipline)
-    try:
-        if 'region' in answers:
-            region = answers['region']
-            search_comp = await conn.fetch(
-            f'''
-with comp as
-(SELECT wc.id,
-wc.max_participants, wc.max_participants_in_team,
-wc.min_age, wc.max_age, wc."name", wc.competition_type,
-wc.status, wc.description, wc."type", wc.permissions, wd."name" AS discipline,
-win_competitiondate.start_date, win_competitiondate.end_date,
-win_competitiondate.registration_start, win_competitiondate.registration_end
-FROM win_competition wc
-LEFT JOIN win_discipline wd
-ON wc.discipline_id = wd.id
-LEFT JOIN win_competitiondate
-ON wc.id = win_competitiondate.competition_id)   
-SELECT 
-c.max_participants, c.max_participants_in_team,
-c.min_age, c.max_age, c.name, c.competition_type,
-c.status, c.description, c."type", c.discipline,
-c.start_date, c.end_date, c.registration_start, c.registration_end
-FROM comp c
-WHERE c.permissions @> to_jsonb((select id from win_region where "name" = $1)) and c.discipline = $2 and c.competition_type IN {format} and c.min_age<=$3 and c.type = $4; 
-        ''', 
-            region, discipline, age, type_
-            )
-            if len(search_comp)!=0:
-                for competition in search_comp:
-                    print(type(competition['start_date']))
-                    start_date = competition['start_date'].strftime("%d.%m.%Y %H:%M")
-                    end_date = competition['end_date'].strftime("%d.%m.%Y %H:%M")
-                    registration_start = competition['registration_start'].strftime("%d.%m.%Y %H:%M")
-                    registration_end = competition['registration_end'].strftime("%d.%m.%Y %H:%M")
-                    message = f'''🔥 <b>{competition['name']}</b> (<i>{competition['description']}</i>)\n
+    # Сначала весь результат поиска (соединение уже свободно), затем отправка сообщений
+    search_comp, truncated = await search_competitions(
+        get_pool(context), answers['discipline_id'], formats, age, type_, answers.get('region_id')
+    )
+    if 'region' in answers:
+        if len(search_comp)!=0:
+            for competition in search_comp:
+                start_date = competition['start_date'].strftime("%d.%m.%Y %H:%M")
+                end_date = competition['end_date'].strftime("%d.%m.%Y %H:%M")
+                registration_start = competition['registration_start'].strftime("%d.%m.%Y %H:%M")
+                registration_end = competition['registration_end'].strftime("%d.%m.%Y %H:%M")
+                message = f'''🔥 <b>{competition['name']}</b> (<i>{competition['description']}</i>)\n
 📅 <b>Дата проведения:</b> {start_date} - {end_date}
 ⏳ <b>Регистрация:</b> {registration_start} - {registration_end}
-                    '''
-                    if type_ == 'team':
-                        message += f'''
+                '''
+                if type_ == 'team':
+                    message += f'''
 \n👥 <b>Состав команды:</b> {competition["max_participants_in_team"]} человек'''
-                    message += '''
+                message += '''
 \n\n🔗 Переходи на <a href="https://www.codedepartament.ru">сайт</a> и принимай участие!'''
-                    await update.message.reply_text(message,reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),parse_mode='HTML')
-            else:
-                await update.message.reply_text('По вашему запросу соревнования не найдены.',reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
+                await update.message.reply_text(message,reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),parse_mode='HTML')
         else:
-            print(format)
-            search_comp = await conn.fetch(
-            f'''
-with comp as
-(SELECT wc.id,
-wc.max_participants, wc.max_participants_in_team,
-wc.min_age, wc.max_age, wc."name", wc.competition_type,
-wc.status, wc.description, wc."type", wc.permissions, wd."name" AS discipline,
-win_competitiondate.start_date, win_competitiondate.end_date,
-win_competitiondate.registration_start, win_competitiondate.registration_end
-FROM win_competition wc
-LEFT JOIN win_discipline wd
-ON wc.discipline_id = wd.id
-LEFT JOIN win_competitiondate
-ON wc.id = win_competitiondate.competition_id)
-SELECT 
-c.max_participants, c.max_participants_in_team,
-c.min_age, c.max_age, c.name, c.competition_type,
-c.status, c.description, c."type", c.discipline, c.permissions,
-c.start_date, c.end_date, c.registration_start, c.registration_end,
-jsonb_array_length(c.permissions) as count_reg
-FROM comp c
-WHERE 
-jsonb_array_length(c.permissions) in (0,89)
-AND c.discipline = $1 
-AND c.competition_type IN {format} 
-AND c.min_age <= $2 
-AND c.type = $3; 
-            ''', 
-            discipline, age, type_
-            )
-            if len(search_comp)!=0:
-                for competition in search_comp:
-                    start_date = competition['start_date'].strftime("%d.%m.%Y %H:%M")
-                    end_date = competition['end_date'].strftime("%d.%m.%Y %H:%M")
-                    registration_start = competition['registration_start'].strftime("%d.%m.%Y %H:%M")
-                    registration_end = competition['registration_end'].strftime("%d.%m.%Y %H:%M")
-                    message = f'''🔥 <b>{competition['name']}</b> (<i>{competition['description']}</i>)\n
+            await update.message.reply_text('По вашему запросу соревнования не найдены.',reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
+    else:
+        if len(search_comp)!=0:
+            for competition in search_comp:
+                start_date = competition['start_date'].strftime("%d.%m.%Y %H:%M")
+                end_date = competition['end_date'].strftime("%d.%m.%Y %H:%M")
+                registration_start = competition['registration_start'].strftime("%d.%m.%Y %H:%M")
+                registration_end = competition['registration_end'].strftime("%d.%m.%Y %H:%M")
+                message = f'''🔥 <b>{competition['name']}</b> (<i>{competition['description']}</i>)\n
 📅 <b>Дата проведения:</b> {start_date} - {end_date}
 ⏳ <b>Регистрация:</b> {registration_start} - {registration_end}\n'''
-                    if type_ == 'team':
-                        message += f'''
+                if type_ == 'team':
+                    message += f'''
 👥 <b>Состав команды:</b> {competition["max_participants_in_team"]} человек'''
-                    if competition['count_reg'] == 0:
-                        message += f'''
+                if competition['count_reg'] == 0:
+                    message += f'''
 \n‼️<b>Соревнования закрытые. Обратитесь к региональному представителю.</b>'''
-                    message += '\n\n🔗 Переходи на <a href="https://www.codedepartament.ru">сайт</a> и принимай участие!'
-                    await update.message.reply_text(message,reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),parse_mode='HTML')
-            else:
-                await update.message.reply_text('По вашему запросу соревнования не найдены.',reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
-    finally:
-        await conn.close()
+                message += '\n\n🔗 Переходи на <a href="https://www.codedepartament.ru">сайт</a> и принимай участие!'
+                await update.message.reply_text(message,reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),parse_mode='HTML')
+        else:
+            await update.message.reply_text('По вашему запросу соревнования не найдены.',reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
+    if truncated:
+        await update.message.reply_text(
+            f'Показаны {SEARCH_LIMIT} ближайших соревнований, найдено больше. '
+            'Уточните запрос или посмотрите все на <a href="https://www.codedepartament.ru">сайте</a>.',
+            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True), parse_mode='HTML'
+        )
     return ConversationHandler.END
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -289,40 +352,33 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 # Инициализация базы данных
-async def init_db():
+async def init_db(pool: asyncpg.Pool):
     """Инициализирует таблицы базы данных при старте приложения."""
-    conn = await asyncpg.connect(**DB_CONFIG)
-    try:
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS tg_acc (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE,
-                user_id BIGINT
-            )
-        """)
-    finally:
-        await conn.close()
+    await pool.execute("""
+        CREATE TABLE IF NOT EXISTS tg_acc (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE,
+            user_id BIGINT
+        )
+    """)
 
 # Сохраняем нового пользователя
-async def save_user(username: str, user_id: int):
+async def save_user(pool: asyncpg.Pool, username: str, user_id: int):
     """Сохраняет пользователя в базу данных.
     
     Args:
+        pool: Пул соединений приложения
         username: Имя пользователя Telegram
         user_id: ID пользователя Telegram
     """
     if not username:
         return  # игнорируем без username
     
-    conn = await asyncpg.connect(**DB_CONFIG)
-    try:
-        await conn.execute("""
-            INSERT INTO tg_acc (username, user_id) 
-            VALUES ($1, $2)
-            ON CONFLICT (username) DO NOTHING
-        """, username, user_id)
-    finally:
-        await conn.close()
+    await pool.execute("""
+        INSERT INTO tg_acc (username, user_id) 
+        VALUES ($1, $2)
+        ON CONFLICT (username) DO NOTHING
+    """, username, user_id)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start - приветствие и главное меню.
@@ -332,7 +388,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context: Контекст выполнения обработчика
     """
     user = update.effective_user
-    await save_user(user.username, user.id)
+    await save_user(get_pool(context), user.username, user.id)
     print(f"Новый пользователь: {user.username} — {user.id}")
 
     keyboard = [
@@ -349,19 +405,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup,
     )
 
-async def get_user_competitions(user_id: int):
+async def get_user_competitions(pool: asyncpg.Pool, user_id: int):
     """Получает список соревнований пользователя из базы данных.
     
     Args:
+        pool: Пул соединений приложения
         user_id: ID пользователя Telegram
         
     Returns:
         list: Список соревнований или None, если не найдено
     """
-    conn = await asyncpg.connect(**DB_CONFIG)
-    try:
-        competitions = await conn.fetch(
-            '''
+    competitions = await pool.fetch(
+        '''
 SELECT wt.name, wc.name, wc.description,
 win_competitiondate.start_date, win_competitiondate.end_date,
 win_competitiondate.registration_start, win_competitiondate.registration_end, wu.tg_username
@@ -376,11 +431,9 @@ left join win_userinfo wu
 on wb.userinfo_id = wu.id
 where wu.tg_username = (select username from tg_acc where user_id = $1);
 ''', 
-            user_id
-        )
-        return competitions if competitions else None
-    finally:
-        await conn.close()
+        user_id
+    )
+    return competitions if competitions else None
 
 async def handle_competitions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки 'Мои соревнования'.
@@ -393,14 +446,13 @@ async def handle_competitions(update: Update, context: ContextTypes.DEFAULT_TYPE
     loading_msg = await update.message.reply_text("⏳ Загружаю список соревнований...")
     
     try:
-        conn = await asyncpg.connect(**DB_CONFIG)
         user_id = user.id 
         if user_id:
-            competitions = await get_user_competitions(user_id)
+            competitions = await get_user_competitions(get_pool(context), user_id)
             
             if competitions:
                 response = "🏆 Твои соревнования:\n\n" + "\n".join(
-                    f"🔥 {comp['name']} ({comp['description']})\n\n📅 Дата проведения: {comp['start_date'].strftime("%d.%m.%Y %H:%M")} - {comp['end_date'].strftime("%d.%m.%Y %H:%M")}\n⏳ Регистрация: {comp['registration_start'].strftime("%d.%m.%Y %H:%M")} - {comp['registration_end'].strftime("%d.%m.%Y %H:%M")}\n\n\n" 
+                    f"🔥 {comp['name']} ({comp['description']})\n\n📅 Дата проведения: {comp['start_date'].strftime('%d.%m.%Y %H:%M')} - {comp['end_date'].strftime('%d.%m.%Y %H:%M')}\n⏳ Регистрация: {comp['registration_start'].strftime('%d.%m.%Y %H:%M')} - {comp['registration_end'].strftime('%d.%m.%Y %H:%M')}\n\n\n" 
                     for comp in competitions
                 )
             else:
@@ -413,8 +465,6 @@ async def handle_competitions(update: Update, context: ContextTypes.DEFAULT_TYPE
     except Exception as e:
         print(f"Ошибка: {e}")
         await loading_msg.edit_text("😞 Произошла ошибка при загрузке данных")
-    finally:
-        await conn.close()
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает текстовые сообщения (главное меню).
@@ -431,49 +481,106 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 Вот список доступных команд:
 /cancel - отмена
 /start - начало работы бота
+/send - последние уведомления
 ''')
     elif text == "🏆 Найти соревнования":
         return await find_competitions_start(update, context)
     elif text == "📌 О боте":
         await update.message.reply_text("Бот от команды Аналитик!\nЭтот бот помогает отслеживать соревнования ФСП, а таже искать команды под свой скилл.")
 
+async def get_user_notifications(pool: asyncpg.Pool, user_id: int, limit: int = 10):
+    """Последние уведомления платформы для пользователя Telegram (из outbox).
+    
+    Args:
+        pool: Пул соединений приложения
+        user_id: ID пользователя Telegram
+        limit: Количество уведомлений
+        
+    Returns:
+        list: Уведомления, новые первыми
+    """
+    return await pool.fetch(
+        '''
+SELECT n.text, n.created_at
+FROM win_notification n
+JOIN win_userinfo wu ON wu.id = n.recipient_id
+WHERE wu.tg_username = (select username from tg_acc where user_id = $1)
+ORDER BY n.id DESC
+LIMIT $2
+''',
+        user_id, limit
+    )
+
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик команды /send (рассылка уведомлений). (Опционально)
+    """Обработчик команды /send - последние уведомления платформы.
+    
+    Уведомления приходят автоматически (консьюмер outbox в outbox.py),
+    команда показывает их повторно.
     
     Args:
         update: Объект Update от Telegram API
         context: Контекст выполнения обработчика
     """
-    sender_id = update.effective_user.id
-    sender_username = update.effective_user.username
-    conn = await asyncpg.connect(**DB_CONFIG)
-    competitions = False
-    try:
-        user_id = await conn.fetchval(
-            "SELECT user_id FROM tg_acc WHERE username = $1", 
-            sender_username
+    notifications = await get_user_notifications(get_pool(context), update.effective_user.id)
+    if notifications:
+        text = "🔔 Последние уведомления:\n\n" + "\n\n".join(
+            f"{n['created_at'].strftime('%d.%m.%Y %H:%M')}\n{n['text']}" for n in notifications
         )
-        if user_id and competitions:
-            try:
-                await context.bot.send_message(chat_id=user_id, text="Привет! Ты учавствуешь в соревнованиях ...")
-                print(f"Отправлено: {sender_username} ({user_id})")
-            except Exception as e:
-                print(f"Ошибка для {sender_username}: {e}")
-        else:
-            await context.bot.send_message(chat_id=user_id, text="Привет! Ты пока нигде не учавствуешь")
-    finally:
-        await conn.close()
+    else:
+        text = "🔔 Уведомлений пока нет. Они придут сюда, когда по вашим заявкам и соревнованиям будут новости."
+    await update.message.reply_text(text)
+
+
+async def on_startup(app: Application):
+    """Создаёт пул соединений на всё время работы бота, инициализирует базу
+    и загружает справочники (с периодическим обновлением в фоне)."""
+    pool = await asyncpg.create_pool(**DB_CONFIG, **DB_POOL_CONFIG)
+    app.bot_data['db_pool'] = pool
+    await init_db(pool)
+    reference = ReferenceCache(REFERENCE_REFRESH_INTERVAL)
+    await reference.refresh(pool)
+    app.bot_data['reference'] = reference
+    app.bot_data['reference_task'] = asyncio.create_task(reference.run_refresh(pool))
+    # Доставка уведомлений платформы через того же бота и общий ограничитель частоты
+    newsletter = BotNewsletter(None, pool=pool, bot=app.bot)
+    app.bot_data['outbox_stop'] = asyncio.Event()
+    app.bot_data['outbox_task'] = asyncio.create_task(run_outbox(pool, newsletter, app.bot_data['outbox_stop']))
+
+
+async def on_shutdown(app: Application):
+    """Останавливает фоновые задачи и закрывает пул: ждёт завершения текущих
+    запросов, затем закрывает соединения принудительно. Отправляемые
+    уведомления дорабатываются до закрытия пула, неначатые возвращаются
+    в очередь (stop_outbox)."""
+    task = app.bot_data.pop('reference_task', None)
+    if task is not None:
+        task.cancel()
+    task = app.bot_data.pop('outbox_task', None)
+    if task is not None:
+        await stop_outbox(task, app.bot_data.pop('outbox_stop'))
+    pool = app.bot_data.pop('db_pool', None)
+    if pool is None:
+        return
+    try:
+        await asyncio.wait_for(pool.close(), DB_POOL_CLOSE_TIMEOUT)
+    except asyncio.TimeoutError:
+        pool.terminate()
 
 
 # Основная функция
-async def main():
+def main():
     """Основная функция запуска бота.
     
-    Инициализирует базу данных, настраивает обработчики команд
-    и запускает бота в режиме polling.
+    Настраивает обработчики команд и запускает бота в режиме polling.
+    Пул соединений создаётся при запуске и закрывается при остановке бота.
     """
-    await init_db()
-    app = Application.builder().token("Your_Token").build()
+    app = (
+        Application.builder()
+        .token("Your_Token")
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     app.add_handler(CommandHandler("start", start))
     conv_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.Text("🏆 Найти соревнования"), find_competitions_start)],
@@ -494,14 +601,8 @@ async def main():
     app.add_handler(CommandHandler("send", broadcast))
     app.add_handler(CommandHandler("cancel", cancel))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    await app.run_polling()
+    # run_polling сам управляет циклом событий и вызывает post_init/post_shutdown
+    app.run_polling()
 
 if __name__ == "__main__":
-    try:
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
-    except RuntimeError:
-        import nest_asyncio
-        nest_asyncio.apply()
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
+    main()
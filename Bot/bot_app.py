@@ -1,5 +1,11 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
 import asyncpg
 from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
 
 DB_CONFIG = {
     "database": "sbp",
@@ -8,50 +14,310 @@ DB_CONFIG = {
     "host": "10.8.0.23",
     "port": "54320"
 }
+
+# Ограничения Telegram Bot API: около 30 сообщений в секунду всего
+# и не больше одного сообщения в секунду в один чат
+GLOBAL_RATE = 30
+PER_CHAT_RATE = 1
+# Одновременных запросов к Telegram (с запасом на задержку ответа)
+CONCURRENCY = 30
+# Повторы при сетевых ошибках и RetryAfter; пауза растёт вдвое с каждой попыткой
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class TokenBucket:
+    """Ограничитель частоты «корзина токенов».
+
+    Токены пополняются со скоростью rate в секунду, но не больше capacity;
+    каждое сообщение забирает один токен. Ожидающие получают токены по очереди.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Ждёт и забирает один токен."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Не выдаёт токены seconds секунд (после RetryAfter от Telegram)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def idle(self, now: float) -> bool:
+        """Корзина полная и не на паузе - её можно удалить без изменения поведения."""
+        return now >= self.paused_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Общее ограничение частоты отправки и отдельное для каждого чата."""
+
+    # Полные корзины чатов удаляются, когда их становится больше
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE):
+        self.per_chat_rate = per_chat_rate
+        # Без накопления токенов: сообщения идут равномерно, без всплеска в начале рассылки
+        self.bucket = TokenBucket(rate, 1)
+        self.chats = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= self.MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                self.chats = {key: value for key, value in self.chats.items() if not value.idle(now)}
+            bucket = self.chats[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    async def acquire(self, chat_id: int):
+        """Ждёт, пока можно отправить сообщение в чат."""
+        await self._chat_bucket(chat_id).acquire()
+        await self.bucket.acquire()
+
+    def pause(self, seconds: float):
+        """RetryAfter относится ко всему боту, поэтому приостанавливается общая отправка."""
+        self.bucket.pause(seconds)
+
+
+@dataclass
+class DeliveryReport:
+    """Результат рассылки.
+
+    Attributes:
+        requested (int): Количество адресатов (без повторов)
+        sent (list): Получатели, которым сообщение доставлено
+        not_found (list): Username, которых нет в tg_acc (не запускали бота)
+        failed (dict): Получатель -> текст ошибки Telegram
+        retryable (list): Получатели из failed, которым можно отправить позже (повторы исчерпаны)
+        unsent (list): Получатели, до которых очередь не дошла (рассылка остановлена)
+        retries (int): Количество повторных отправок (RetryAfter и сетевые ошибки)
+        elapsed (float): Длительность рассылки в секундах
+    """
+    requested: int = 0
+    sent: list = field(default_factory=list)
+    not_found: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    retryable: list = field(default_factory=list)
+    unsent: list = field(default_factory=list)
+    retries: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Отправлено {len(self.sent)} из {self.requested}, не найдено {len(self.not_found)}, "
+            f"ошибок {len(self.failed)}, повторов {self.retries}, {self.elapsed:.1f} с"
+        )
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after - секунды или timedelta в зависимости от версии python-telegram-bot."""
+    value = error.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
 class BotNewsletter():
     """Класс для рассылки сообщений пользователям Telegram через бота.
-    
+
     Использует базу данных PostgreSQL для получения user_id по username
-    и Telegram Bot API для отправки сообщений.
-    
+    и Telegram Bot API для отправки сообщений. Сообщения отправляются
+    параллельно с ограничением частоты (RateLimiter); пул соединений
+    создаётся один раз на экземпляр, если не передан готовый.
+
     Attributes:
         bot (Bot): Экземпляр телеграм-бота для отправки сообщений.
+        limiter (RateLimiter): Ограничение частоты отправки.
     """
-    def __init__(self,BOT_TOKEN):
+    def __init__(self, BOT_TOKEN, pool: asyncpg.Pool = None, limiter: RateLimiter = None,
+                 concurrency: int = CONCURRENCY, max_retries: int = MAX_RETRIES, bot: Bot = None):
         """Инициализирует экземпляр бота для рассылки.
-        
+
         Args:
             BOT_TOKEN (str): Токен Telegram бота, полученный от @BotFather.
+            pool (asyncpg.Pool): Пул соединений (например, пул бота); иначе создаётся свой.
+            limiter (RateLimiter): Общий ограничитель, если рассылок несколько.
+            concurrency (int): Количество одновременных запросов к Telegram.
+            max_retries (int): Повторов на одно сообщение.
+            bot (Bot): Готовый экземпляр бота вместо создания по токену.
         """
-        self.bot = Bot(token=BOT_TOKEN)
+        self.bot = bot or Bot(token=BOT_TOKEN)
+        self.limiter = limiter or RateLimiter()
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._pool = pool
+        self._own_pool = pool is None
+
+    async def __aenter__(self):
+        await self.bot.initialize()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(**DB_CONFIG, min_size=1, max_size=2)
+        return self._pool
 
+    async def close(self):
+        """Закрывает собственный пул соединений и HTTP-клиент бота."""
+        if self._own_pool and self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        await self.bot.shutdown()
 
+    async def resolve_users(self, usernames: list[str]) -> dict:
+        """Возвращает {username: user_id} одним запросом к tg_acc."""
+        rows = await (await self.get_pool()).fetch(
+            "SELECT username, user_id FROM tg_acc WHERE username = ANY($1::text[]) AND user_id IS NOT NULL",
+            usernames
+        )
+        return {row['username']: row['user_id'] for row in rows}
 
-    async def send_to_users(self, usernames: list[str], text: str):
+    async def send_to_users(self, usernames: list[str], text: str) -> DeliveryReport:
         """Отправляет текстовое сообщение списку пользователей Telegram.
-        
-        Для каждого username из списка находит соответствующий user_id в базе данных,
-        затем отправляет сообщение через Telegram Bot API.
-        
+
+        Все username находятся в базе одним запросом, затем сообщения
+        отправляются параллельно с учётом ограничений Telegram.
+
         Args:
             usernames (list[str]): Список username пользователей (без @).
             text (str): Текст сообщения для рассылки.
-            
+
+        Returns:
+            DeliveryReport: Кому доставлено, кто не найден и ошибки по получателям.
+
         Note:
-            Логирует результат отправки или ошибки в stdout.
             Требует наличия таблицы tg_acc с колонками user_id и username в БД.
         """
-        async with asyncpg.create_pool(**DB_CONFIG) as pool:
-            async with pool.acquire() as connection:
-                for username in usernames:
-                    # Для asyncpg используется $1 вместо ? для параметров
-                    user_id = await connection.fetchval(
-                        "SELECT user_id FROM tg_acc WHERE username = $1", 
-                        username
-                    )
-                    if user_id:
-                        try:
-                            await self.bot.send_message(chat_id=user_id, text=text)
-                            print(f"Отправлено: {username} ({user_id})")
-                        except Exception as e:
-                            print(f"Ошибка для {username}: {e}")
+        started = time.monotonic()
+        usernames = list(dict.fromkeys(usernames))
+        chat_ids = await self.resolve_users(usernames)
+        report = await self.deliver(chat_ids, text)
+        report.requested = len(usernames)
+        report.not_found = [username for username in usernames if username not in chat_ids]
+        report.elapsed = time.monotonic() - started
+        return report
+
+    async def deliver(self, recipients: dict, text: str) -> DeliveryReport:
+        """Отправляет сообщение по готовым chat_id.
+
+        Args:
+            recipients (dict): Получатель (например, username) -> chat_id
+            text (str): Текст сообщения
+
+        Returns:
+            DeliveryReport: Результат отправки
+        """
+        return await self.deliver_messages(
+            {recipient: (chat_id, text) for recipient, chat_id in recipients.items()}
+        )
+
+    async def deliver_messages(self, messages: dict, on_result=None, stop: asyncio.Event = None,
+                               retry_timeouts: bool = True, on_start=None) -> DeliveryReport:
+        """Отправляет каждому получателю своё сообщение.
+
+        Args:
+            messages (dict): Получатель (например, ID уведомления) -> (chat_id, текст)
+            on_result: async-функция (получатель, ошибка или None, можно ли повторить),
+                вызывается сразу после отправки каждого сообщения
+            on_start: async-функция (получатель) -> bool, вызывается непосредственно
+                перед отправкой; False - сообщение пропускается (не попадает в отчёт)
+            stop (asyncio.Event): После установки новые сообщения не отправляются
+                (отправляемые сейчас дорабатываются), остальные попадают в report.unsent
+            retry_timeouts (bool): Повторять ли сообщение после TimedOut (см. send)
+
+        Returns:
+            DeliveryReport: Результат отправки
+        """
+        started = time.monotonic()
+        report = DeliveryReport(requested=len(messages))
+        queue = asyncio.Queue()
+        for item in messages.items():
+            queue.put_nowait(item)
+
+        async def worker():
+            while stop is None or not stop.is_set():
+                try:
+                    recipient, (chat_id, text) = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if on_start is not None and not await on_start(recipient):
+                    continue
+                error, retryable = await self.send(chat_id, text, report, retry_timeouts=retry_timeouts)
+                if error is None:
+                    report.sent.append(recipient)
+                else:
+                    report.failed[recipient] = error
+                    if retryable:
+                        report.retryable.append(recipient)
+                if on_result is not None:
+                    await on_result(recipient, error, retryable)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(messages)))))
+        while not queue.empty():
+            report.unsent.append(queue.get_nowait()[0])
+        report.elapsed = time.monotonic() - started
+        return report
+
+    async def send(self, chat_id: int, text: str, report: DeliveryReport = None,
+                   retry_timeouts: bool = True, **kwargs):
+        """Отправляет одно сообщение с повторами.
+
+        При RetryAfter отправка всем чатам приостанавливается на указанное Telegram
+        время, при сетевых ошибках - повтор с растущей паузой. Ошибки, которые не
+        исправятся повтором (бот заблокирован, чат не найден), не повторяются.
+        После TimedOut сообщение могло дойти: с retry_timeouts=False оно не
+        повторяется и возвращается как ошибка без повтора (доставка не подтверждена).
+
+        Returns:
+            tuple: (текст ошибки или None, если доставлено; можно ли повторить отправку позже)
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return None, False
+            except RetryAfter as e:
+                self.limiter.pause(retry_after_seconds(e))
+                error = str(e)
+            except (Forbidden, BadRequest) as e:
+                return str(e), False
+            except TimedOut as e:
+                if not retry_timeouts:
+                    return f"Доставка не подтверждена: {e}", False
+                await asyncio.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+                error = str(e)
+            except NetworkError as e:
+                await asyncio.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+                error = str(e)
+            except TelegramError as e:
+                return str(e), False
+            if report is not None and attempt < self.max_retries:
+                report.retries += 1
+        return error, True
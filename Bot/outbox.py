@@ -0,0 +1,187 @@
+"""Доставка уведомлений платформы из outbox (таблица win_notification).
+
+Django записывает уведомления в той же транзакции, что и событие (заявки,
+приглашения, смена статуса, результаты). Консьюмер забирает ожидающие записи
+пачками одним коротким запросом: FOR UPDATE SKIP LOCKED - несколько экземпляров
+бота не берут одни и те же строки, - и переводит их в 'claimed' с арендой
+(available_at = now() + OUTBOX_LEASE). Отправка через BotNewsletter (ограничение
+частоты, RetryAfter) идёт вне транзакции: непосредственно перед отправкой
+сообщения его запись переходит в 'sending', сразу после - отмечается результат.
+
+Повторно отправляются только сообщения, которые точно не дошли (RetryAfter,
+сетевые ошибки до отправки). После TimedOut сообщение могло дойти, поэтому
+запись помечается 'failed' без повтора. Когда аренда истекает (бот упал или
+остановлен посреди пачки), записи 'claimed' - до них отправка не дошла -
+возвращаются в 'pending' и будут отправлены; записи 'sending' не отправляются
+повторно и помечаются 'failed' с ошибкой «доставка не подтверждена».
+
+Получатель находится по tg_username профиля в tg_acc; если он не запускал
+бота, уведомление помечается 'skipped'.
+"""
+
+import asyncio
+
+import asyncpg
+
+from bot_app import BotNewsletter
+
+# Уведомлений в одной пачке (при 30 сообщениях в секунду - несколько секунд)
+OUTBOX_BATCH_SIZE = 100
+# Пауза между проверками, когда очередь пуста
+OUTBOX_POLL_INTERVAL = 5
+# Попыток до статуса 'failed' при временных ошибках; пауза между ними растёт вдвое
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+# Аренда пачки: с запасом больше времени её отправки (включая паузы RetryAfter)
+OUTBOX_LEASE = 600
+# Сколько ждать завершения отправляемых сообщений при остановке бота
+OUTBOX_STOP_TIMEOUT = 30
+
+UNCONFIRMED_ERROR = 'Доставка не подтверждена: отправка прервана'
+
+CLAIM_SQL = '''
+WITH claimed AS (
+    SELECT id FROM win_notification
+    WHERE status = 'pending' AND available_at <= now()
+    ORDER BY available_at, id
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE win_notification n
+SET status = 'claimed', available_at = now() + make_interval(secs => $2)
+FROM claimed
+WHERE n.id = claimed.id
+RETURNING n.id, n.text, (
+    SELECT a.user_id
+    FROM win_userinfo u
+    JOIN tg_acc a ON a.username = u.tg_username
+    WHERE u.id = n.recipient_id
+    LIMIT 1
+) AS chat_id
+'''
+
+# Запись переходит в 'sending' непосредственно перед отправкой, если аренда ещё не истекла;
+# аренда продлевается, чтобы отправляемое сообщение не истекло раньше отметки результата
+START_SQL = '''
+UPDATE win_notification
+SET status = 'sending', attempts = attempts + 1, available_at = now() + make_interval(secs => $2)
+WHERE id = $1 AND status = 'claimed'
+RETURNING id
+'''
+
+# Все отметки - только для своих записей: запись с истёкшей арендой
+# уже обработана EXPIRE_SQL и не перезаписывается
+MARK_SENT_SQL = '''
+UPDATE win_notification
+SET status = 'sent', sent_at = now(), error = ''
+WHERE id = $1 AND status = 'sending'
+'''
+
+MARK_SKIPPED_SQL = '''
+UPDATE win_notification
+SET status = 'skipped', error = 'Пользователь не подключил Telegram-бота'
+WHERE id = ANY($1::bigint[]) AND status = 'claimed'
+'''
+
+# Временные ошибки откладываются (available_at), постоянные и исчерпавшие попытки - 'failed'
+MARK_FAILED_SQL = '''
+UPDATE win_notification
+SET status = CASE WHEN $3 AND attempts < $4 THEN 'pending' ELSE 'failed' END,
+    error = $2,
+    available_at = now() + make_interval(secs => $5 * power(2, attempts - 1))
+WHERE id = $1 AND status = 'sending'
+'''
+
+# Сообщения, которые не начинали отправлять (бот останавливается), возвращаются в очередь
+RELEASE_SQL = '''
+UPDATE win_notification
+SET status = 'pending', available_at = now()
+WHERE id = ANY($1::bigint[]) AND status = 'claimed'
+'''
+
+# Истёкшая аренда: неначатые записи - снова в очередь, прерванные отправки - 'failed'
+EXPIRE_SQL = '''
+UPDATE win_notification
+SET status = CASE WHEN status = 'claimed' THEN 'pending' ELSE 'failed' END,
+    error = CASE WHEN status = 'claimed' THEN error ELSE $1 END
+WHERE status IN ('claimed', 'sending') AND available_at <= now()
+'''
+
+
+async def process_batch(pool: asyncpg.Pool, newsletter: BotNewsletter, batch_size: int = OUTBOX_BATCH_SIZE,
+                        stop: asyncio.Event = None) -> int:
+    """Отправляет одну пачку уведомлений.
+
+    Returns:
+        int: Количество взятых записей (0 - очередь пуста)
+    """
+    await pool.execute(EXPIRE_SQL, UNCONFIRMED_ERROR)
+    rows = await pool.fetch(CLAIM_SQL, batch_size, OUTBOX_LEASE)
+    if not rows:
+        return 0
+
+    messages = {row['id']: (row['chat_id'], row['text']) for row in rows if row['chat_id'] is not None}
+    skipped = [row['id'] for row in rows if row['chat_id'] is None]
+    if skipped:
+        await pool.execute(MARK_SKIPPED_SQL, skipped)
+
+    async def start(pk):
+        try:
+            return await pool.fetchval(START_SQL, pk, OUTBOX_LEASE) is not None
+        except (asyncpg.PostgresError, OSError) as e:
+            # Сообщение не отправляется; запись останется в 'claimed' и после аренды вернётся в очередь
+            print(f"Не удалось начать отправку уведомления {pk}: {e}")
+            return False
+
+    async def mark(pk, error, retryable):
+        try:
+            if error is None:
+                await pool.execute(MARK_SENT_SQL, pk)
+            else:
+                await pool.execute(MARK_FAILED_SQL, pk, error, retryable, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY)
+        except (asyncpg.PostgresError, OSError) as e:
+            # Запись останется в 'sending' и после аренды станет 'failed', но не уйдёт повторно
+            print(f"Не удалось отметить уведомление {pk}: {e}")
+
+    report = await newsletter.deliver_messages(
+        messages, on_result=mark, stop=stop, retry_timeouts=False, on_start=start
+    )
+    if report.unsent:
+        await pool.execute(RELEASE_SQL, report.unsent)
+    print(f"Уведомления: {report.summary()}, без Telegram {len(skipped)}, возвращено в очередь {len(report.unsent)}")
+    return len(rows)
+
+
+async def run_outbox(pool: asyncpg.Pool, newsletter: BotNewsletter, stop: asyncio.Event,
+                     batch_size: int = OUTBOX_BATCH_SIZE, poll_interval: float = OUTBOX_POLL_INTERVAL):
+    """Разбирает очередь уведомлений до установки stop (запускается в on_startup).
+
+    Полные пачки обрабатываются подряд, после неполной - пауза poll_interval.
+    После установки stop новые сообщения не отправляются, неначатые
+    возвращаются в очередь. Ошибки базы не останавливают цикл.
+    """
+    while not stop.is_set():
+        try:
+            processed = await process_batch(pool, newsletter, batch_size, stop)
+        except (asyncpg.PostgresError, OSError) as e:
+            print(f"Ошибка обработки уведомлений: {e}")
+            processed = 0
+        if processed < batch_size:
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def stop_outbox(task: asyncio.Task, stop: asyncio.Event, timeout: float = OUTBOX_STOP_TIMEOUT):
+    """Останавливает консьюмер: ждёт отправляемые сообщения, по таймауту - отменяет.
+
+    Отмена ничего не откатывает: отправленные записи уже отмечены, неначатые
+    после аренды возвращаются в очередь, а прерванные остаются в 'sending'
+    и после аренды помечаются «доставка не подтверждена».
+    """
+    stop.set()
+    try:
+        await asyncio.wait_for(task, timeout)
+    except asyncio.TimeoutError:
+        pass
@@ -0,0 +1,120 @@
+"""Справочники бота (регионы и дисциплины) в памяти процесса.
+
+Справочники загружаются одним запросом при запуске бота и периодически
+перечитываются (ReferenceCache.run_refresh). Поиск региона по ответу
+пользователя выполняется в памяти: без учёта регистра и «ё», по части
+названия («Татарстан», «Якутия») и с допуском опечаток.
+"""
+
+import asyncio
+import difflib
+import re
+import time
+
+import asyncpg
+
+# Загрузка обоих справочников за один запрос
+REFERENCE_SQL = '''
+SELECT 'region' AS kind, id, name FROM win_region
+UNION ALL
+SELECT 'discipline' AS kind, id, name FROM win_discipline
+'''
+
+# Слова, которые есть во многих названиях регионов и не отличают их друг от друга
+GENERIC_REGION_WORDS = {
+    'республика', 'область', 'край', 'автономный', 'автономная', 'округ', 'народная', 'город', 'г',
+}
+
+# Минимальное сходство названий (difflib) для исправления опечатки
+FUZZY_CUTOFF = 0.8
+
+
+def normalize(text: str) -> str:
+    """Приводит название к виду для сравнения: нижний регистр, «ё» - «е», только слова."""
+    text = text.lower().replace('ё', 'е')
+    return ' '.join(re.findall(r'\w+', text))
+
+
+class ReferenceCache:
+    """Регионы и дисциплины платформы.
+
+    Attributes:
+        regions (dict): ID региона -> название
+        disciplines (dict): ID дисциплины -> название
+        loaded_at (float): Время последней загрузки (time.monotonic) или None
+    """
+
+    def __init__(self, refresh_interval: float = 300):
+        """Создаёт пустой кэш.
+
+        Args:
+            refresh_interval (float): Период обновления справочников в секундах.
+        """
+        self.refresh_interval = refresh_interval
+        self.regions = {}
+        self.disciplines = {}
+        self.loaded_at = None
+        self._region_aliases = {}
+        self._discipline_ids = {}
+
+    async def refresh(self, pool: asyncpg.Pool):
+        """Перечитывает справочники из базы и заменяет их целиком."""
+        rows = await pool.fetch(REFERENCE_SQL)
+        regions, disciplines = {}, {}
+        for row in rows:
+            target = regions if row['kind'] == 'region' else disciplines
+            target[row['id']] = row['name']
+
+        aliases = {}
+        for region_id, name in regions.items():
+            full = normalize(name)
+            aliases[full] = region_id
+            # Значимая часть названия: «саха якутия», «татарстан», «московская»
+            short = ' '.join(word for word in full.split() if word not in GENERIC_REGION_WORDS)
+            if short:
+                aliases.setdefault(short, region_id)
+
+        self.regions = regions
+        self.disciplines = disciplines
+        self._region_aliases = aliases
+        self._discipline_ids = {normalize(name): discipline_id for discipline_id, name in disciplines.items()}
+        self.loaded_at = time.monotonic()
+
+    async def run_refresh(self, pool: asyncpg.Pool):
+        """Периодически обновляет справочники; ошибки не прерывают цикл (остаются прежние данные)."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh(pool)
+            except (asyncpg.PostgresError, OSError) as e:
+                print(f"Не удалось обновить справочники: {e}")
+
+    def match_region(self, text: str):
+        """Находит регион по ответу пользователя.
+
+        Args:
+            text (str): Название региона в свободной форме.
+
+        Returns:
+            tuple: (ID, название) региона или None, если подходящего нет
+        """
+        key = normalize(text)
+        if not set(key.split()) - GENERIC_REGION_WORDS:
+            return None
+        region_id = self._region_aliases.get(key)
+        if region_id is None:
+            # Все слова ответа входят в название ровно одного региона («якутия», «северная осетия»)
+            words = set(key.split())
+            found = {rid for alias, rid in self._region_aliases.items() if words <= set(alias.split())}
+            if len(found) == 1:
+                region_id = found.pop()
+        if region_id is None:
+            close = difflib.get_close_matches(key, self._region_aliases.keys(), n=1, cutoff=FUZZY_CUTOFF)
+            if not close:
+                return None
+            region_id = self._region_aliases[close[0]]
+        return region_id, self.regions[region_id]
+
+    def discipline_id(self, name: str):
+        """ID дисциплины по названию (без учёта регистра и эмодзи) или None."""
+        return self._discipline_ids.get(normalize(name))
@@ -5,21 +5,31 @@ BOT_TOKEN = "Your_Token"
 
 async def main(usernames):
     """Асинхронная функция для запуска рассылки сообщений через Telegram бота.
-    
-    Создает экземпляр BotNewsletter и отправляет заданное сообщение
-    списку пользователей.
-    
+
+    Создает экземпляр BotNewsletter, отправляет заданное сообщение
+    списку пользователей и выводит отчёт о доставке.
+
     Args:
         usernames (list): Список username пользователей Telegram (без @) для рассылки.
-        
+
+    Returns:
+        DeliveryReport: Отчёт о доставке.
+
     Example:
         Рассылка сообщения двум пользователям:
         >>> asyncio.run(main(['flymalysh', 'Ainsfari']))
     """
-    newsletter = BotNewsletter(BOT_TOKEN)
     message = "Привет, это сообщение отправлено вне Telegram."
 
-    await newsletter.send_to_users(usernames, message)
+    async with BotNewsletter(BOT_TOKEN) as newsletter:
+        report = await newsletter.send_to_users(usernames, message)
+
+    print(report.summary())
+    if report.not_found:
+        print(f"Не запускали бота: {', '.join(report.not_found)}")
+    for username, error in report.failed.items():
+        print(f"Ошибка для {username}: {error}")
+    return report
 
 if __name__ == "__main__":
     asyncio.run(main(['flymalysh', 'Ainsfari']))
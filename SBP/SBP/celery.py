@@ -0,0 +1,16 @@
+"""
+Celery application for SBP project.
+
+Tasks are discovered in the installed apps (win/tasks.py). Without a
+configured broker tasks run eagerly in-process, see CELERY_* in settings.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SBP.settings')
+
+app = Celery('SBP')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -89,16 +90,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'OPTIONS': {
-            'connect_timeout': 15,  # Таймаут подключения 5 секунд
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 15)),  # Таймаут подключения, секунды
         },
-        'NAME': 'sbp',       # имя вашей базы данных
-        'USER': 'postgres',           # имя пользователя PostgreSQL
-        'PASSWORD': '12345678',   # пароль пользователя
-        'HOST': 'db',        # адрес сервера базы данных
-        'PORT': '5432',             # порт PostgreSQL (обычно 5432)
+        'NAME': os.environ.get('DB_NAME', 'sbp'),       # имя вашей базы данных
+        'USER': os.environ.get('DB_USER', 'postgres'),           # имя пользователя PostgreSQL
+        'PASSWORD': os.environ.get('DB_PASSWORD', '12345678'),   # пароль пользователя
+        'HOST': os.environ.get('DB_HOST', 'db'),        # адрес сервера базы данных
+        'PORT': os.environ.get('DB_PORT', '5432'),             # порт PostgreSQL (обычно 5432)
+        # Постоянные соединения: одно соединение на поток живёт DB_CONN_MAX_AGE секунд
+        # (0 - новое соединение на каждый запрос), перед повторным использованием проверяется
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Пул соединений psycopg (psycopg[binary,pool] из requirements.txt, проверка - win/checks.py).
+# С пулом соединения возвращаются в пул после запроса, поэтому CONN_MAX_AGE = 0
+if os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'yes'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # ожидание свободного соединения, секунды
+    }
+
 
 
 # Password validation
@@ -149,14 +164,69 @@ AUTH_USER_MODEL = 'win.User'  # Замените yourapp на имя вашег
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework.authentication.TokenAuthentication',
+        'win.authentication.ProfileTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     )
 }
 
+# Кэш разобранных токенов между запросами (путь к классу, см. win/authentication.py).
+# По умолчанию выключен: удалённый токен перестаёт действовать сразу во всех процессах.
+# SharedTokenCache требует общего для процессов backend в CACHES (проверка win.E004)
+AUTH_TOKEN_CACHE = os.environ.get('AUTH_TOKEN_CACHE') or None
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 60))  # секунды
+AUTH_TOKEN_CACHE_ALIAS = os.environ.get('AUTH_TOKEN_CACHE_ALIAS', 'default')  # для SharedTokenCache
+
+
+# Celery
+# Без брокера (memory://) задачи выполняются сразу в процессе (eager)
+
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'memory://')
+CELERY_TASK_ALWAYS_EAGER = os.environ.get(
+    'CELERY_TASK_ALWAYS_EAGER',
+    '1' if CELERY_BROKER_URL.startswith('memory://') else '0'
+) == '1'
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_IGNORE_RESULT = True
+
+# Периодические задачи (celery -A SBP beat)
+CELERY_BEAT_SCHEDULE = {
+    'tick-competition-statuses': {
+        'task': 'win.tasks.tick_statuses',
+        'schedule': float(os.environ.get('STATUS_TICK_INTERVAL', 60)),
+    },
+    'refresh-leaderboard': {
+        'task': 'win.tasks.refresh_leaderboard_periodic',
+        'schedule': float(os.environ.get('LEADERBOARD_REFRESH_INTERVAL', 30)),
+    },
+    'drain-rating-updates': {
+        'task': 'win.tasks.drain_rating_updates',
+        'schedule': float(os.environ.get('RATING_QUEUE_DRAIN_INTERVAL', 10)),
+    },
+    'compact-rating-history': {
+        'task': 'win.tasks.compact_rating_history',
+        'schedule': 24 * 60 * 60,
+    },
+    'rating-checkpoint': {
+        'task': 'win.tasks.rating_checkpoint',
+        'schedule': 60 * 60,
+    },
+}
+
+# Материализованный рейтинг обновляется не чаще раза в интервал (секунды)
+LEADERBOARD_REFRESH_INTERVAL = int(os.environ.get('LEADERBOARD_REFRESH_INTERVAL', 30))
+
+# История рейтинга старше этого срока прореживается до одной записи в день
+RATING_SNAPSHOT_RETENTION_DAYS = int(os.environ.get('RATING_SNAPSHOT_RETENTION_DAYS', 90))
+
+# Полный срез истории рейтинга (рейтинг на момент времени читает записи только после среза)
+RATING_CHECKPOINT_INTERVAL_DAYS = int(os.environ.get('RATING_CHECKPOINT_INTERVAL_DAYS', 7))
+RATING_CHECKPOINT_LAG = int(os.environ.get('RATING_CHECKPOINT_LAG', 300))  # секунды
 
+# Каталог для готовых файлов фоновых выгрузок
+EXPORT_ROOT = Path(os.environ.get('EXPORT_ROOT', BASE_DIR / 'exports'))
 
 LOGGING = {
     'version': 1,
@@ -6,5 +6,5 @@ class WinConfig(AppConfig):
     name = 'win'
 
     def ready(self):
-    # Импортируем сигналы при запуске приложения
-        from . import signals
\ No newline at end of file
+    # Импортируем проверки и сигналы при запуске приложения
+        from . import checks, signals
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Аутентификация по токену с загрузкой профиля.
+
+При разборе токена одним запросом загружаются User, UserInfo, Role и Region,
+поэтому request.user.info, .info.role и .info.region в представлениях,
+сериализаторах и проверках прав не обращаются к базе.
+
+Между запросами разобранные токены хранятся в кэше: настройка
+AUTH_TOKEN_CACHE задаёт путь к классу с методами get(key), set(key, token),
+delete(key) и clear() (None - без кэша, по умолчанию). Готовые реализации:
+- SharedTokenCache - кэш Django с общим для процессов backend (redis, memcached,
+  database, file); locmem и dummy не подходят (проверка win.E004);
+- LocalTokenCache - LRU в памяти процесса с ограниченным временем жизни записей,
+  только для одного процесса (проверка win.W002).
+Записи сбрасываются сигналами при удалении токена и изменении или удалении
+пользователя и профиля. Сигнал сбрасывает только кэш своего процесса, поэтому
+в других процессах LocalTokenCache удалённый токен действует ещё до
+AUTH_TOKEN_CACHE_TTL секунд.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import UserInfo
+
+# Связи, которые загружаются вместе с токеном
+PROFILE_RELATED = ('user', 'user__info', 'user__info__role', 'user__info__region')
+
+
+
+class LocalTokenCache:
+    """
+    LRU-кэш токенов в памяти процесса: не больше AUTH_TOKEN_CACHE_SIZE записей,
+    каждая живёт AUTH_TOKEN_CACHE_TTL секунд. Токены хранятся сериализованными,
+    поэтому каждый запрос получает свою копию пользователя и профиля.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize if maxsize is not None else settings.AUTH_TOKEN_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.AUTH_TOKEN_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, token):
+        data = pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedTokenCache:
+    """
+    Токены в кэше Django AUTH_TOKEN_CACHE_ALIAS, общем для процессов с тем же backend.
+    clear() меняет поколение ключей, старые записи истекают сами.
+    """
+    GENERATION_KEY = 'win:token:generation'
+
+    def __init__(self, alias=None, ttl=None):
+        self.cache = caches[alias or settings.AUTH_TOKEN_CACHE_ALIAS]
+        self.ttl = ttl if ttl is not None else settings.AUTH_TOKEN_CACHE_TTL
+
+    def _key(self, key):
+        generation = self.cache.get(self.GENERATION_KEY)
+        if generation is None:
+            self.cache.add(self.GENERATION_KEY, 0, None)
+            generation = self.cache.get(self.GENERATION_KEY, 0)
+        return f'win:token:{generation}:{key}'
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, token):
+        self.cache.set(self._key(key), token, self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key))
+
+    def clear(self):
+        try:
+            self.cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            self.cache.set(self.GENERATION_KEY, 1, None)
+
+
+_token_cache = None
+_token_cache_path = None
+
+
+def get_token_cache():
+    """Кэш токенов из настройки AUTH_TOKEN_CACHE (один экземпляр на процесс)"""
+    global _token_cache, _token_cache_path
+    path = getattr(settings, 'AUTH_TOKEN_CACHE', None)
+    if path != _token_cache_path:
+        _token_cache = import_string(path)() if path else None
+        _token_cache_path = path
+    return _token_cache
+
+
+def invalidate_tokens(keys):
+    """Сбрасывает закэшированные токены с указанными ключами"""
+    cache = get_token_cache()
+    if cache is not None:
+        for key in keys:
+            cache.delete(key)
+
+
+def invalidate_user_tokens(user_id):
+    """Сбрасывает закэшированные токены пользователя"""
+    if get_token_cache() is not None:
+        invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+def load_token(key):
+    """Токен с пользователем и профилем одним запросом (или None)"""
+    return Token.objects.select_related(*PROFILE_RELATED).filter(key=key).first()
+
+
+def profile_or_404(user):
+    """Профиль (UserInfo) пользователя, загруженный при аутентификации, или 404"""
+    try:
+        return user.info
+    except UserInfo.DoesNotExist:
+        raise Http404("Профиль пользователя не найден")
+
+
+class ProfileTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, которая сразу загружает профиль пользователя
+    (UserInfo с ролью и регионом) и при наличии кэша берёт токен из него.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        token = cache.get(key) if cache is not None else None
+        if token is None:
+            token = load_token(key)
+            if token is None:
+                raise AuthenticationFailed(_('Invalid token.'))
+            if cache is not None:
+                cache.set(key, token)
+
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
@@ -0,0 +1,148 @@
+"""
+Синтетические данные и «горячие» запросы платформы для проверки индексов.
+
+Используется тестом на планы выполнения (EXPLAIN) и командой benchmark_indexes.
+Данные создаются через bulk_create, поэтому сигналы рейтинга не срабатывают.
+"""
+import random
+import uuid
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import (
+    PERMISSIONS_COUNT, Competition, CompetitionDate, Discipline, Invitation, Region, Role, Team,
+    TeamApplication, User, UserApplication, UserInfo, VacancyResponse,
+)
+
+COMPETITION_STATUSES = ['pending', 'upcoming', 'registration', 'running', 'finished', 'waiting']
+APPLICATION_STATUSES = ['pending', 'approved', 'rejected']
+BATCH_SIZE = 1000
+
+
+def seed_benchmark_data(users=1000, competitions=100, per_competition=10, seed=0):
+    """
+    Заполняет базу синтетическими пользователями, соревнованиями, заявками,
+    откликами и приглашениями. Возвращает ID объектов для параметров запросов.
+    """
+    rnd = random.Random(seed)
+    prefix = uuid.uuid4().hex[:8]
+    now = timezone.now()
+
+    region = Region.objects.create(name=f'Benchmark {prefix}')
+    for role_id in (0, 1, 2):
+        Role.objects.get_or_create(id=role_id, defaults={'name': f'Роль {role_id}'})
+    discipline = Discipline.objects.create(name=f'Benchmark {prefix}')
+
+    accounts = User.objects.bulk_create(
+        [User(nickName=f'{prefix}_{i}') for i in range(users)], batch_size=BATCH_SIZE
+    )
+    # Большинство пользователей - спортсмены, остальные - представители и ФСП
+    profiles = UserInfo.objects.bulk_create([
+        UserInfo(
+            user=account, surname='Бенчмарк', name=str(i), region=region,
+            role_id=0 if i % 10 else (1 if i % 20 else 2),
+            is_approved=bool(i % 2), rating=round(rnd.uniform(0, 1000), 2),
+        )
+        for i, account in enumerate(accounts)
+    ], batch_size=BATCH_SIZE)
+
+    # Закрытые, региональные и открытые для всех регионов соревнования
+    permission_sets = [[], [region.id], list(range(1, Competition.ALL_REGIONS_COUNT + 1))]
+    comps = Competition.objects.bulk_create([
+        Competition(
+            max_participants=100, max_participants_in_team=5, min_age=0, max_age=100,
+            name=f'Benchmark {i}', competition_type=Competition.ONLINE,
+            type=Competition.TEAM if i % 2 else Competition.INDIVIDUAL,
+            discipline=discipline, status=rnd.choice(COMPETITION_STATUSES),
+            permissions=rnd.choice(permission_sets),
+        )
+        for i in range(competitions)
+    ], batch_size=BATCH_SIZE)
+
+    dates = []
+    for comp in comps:
+        start = now + timedelta(days=rnd.randint(-60, 60))
+        dates.append(CompetitionDate(
+            competition=comp,
+            registration_start=start - timedelta(days=14),
+            registration_end=start - timedelta(days=1),
+            start_date=start,
+            end_date=start + timedelta(days=2),
+        ))
+    CompetitionDate.objects.bulk_create(dates, batch_size=BATCH_SIZE)
+
+    teams = Team.objects.bulk_create([
+        Team(competition=comp, name=f'Команда {i}', captain=profiles[i % users], max_members=5)
+        for i, comp in enumerate(comps)
+    ], batch_size=BATCH_SIZE)
+
+    user_applications, team_applications, responses, invitations = [], [], [], []
+    for i, (comp, team) in enumerate(zip(comps, teams)):
+        team_applications.append(TeamApplication(
+            team=team, competition=comp, status=rnd.choice(APPLICATION_STATUSES)
+        ))
+        for j in range(per_competition):
+            user = profiles[(i * per_competition + j) % users]
+            user_applications.append(UserApplication(
+                user=user, competition=comp, status=rnd.choice(APPLICATION_STATUSES)
+            ))
+            responses.append(VacancyResponse(
+                team=team, user=user, text='-', status=rnd.choice(APPLICATION_STATUSES)
+            ))
+            invitations.append(Invitation(
+                team=team, user=user, status=rnd.choice(['Ожидает', 'Принято', 'Отклонено'])
+            ))
+    UserApplication.objects.bulk_create(user_applications, batch_size=BATCH_SIZE)
+    TeamApplication.objects.bulk_create(team_applications, batch_size=BATCH_SIZE)
+    VacancyResponse.objects.bulk_create(responses, batch_size=BATCH_SIZE)
+    Invitation.objects.bulk_create(invitations, batch_size=BATCH_SIZE)
+
+    return {
+        'competition_id': comps[0].id,
+        'competition_ids': [comp.id for comp in comps[:5]],
+        'team_ids': [team.id for team in teams[:5]],
+        'user_id': profiles[0].id,
+        'region_id': region.id,
+        'now': now,
+    }
+
+
+def hot_queries(sample):
+    """Основные запросы эндпоинтов с фильтрами по индексируемым полям"""
+    now = sample['now']
+    return [
+        ('competitions_pending', Competition.objects.filter(status='pending')),
+        ('competitions_for_region', Competition.objects.filter(
+            permissions__contains=[sample['region_id']]
+        )),
+        ('competitions_closed_or_all_regions', Competition.objects.alias(
+            regions_count=PERMISSIONS_COUNT
+        ).filter(regions_count__in=[0, Competition.ALL_REGIONS_COUNT])),
+        ('competition_dates_window', CompetitionDate.objects.filter(
+            start_date__range=(now - timedelta(hours=1), now)
+        )),
+        ('competition_registration_window', CompetitionDate.objects.filter(
+            registration_end__range=(now - timedelta(hours=1), now)
+        )),
+        ('user_applications_for_organizer', UserApplication.objects.filter(
+            competition__in=sample['competition_ids'], status='pending'
+        )),
+        ('competition_participants', UserApplication.objects.filter(
+            competition=sample['competition_id'], status='approved'
+        )),
+        ('team_applications_for_organizer', TeamApplication.objects.filter(
+            competition__in=sample['competition_ids'], status='pending'
+        )),
+        ('vacancy_responses_for_captain', VacancyResponse.objects.filter(
+            team__in=sample['team_ids'], status='pending'
+        )),
+        ('user_invitations', Invitation.objects.filter(
+            user=sample['user_id'], status='Ожидает'
+        )),
+        ('users_rating', UserInfo.objects.filter(role_id=0).order_by('-rating')[:50]),
+        ('users_pending_approval', UserInfo.objects.filter(
+            role__id__in=[1, 2], is_approved=False
+        )),
+        ('region_representatives', UserInfo.objects.filter(role_id=1, is_approved=True)),
+    ]
@@ -0,0 +1,93 @@
+"""
+Проверки конфигурации базы данных и кэша токенов (manage.py check).
+
+Настройки пула, постоянных соединений и кэша токенов проверяются при каждом
+запуске, доступность базы - командой `manage.py check --database default`
+(её выполняет и migrate).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+
+# Backend кэша Django, которые не разделяются между процессами
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _pool_available():
+    try:
+        import psycopg
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return int(psycopg.__version__.split('.')[0]) >= 3
+
+
+@register(Tags.database, deploy=False)
+def check_database_connection(app_configs, databases=None, **kwargs):
+    """База отвечает на запрос (только при check --database)"""
+    errors = []
+    for alias in databases or []:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception as exc:
+            errors.append(Error(
+                f"Нет подключения к базе '{alias}': {exc}",
+                hint="Проверьте переменные окружения DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD.",
+                id='win.E003',
+            ))
+    return errors
+
+
+@register()
+def check_connection_settings(app_configs, **kwargs):
+    errors = []
+    for alias, config in settings.DATABASES.items():
+        pool = config.get('OPTIONS', {}).get('pool')
+        if pool:
+            if not _pool_available():
+                errors.append(Error(
+                    f"Для пула соединений базы '{alias}' нужны psycopg>=3 и psycopg-pool",
+                    hint="pip install 'psycopg[binary,pool]' или уберите DB_POOL.",
+                    id='win.E001',
+                ))
+            if config.get('CONN_MAX_AGE'):
+                errors.append(Error(
+                    f"Пул соединений базы '{alias}' несовместим с CONN_MAX_AGE",
+                    hint="С пулом CONN_MAX_AGE должен быть 0.",
+                    id='win.E002',
+                ))
+        elif not config.get('CONN_MAX_AGE') and not settings.DEBUG:
+            errors.append(Warning(
+                f"База '{alias}': новое соединение на каждый запрос",
+                hint="Задайте DB_CONN_MAX_AGE или включите пул (DB_POOL=1).",
+                id='win.W001',
+            ))
+    return errors
+
+
+@register()
+def check_token_cache(app_configs, **kwargs):
+    """Кэш токенов не должен оставлять удалённые токены действующими в других процессах"""
+    path = getattr(settings, 'AUTH_TOKEN_CACHE', None)
+    if path == 'win.authentication.SharedTokenCache':
+        alias = settings.AUTH_TOKEN_CACHE_ALIAS
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend is None or backend in PROCESS_LOCAL_CACHE_BACKENDS:
+            return [Error(
+                f"SharedTokenCache: кэш '{alias}' ({backend or 'не настроен'}) не общий для процессов",
+                hint="Настройте в CACHES общий backend (redis, memcached, database) "
+                     "или уберите AUTH_TOKEN_CACHE.",
+                id='win.E004',
+            )]
+    elif path == 'win.authentication.LocalTokenCache' and not settings.DEBUG:
+        return [Warning(
+            "LocalTokenCache: удалённый токен действует в других процессах "
+            f"до {settings.AUTH_TOKEN_CACHE_TTL} с",
+            hint="Используйте SharedTokenCache с общим кэшем или уберите AUTH_TOKEN_CACHE.",
+            id='win.W002',
+        )]
+    return []
@@ -0,0 +1,65 @@
+"""
+Зачисление участников в соревнование.
+
+Участия создаются одним bulk_create(ignore_conflicts=True) - повторное
+зачисление не создаёт дублей благодаря уникальности (competition, participant).
+bulk_create не вызывает сигналы модели, поэтому поправки рейтинга (новые
+участия и изменение размера соревнования) и статистики по дисциплинам
+считаются здесь же, как в сигнале update_user_rating.
+"""
+from django.db import transaction
+
+from .models import Competition, CompetitionParticipant
+from .stats import add_stats_delta, apply_discipline_stats_deltas
+from .utils import add_rating_delta, competition_size_deltas, enqueue_rating_deltas
+
+
+class CompetitionFull(Exception):
+    """Зачисление превысило бы максимальное количество участников"""
+
+
+def enroll_participants(competition, user_ids, limit=None):
+    """
+    Зачисляет пользователей (ID UserInfo) в соревнование.
+
+    Соревнование блокируется на время операции, поэтому параллельные
+    зачисления не превышают limit и не искажают поправки размера.
+    Если после зачисления участников стало бы больше limit, ничего не
+    создаётся и выбрасывается CompetitionFull.
+    Возвращает список ID пользователей, которые были зачислены впервые.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+
+    with transaction.atomic():
+        Competition.objects.select_for_update().only('id').get(pk=competition.id)
+
+        participations = CompetitionParticipant.objects.filter(competition_id=competition.id)
+        existing = set(participations.filter(participant_id__in=user_ids).values_list('participant_id', flat=True))
+        new_ids = [user_id for user_id in user_ids if user_id not in existing]
+        if not new_ids:
+            return []
+
+        old_size = participations.count()
+        new_size = old_size + len(new_ids)
+        if limit is not None and new_size > limit:
+            raise CompetitionFull(limit)
+
+        CompetitionParticipant.objects.bulk_create(
+            [CompetitionParticipant(competition_id=competition.id, participant_id=user_id) for user_id in new_ids],
+            ignore_conflicts=True,
+            batch_size=500
+        )
+
+        # Новые участия без места: очков не добавляют, но увеличивают число участий
+        deltas = {}
+        stats_deltas = {}
+        for user_id in new_ids:
+            add_rating_delta(deltas, user_id, 0.0, 1)
+            add_stats_delta(stats_deltas, user_id, competition.discipline_id, competitions=1)
+        competition_size_deltas(competition.id, old_size, new_size, deltas)
+
+        enqueue_rating_deltas(deltas)
+        apply_discipline_stats_deltas(stats_deltas)
+    return new_ids
@@ -0,0 +1,268 @@
+"""
+Выгрузка соревнований и участников в файл.
+
+Строки формируются генератором iter_export_rows, а запись в XLSX идёт через
+write-only лист openpyxl: файл пишется потоково во временный файл и не
+держится в памяти целиком.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side
+from openpyxl.utils import get_column_letter
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import (
+    Competition, CompetitionDate, CompetitionParticipant, CompetitionResult,
+    DataVersion, ExportJob, Team, UserInfo,
+)
+
+logger = logging.getLogger(__name__)
+
+# Соревнования выгружаются пачками: на каждую пачку фиксированное число запросов
+EXPORT_BATCH_SIZE = 200
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+CONTENT_TYPES = {
+    ExportJob.XLSX: XLSX_CONTENT_TYPE,
+    ExportJob.CSV: CSV_CONTENT_TYPE,
+}
+
+SHEET_TITLE = "Соревнования и участники"
+
+HEADERS = [
+    "ID участника", "ФИО", "Никнейм", "Регион",
+    "Роль", "Рейтинг", "Место", "Результат", "Тип участия"
+]
+
+# Виды строк выгрузки
+TITLE, LABEL, BLANK, HEADER, DATA, TEAM = 'title', 'label', 'blank', 'header', 'data', 'team'
+
+# Строки-заголовки растягиваются на всю ширину и не влияют на ширину столбцов
+WIDE_ROWS = {TITLE, TEAM}
+
+COMP_HEADER_FONT = Font(bold=True, size=12, color='003366')
+HEADER_FONT = Font(bold=True, size=12)
+LABEL_FONT = Font(bold=True)
+TEAM_FONT = Font(bold=True, italic=True)
+BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+
+
+def export_filename(competition_id, extension='xlsx'):
+    if competition_id:
+        return f'structured_competition_{competition_id}_participants.{extension}'
+    return f'structured_competitions_participants.{extension}'
+
+
+def export_queryset(competitions):
+    """
+    План предзагрузки для выгрузки: даты, результаты, участники, капитаны и
+    составы команд. Количество запросов фиксировано на пачку соревнований.
+    """
+    return competitions.select_related('discipline', 'dates').prefetch_related(
+        Prefetch(
+            'participants',
+            queryset=CompetitionParticipant.objects.select_related(
+                'participant', 'participant__user', 'participant__region', 'participant__role'
+            ).order_by('id')
+        ),
+        Prefetch(
+            'results',
+            queryset=CompetitionResult.objects.only('id', 'competition_id', 'participant_id', 'place')
+        ),
+        Prefetch(
+            'teams',
+            queryset=Team.objects.select_related('captain', 'captain__user').prefetch_related(
+                Prefetch('members', queryset=UserInfo.objects.select_related('user', 'region', 'role'))
+            ).order_by('id')
+        ),
+    )
+
+
+def iter_export_rows(competitions):
+    """Генерирует строки выгрузки в виде (вид строки, значения)"""
+    for comp in export_queryset(competitions).iterator(chunk_size=EXPORT_BATCH_SIZE):
+        places = {result.participant_id: result.place for result in comp.results.all()}
+
+        yield TITLE, [f"Соревнование: {comp.name} (ID: {comp.id})"]
+
+        # Основная информация о соревновании
+        yield LABEL, ["Тип", comp.get_type_display()]
+        yield LABEL, ["Формат", comp.get_competition_type_display()]
+        yield LABEL, ["Дисциплина", comp.discipline.name]
+        yield LABEL, ["Статус", comp.status]
+        yield LABEL, ["Макс. участников", comp.max_participants]
+        yield LABEL, ["Описание", comp.description[:200] + "..." if len(comp.description) > 200 else comp.description]
+
+        # Добавляем даты, если они есть
+        try:
+            comp_dates = comp.dates
+            yield LABEL, ["Даты проведения", f"{comp_dates.start_date.strftime('%d.%m.%Y %H:%M')} - {comp_dates.end_date.strftime('%d.%m.%Y %H:%M')}"]
+            yield LABEL, ["Даты регистрации", f"{comp_dates.registration_start.strftime('%d.%m.%Y %H:%M')} - {comp_dates.registration_end.strftime('%d.%m.%Y %H:%M')}"]
+        except CompetitionDate.DoesNotExist:
+            pass
+
+        yield BLANK, []
+        yield HEADER, HEADERS
+
+        # Участники (индивидуальные)
+        for participant in comp.participants.all():
+            user_info = participant.participant
+            yield DATA, [
+                user_info.user.id,
+                f"{user_info.surname} {user_info.name} {user_info.patronymic or ''}".strip(),
+                user_info.user.nickName,
+                user_info.region.name,
+                user_info.role.name,
+                user_info.rating,
+                places.get(user_info.id, "-"),
+                participant.result or "-",
+                "Индивидуальный"
+            ]
+
+        # Команды
+        for team in comp.teams.all():
+            yield TEAM, [f"Команда: {team.name} (Капитан: {team.captain.user.nickName if team.captain else 'не указан'})"]
+
+            for member in team.members.all():
+                yield DATA, [
+                    member.user.id,
+                    f"{member.surname} {member.name} {member.patronymic or ''}".strip(),
+                    member.user.nickName,
+                    member.region.name,
+                    member.role.name,
+                    member.rating,
+                    places.get(member.id, "-"),
+                    "-",  # Для командных результатов
+                    "Командный"
+                ]
+
+        # Отступ перед следующим соревнованием
+        for _ in range(3):
+            yield BLANK, []
+
+
+def _styled_cell(ws, kind, column, value):
+    cell = WriteOnlyCell(ws, value=value)
+    if kind == TITLE:
+        cell.font = COMP_HEADER_FONT
+    elif kind == TEAM:
+        cell.font = TEAM_FONT
+    elif kind == LABEL and column == 0:
+        cell.font = LABEL_FONT
+    elif kind == HEADER:
+        cell.font = HEADER_FONT
+        cell.border = BORDER
+    elif kind == DATA:
+        cell.border = BORDER
+    return cell
+
+
+def write_xlsx(rows, output):
+    """
+    Пишет строки в XLSX.
+
+    Ширины столбцов в write-only режиме задаются до первой строки, поэтому
+    строки сначала сбрасываются во временный буфер (на диск при большом объёме)
+    с подсчётом ширин, а затем дописываются в лист за один проход.
+    """
+    widths = [0] * len(HEADERS)
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+', encoding='utf-8') as spool:
+        for kind, values in rows:
+            if kind not in WIDE_ROWS:
+                for column, value in enumerate(values):
+                    if value is not None and value != '':
+                        widths[column] = max(widths[column], len(str(value)))
+            spool.write(json.dumps([kind, values], ensure_ascii=False))
+            spool.write('\n')
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(SHEET_TITLE)
+        for column, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(column)].width = (width + 2) * 1.2
+
+        spool.seek(0)
+        for line in spool:
+            kind, values = json.loads(line)
+            ws.append([_styled_cell(ws, kind, column, value) for column, value in enumerate(values)])
+
+        wb.save(output)
+
+
+def write_csv(rows, output):
+    """Пишет строки в CSV (UTF-8 с BOM, чтобы Excel корректно открывал кириллицу)"""
+    text = io.TextIOWrapper(output, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text)
+    for kind, values in rows:
+        writer.writerow(values)
+    text.flush()
+    text.detach()
+
+
+WRITERS = {
+    ExportJob.XLSX: write_xlsx,
+    ExportJob.CSV: write_csv,
+}
+
+
+def export_data_version():
+    """
+    Версия данных выгрузки: счётчик DataVersion, который триггеры PostgreSQL
+    увеличивают при фиксации любого изменения таблиц выгрузки (миграция 0027),
+    включая bulk_update и UPDATE без сигналов.
+    """
+    return str(DataVersion.current(DataVersion.EXPORT))
+
+
+def export_competitions(competition_id=None):
+    if competition_id:
+        return Competition.objects.filter(pk=competition_id)
+    return Competition.objects.all().order_by('id')
+
+
+def job_artifact_path(job):
+    return os.path.join(settings.EXPORT_ROOT, f'export_{job.pk}.{job.file_format}')
+
+
+def render_export_job(job):
+    """Формирует файл выгрузки для задачи и сохраняет его на диск"""
+    job.status = ExportJob.RUNNING
+    job.save(update_fields=['status'])
+
+    path = job_artifact_path(job)
+    partial_path = None
+    try:
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+        # Пишем во временный файл рядом и атомарно переименовываем
+        with tempfile.NamedTemporaryFile(dir=settings.EXPORT_ROOT, suffix='.part', delete=False) as output:
+            partial_path = output.name
+            WRITERS[job.file_format](iter_export_rows(export_competitions(job.competition_id)), output)
+        os.replace(partial_path, path)
+    except Exception as e:
+        logger.exception("Export job %s failed", job.pk)
+        if partial_path and os.path.exists(partial_path):
+            os.remove(partial_path)
+        job.status = ExportJob.FAILED
+        job.error = str(e)
+    else:
+        job.status = ExportJob.DONE
+        job.file_path = path
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file_path', 'error', 'finished_at'])
+    return job
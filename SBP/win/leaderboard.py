@@ -0,0 +1,105 @@
+"""
+Рейтинговые таблицы.
+
+Общий и региональный рейтинг хранятся в материализованном представлении
+win_leaderboard (модель Leaderboard) с заранее посчитанными местами.
+Представление обновляется не чаще раза в LEADERBOARD_REFRESH_INTERVAL секунд
+после изменения рейтингов; изменения внутри интервала подхватывает
+периодическая задача Celery beat.
+
+Отметка «устарел» и время последнего запуска обновления хранятся в таблице
+DataVersion: их видят все процессы (веб-сервер, воркер и beat).
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# Строки DataVersion: version = 1, пока представление устарело;
+# updated_at строки THROTTLE_KEY - время последнего запуска обновления
+DIRTY_KEY = 'leaderboard_dirty'
+THROTTLE_KEY = 'leaderboard_throttle'
+
+MARK_DIRTY_SQL = """
+INSERT INTO win_dataversion (name, version, updated_at) VALUES (%s, 1, now())
+ON CONFLICT (name) DO UPDATE SET version = 1, updated_at = now()
+WHERE win_dataversion.version = 0
+"""
+
+# Строка возвращается, только если обновление в текущем интервале ещё не запускалось
+CLAIM_REFRESH_SQL = """
+INSERT INTO win_dataversion (name, version, updated_at) VALUES (%s, 0, now())
+ON CONFLICT (name) DO UPDATE SET updated_at = now()
+WHERE win_dataversion.updated_at <= now() - make_interval(secs => %s)
+RETURNING name
+"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def refresh_leaderboard():
+    """Пересчитывает представление, не блокируя чтение"""
+    DataVersion.objects.filter(name=DIRTY_KEY).update(version=0)
+    with connection.cursor() as cursor:
+        cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY win_leaderboard")
+
+
+def request_leaderboard_refresh():
+    """
+    Отмечает рейтинг устаревшим. Обновление запускается сразу, если в текущем
+    интервале его ещё не было, иначе его выполнит периодическая задача.
+    """
+    from .tasks import refresh_leaderboard_task
+
+    with connection.cursor() as cursor:
+        cursor.execute(MARK_DIRTY_SQL, [DIRTY_KEY])
+        cursor.execute(CLAIM_REFRESH_SQL, [THROTTLE_KEY, settings.LEADERBOARD_REFRESH_INTERVAL])
+        claimed = cursor.fetchone() is not None
+    if claimed:
+        refresh_leaderboard_task.delay()
+
+
+def refresh_leaderboard_if_dirty():
+    if DataVersion.current(DIRTY_KEY):
+        refresh_leaderboard()
+        return True
+    return False
+
+
+def keyset_page(queryset, request, score_field, id_field):
+    """
+    Страница рейтинга по убыванию (score, id) без OFFSET.
+
+    Параметры запроса:
+    - limit: размер страницы (по умолчанию DEFAULT_PAGE_SIZE, не больше MAX_PAGE_SIZE)
+    - after: курсор "score,id" последней строки предыдущей страницы
+
+    Возвращает (строки страницы, курсор следующей страницы или None).
+    Некорректные параметры вызывают ValueError.
+    """
+    limit = min(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    if limit <= 0:
+        raise ValueError("limit должен быть положительным")
+
+    after = request.query_params.get('after')
+    if after:
+        score, last_id = after.split(',')
+        score, last_id = float(score), int(last_id)
+        queryset = queryset.filter(
+            Q(**{f'{score_field}__lt': score}) |
+            Q(**{score_field: score, f'{id_field}__lt': last_id})
+        )
+
+    rows = list(queryset.order_by(f'-{score_field}', f'-{id_field}')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{getattr(last, score_field)},{getattr(last, id_field)}"
+    return rows, next_cursor
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from win.authentication import ProfileTokenAuthentication
+from win.models import Region, Role, User, UserInfo
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает затраты на аутентификацию по токену: TokenAuthentication DRF, "
+        "ProfileTokenAuthentication без кэша и с кэшами токенов. "
+        "Данные создаются в транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Количество аутентификаций")
+        parser.add_argument('--users', type=int, default=100, help="Количество разных токенов")
+
+    def measure(self, authenticate, keys, requests):
+        """Среднее время (мкс) и количество запросов к БД на одну аутентификацию с доступом к профилю"""
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            for i in range(requests):
+                user, _ = authenticate(keys[i % len(keys)])
+                user.info.role.id, user.info.region.id
+            elapsed = time.perf_counter() - started
+        return elapsed / requests * 1e6, queries / requests
+
+    def handle(self, *args, **options):
+        variants = [
+            ('TokenAuthentication', TokenAuthentication, None),
+            ('ProfileTokenAuthentication', ProfileTokenAuthentication, None),
+            ('+ LocalTokenCache', ProfileTokenAuthentication, 'win.authentication.LocalTokenCache'),
+            ('+ SharedTokenCache', ProfileTokenAuthentication, 'win.authentication.SharedTokenCache'),
+        ]
+        try:
+            with transaction.atomic():
+                region = Region.objects.create(name='Benchmark')
+                role, _ = Role.objects.get_or_create(id=0, defaults={'name': 'Спортсмен'})
+                keys = []
+                for i in range(options['users']):
+                    user = User.objects.create(nickName=f'auth_benchmark_{i}')
+                    UserInfo.objects.create(user=user, surname='Бенчмарк', name=str(i), region=region, role=role)
+                    keys.append(Token.objects.create(user=user).key)
+
+                self.stdout.write(f"{'вариант':<30}{'мкс/запрос':>12}{'запросов к БД':>16}")
+                for name, authentication, cache in variants:
+                    with override_settings(AUTH_TOKEN_CACHE=cache):
+                        micros, queries = self.measure(
+                            authentication().authenticate_credentials, keys, options['requests']
+                        )
+                    self.stdout.write(f"{name:<30}{micros:>12.1f}{queries:>16.2f}")
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test import Client
+
+from win.checks import _pool_available
+
+DEFAULT_POOL = {'min_size': 2, 'max_size': 4, 'timeout': 10}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает задержку запросов к API при новом соединении с базой на каждый "
+        "запрос, постоянных соединениях (CONN_MAX_AGE) и пуле psycopg (если установлен)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Количество запросов на вариант")
+        parser.add_argument('--path', default='/disciplines/', help="Запрашиваемый эндпоинт")
+
+    def configure(self, conn_max_age, pool):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = True
+        if pool:
+            connection.settings_dict['OPTIONS']['pool'] = pool
+        else:
+            connection.settings_dict['OPTIONS'].pop('pool', None)
+
+    def request(self, client, path):
+        # Тестовый клиент отключает close_old_connections, поэтому вызываем его
+        # в начале и конце запроса, как это делает обработчик WSGI
+        close_old_connections()
+        response = client.get(path)
+        close_old_connections()
+        return response
+
+    def measure(self, client, path, requests):
+        """Задержки запросов в миллисекундах (первый запрос - прогрев)"""
+        self.request(client, path)
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = self.request(client, path)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} вернул {response.status_code}")
+        return timings
+
+    def handle(self, *args, **options):
+        original_max_age = connection.settings_dict['CONN_MAX_AGE']
+        original_options = dict(connection.settings_dict['OPTIONS'])
+        pool = original_options.get('pool')
+        if pool is True:
+            pool = DEFAULT_POOL
+
+        variants = [
+            ('новое соединение', 0, None),
+            ('постоянные соединения', original_max_age or 60, None),
+        ]
+        if _pool_available():
+            variants.append(('пул psycopg', 0, pool or DEFAULT_POOL))
+        else:
+            self.stdout.write("psycopg>=3 и psycopg-pool не установлены, вариант с пулом пропущен")
+
+        client = Client()
+        self.stdout.write(f"{'вариант':<26}{'p50, мс':>10}{'p95, мс':>10}{'среднее, мс':>14}")
+        try:
+            for name, conn_max_age, pool_options in variants:
+                self.configure(conn_max_age, pool_options)
+                timings = sorted(self.measure(client, options['path'], options['requests']))
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(
+                    f"{name:<26}{statistics.median(timings):>10.2f}{p95:>10.2f}{statistics.mean(timings):>14.2f}"
+                )
+        finally:
+            connection.close()
+            if connection.pool is not None:
+                connection.close_pool()
+            connection.settings_dict['CONN_MAX_AGE'] = original_max_age
+            connection.settings_dict['OPTIONS'] = original_options
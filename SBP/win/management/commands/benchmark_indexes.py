@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from win.benchmarks import hot_queries, seed_benchmark_data
+
+# Настройки планировщика, при которых индексы не используются
+NO_INDEX_SETTINGS = ['enable_indexscan', 'enable_bitmapscan', 'enable_indexonlyscan']
+
+
+class Rollback(Exception):
+    pass
+
+
+def _plan_nodes(plan):
+    yield plan['Node Type'], plan.get('Index Name')
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время горячих запросов с индексами и без них на синтетических данных. "
+        "Данные создаются в транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--competitions', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5, help="Количество прогонов каждого запроса")
+
+    def explain(self, queryset, repeat):
+        """Лучшее время выполнения по EXPLAIN ANALYZE и узлы плана"""
+        best, nodes = None, []
+        for _ in range(repeat):
+            plan = json.loads(queryset.explain(format='json', analyze=True))[0]
+            if best is None or plan['Execution Time'] < best:
+                best = plan['Execution Time']
+                nodes = list(_plan_nodes(plan['Plan']))
+        return best, nodes
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.stdout.write("Заполнение данными...")
+                sample = seed_benchmark_data(options['users'], options['competitions'])
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+                self.stdout.write(f"{'запрос':<36}{'индекс, мс':>12}{'без индекса, мс':>18}  план")
+                for name, queryset in hot_queries(sample):
+                    indexed, nodes = self.explain(queryset, options['repeat'])
+
+                    with connection.cursor() as cursor:
+                        for setting in NO_INDEX_SETTINGS:
+                            cursor.execute(f"SET LOCAL {setting} = off")
+                    plain, _ = self.explain(queryset, options['repeat'])
+                    with connection.cursor() as cursor:
+                        for setting in NO_INDEX_SETTINGS:
+                            cursor.execute(f"RESET {setting}")
+
+                    scans = ", ".join(
+                        f"{node} ({index})" if index else node
+                        for node, index in nodes if 'Scan' in node
+                    )
+                    self.stdout.write(f"{name:<36}{indexed:>12.3f}{plain:>18.3f}  {scans}")
+                raise Rollback
+        except Rollback:
+            pass
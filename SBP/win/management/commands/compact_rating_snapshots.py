@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from win.utils import compact_rating_snapshots
+
+
+class Command(BaseCommand):
+    help = "Прореживает старую историю рейтинга: одна запись на пользователя за период"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=settings.RATING_SNAPSHOT_RETENTION_DAYS,
+                            help="Записи младше этого срока не трогаются")
+        parser.add_argument('--granularity', choices=['day', 'week', 'month'], default='day')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['keep_days'])
+        deleted = compact_rating_snapshots(before, options['granularity'])
+        self.stdout.write(f"Удалено записей истории: {deleted}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from win.utils import drain_rating_queue, rating_queue_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает состояние очереди пересчёта рейтинга и при необходимости обрабатывает её"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='store_true', help="Обработать очередь")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        stats = rating_queue_stats()
+        self.stdout.write(
+            f"В очереди: {stats['depth']}, самая старая запись ждёт {stats['oldest_age']:.1f} с"
+        )
+        if options['drain']:
+            processed = drain_rating_queue(options['batch_size'])
+            self.stdout.write(f"Пересчитано пользователей: {processed}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from win.stats import rebuild_discipline_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает статистику пользователей по дисциплинам по всей истории участий"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="ID профиля пользователя (можно указать несколько раз)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = rebuild_discipline_stats(options['user_ids'])
+        self.stdout.write(f"Записано строк статистики: {rows}")
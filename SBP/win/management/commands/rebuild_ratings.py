@@ -0,0 +1,91 @@
+import time
+from contextlib import nullcontext
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Coalesce
+
+from win.leaderboard import request_leaderboard_refresh
+from win.models import CompetitionParticipant, UserInfo
+from win.utils import (
+    absorb_pending_rating_updates, compute_rating_arrays, lock_pending_rating_updates, record_rating_snapshots,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает рейтинг и агрегаты рейтинга всех пользователей по всей истории участий "
+        "(векторизованно, без запросов на каждого пользователя). На время пересчёта "
+        "очередь PendingRatingUpdate блокируется, её поправки учитываются пересчётом"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать изменения, не записывая их")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Размер пачки bulk_update")
+        parser.add_argument('--show', type=int, default=20, help="Сколько наибольших изменений вывести")
+
+    def handle(self, *args, **options):
+        timings = {}
+        started = time.perf_counter()
+        dry_run = options['dry_run']
+
+        with nullcontext() if dry_run else transaction.atomic():
+            if not dry_run:
+                # До чтения участий: поправки уже зафиксированных изменений учитываются пересчётом
+                # и удаляются из очереди, новые изменения ждут конца пересчёта
+                lock_pending_rating_updates()
+
+            # Все участия одним запросом
+            rows = list(CompetitionParticipant.objects.annotate(
+                place=Coalesce('result', 0)
+            ).values_list('participant_id', 'competition_id', 'place'))
+            users = list(UserInfo.objects.values_list('id', 'rating', 'rating_score_sum', 'rating_participations'))
+            timings['загрузка'] = time.perf_counter() - started
+
+            step = time.perf_counter()
+            columns = np.array(rows, dtype=np.int64).reshape(-1, 3)
+            user_ids, score_sums, counts, ratings = compute_rating_arrays(columns[:, 0], columns[:, 1], columns[:, 2])
+            computed = {
+                user_id: (rating, score_sum, count)
+                for user_id, rating, score_sum, count in zip(
+                    user_ids.tolist(), ratings.tolist(), score_sums.tolist(), counts.tolist()
+                )
+            }
+
+            changed = []
+            for user_id, rating, score_sum, count in users:
+                new_rating, new_score_sum, new_count = computed.get(user_id, (0.0, 0.0, 0))
+                if (new_rating != rating or new_count != count
+                        or not np.isclose(new_score_sum, score_sum, rtol=0, atol=1e-9)):
+                    changed.append((user_id, rating, new_rating, new_score_sum, new_count))
+            timings['расчёт'] = time.perf_counter() - step
+
+            self.stdout.write(
+                f"Участий: {len(rows)}, пользователей: {len(users)}, изменится: {len(changed)}"
+            )
+            for user_id, old, new, _, _ in sorted(changed, key=lambda row: -abs(row[2] - row[1]))[:options['show']]:
+                self.stdout.write(f"  #{user_id}: {old} -> {new} ({new - old:+.2f})")
+
+            if dry_run:
+                self.stdout.write("Пробный запуск: изменения не записаны")
+            else:
+                step = time.perf_counter()
+                if changed:
+                    UserInfo.objects.bulk_update(
+                        [
+                            UserInfo(id=user_id, rating=new, rating_score_sum=score_sum, rating_participations=count)
+                            for user_id, _, new, score_sum, count in changed
+                        ],
+                        ['rating', 'rating_score_sum', 'rating_participations'],
+                        batch_size=options['batch_size']
+                    )
+                    record_rating_snapshots([(user_id, new) for user_id, old, new, _, _ in changed if new != old])
+                    transaction.on_commit(request_leaderboard_refresh)
+                absorbed = absorb_pending_rating_updates()
+                if absorbed:
+                    self.stdout.write(f"Учтено поправок из очереди: {absorbed}")
+                timings['запись'] = time.perf_counter() - step
+
+        timings['всего'] = time.perf_counter() - started
+        self.stdout.write("Время: " + ", ".join(f"{name} {seconds:.3f} с" for name, seconds in timings.items()))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from win.utils import tick_competition_statuses
+
+
+class Command(BaseCommand):
+    help = "Обновляет статусы соревнований, у которых пересечены границы дат с прошлого прохода"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Работать постоянно")
+        parser.add_argument('--interval', type=float, default=60, help="Пауза между проходами, секунд")
+
+    def handle(self, *args, **options):
+        while True:
+            changes = tick_competition_statuses()
+            total = sum(len(ids) for ids in changes.values())
+            if total or options['verbosity'] > 1:
+                details = ", ".join(f"{new_status}: {len(ids)}" for new_status, ids in changes.items())
+                self.stdout.write(f"Обновлено соревнований: {total} ({details})")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
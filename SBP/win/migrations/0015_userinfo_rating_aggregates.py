@@ -0,0 +1,47 @@
+import math
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """Заполняет агрегаты рейтинга по существующей истории участий"""
+    UserInfo = apps.get_model('win', 'UserInfo')
+    CompetitionParticipant = apps.get_model('win', 'CompetitionParticipant')
+
+    rows = list(CompetitionParticipant.objects.values_list('participant_id', 'competition_id', 'result'))
+    sizes = Counter(competition_id for _, competition_id, _ in rows)
+
+    aggregates = {}
+    for participant_id, competition_id, position in rows:
+        n = sizes[competition_id]
+        score, count = aggregates.get(participant_id, (0.0, 0))
+        if position and position > 0:
+            score += (n - position + 1) / n * math.log2(n + 1)
+        aggregates[participant_id] = (score, count + 1)
+
+    users = list(UserInfo.objects.filter(pk__in=aggregates.keys()))
+    for user in users:
+        user.rating_score_sum, user.rating_participations = aggregates[user.pk]
+    UserInfo.objects.bulk_update(users, ['rating_score_sum', 'rating_participations'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0014_alter_competition_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userinfo',
+            name='rating_participations',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userinfo',
+            name='rating_score_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
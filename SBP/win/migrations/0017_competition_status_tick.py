@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0016_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompetitionStatusTick',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_tick', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='competitiondate',
+            name='end_date',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='competitiondate',
+            name='registration_end',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='competitiondate',
+            name='registration_start',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='competitiondate',
+            name='start_date',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0017_competition_status_tick'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='competition',
+            index=models.Index(fields=['status'], name='win_competition_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['user', 'status'], name='win_invitation_user_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teamapplication',
+            index=models.Index(fields=['competition', 'status'], name='win_teamapp_comp_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userapplication',
+            index=models.Index(fields=['competition', 'status'], name='win_userapp_comp_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinfo',
+            index=models.Index(fields=['role', '-rating'], name='win_userinfo_role_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinfo',
+            index=models.Index(fields=['role', 'is_approved'], name='win_userinfo_role_appr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancyresponse',
+            index=models.Index(fields=['team', 'status'], name='win_vacancyresp_team_st_idx'),
+        ),
+    ]
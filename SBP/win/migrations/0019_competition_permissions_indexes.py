@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 06:47
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0018_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='competition',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['permissions'], name='win_competition_perm_gin', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='competition',
+            index=models.Index(models.Func(models.F('permissions'), function='jsonb_array_length', output_field=models.IntegerField()), name='win_competition_perm_len_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 06:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CREATE_LEADERBOARD = """
+CREATE MATERIALIZED VIEW win_leaderboard AS
+SELECT
+    ui.id AS user_id,
+    ui.region_id,
+    ui.rating,
+    RANK() OVER (ORDER BY ui.rating DESC) AS rank,
+    RANK() OVER (PARTITION BY ui.region_id ORDER BY ui.rating DESC) AS region_rank
+FROM win_userinfo ui
+WHERE ui.role_id = 0;
+
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX win_leaderboard_user_idx ON win_leaderboard (user_id);
+CREATE INDEX win_leaderboard_rating_idx ON win_leaderboard (rating DESC, user_id DESC);
+CREATE INDEX win_leaderboard_region_idx ON win_leaderboard (region_id, rating DESC, user_id DESC);
+"""
+
+DROP_LEADERBOARD = "DROP MATERIALIZED VIEW IF EXISTS win_leaderboard;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0019_competition_permissions_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_LEADERBOARD, DROP_LEADERBOARD),
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='leaderboard', serialize=False, to='win.userinfo')),
+                ('rating', models.FloatField()),
+                ('rank', models.PositiveIntegerField()),
+                ('region_rank', models.PositiveIntegerField()),
+            ],
+            options={
+                'db_table': 'win_leaderboard',
+                'managed': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userdisciplinestats',
+            index=models.Index(fields=['discipline', '-points_count', '-user'], name='win_discstats_board_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+# Начисляем баллы по уже распределённым местам
+FILL_POINTS = """
+UPDATE win_competitionparticipant cp
+SET points = COALESCE((
+    SELECT MAX(pp.points) FROM win_prizepoints pp
+    WHERE pp.competition_type = c.competition_type AND pp.place = cp.result AND cp.result > 0
+), 0)
+FROM win_competition c
+WHERE c.id = cp.competition_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0020_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competitionparticipant',
+            name='points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(FILL_POINTS, migrations.RunSQL.noop),
+    ]
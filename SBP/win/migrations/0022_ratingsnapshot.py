@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 06:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Начальная точка истории - текущий рейтинг всех пользователей
+INITIAL_SNAPSHOTS = """
+INSERT INTO win_ratingsnapshot (user_id, rating, created_at)
+SELECT id, rating, now() FROM win_userinfo
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0021_competitionparticipant_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.FloatField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_snapshots', to='win.userinfo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='win_ratingsnap_user_time_idx'), models.Index(fields=['created_at'], name='win_ratingsnap_time_idx')],
+            },
+        ),
+        migrations.RunSQL(INITIAL_SNAPSHOTS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 06:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0022_ratingsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRatingUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score_delta', models.FloatField(default=0.0)),
+                ('count_delta', models.IntegerField(default=0)),
+                ('enqueued_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='pending_rating_update', to='win.userinfo')),
+            ],
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2 on 2026-10-18 06:57
+
+import math
+from collections import Counter
+
+from django.db import migrations, models
+
+# Оставляем по одной записи на пару (соревнование, участник): с местом, иначе самую раннюю
+DELETE_DUPLICATES = """
+DELETE FROM win_competitionparticipant
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY competition_id, participant_id
+            ORDER BY COALESCE(result, 0) = 0, id
+        ) AS row_number
+        FROM win_competitionparticipant
+    ) ranked
+    WHERE row_number > 1
+)
+RETURNING competition_id
+"""
+
+REBUILD_STATS = """
+INSERT INTO win_userdisciplinestats (user_id, discipline_id, competitions_count, points_count)
+SELECT cp.participant_id, c.discipline_id, COUNT(*), SUM(cp.points)
+FROM win_competitionparticipant cp
+JOIN win_competition c ON c.id = cp.competition_id
+WHERE cp.participant_id = ANY(%s)
+GROUP BY cp.participant_id, c.discipline_id
+"""
+
+
+def remove_duplicate_participants(apps, schema_editor):
+    """
+    Удаляет повторные участия и пересчитывает рейтинг и статистику тех,
+    кого это коснулось: дубликаты входили в размер соревнования, поэтому
+    пересчитываются все участники затронутых соревнований.
+    """
+    UserInfo = apps.get_model('win', 'UserInfo')
+    CompetitionParticipant = apps.get_model('win', 'CompetitionParticipant')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(DELETE_DUPLICATES)
+        competition_ids = {competition_id for competition_id, in cursor.fetchall()}
+    if not competition_ids:
+        return
+
+    user_ids = set(CompetitionParticipant.objects.filter(
+        competition_id__in=competition_ids
+    ).values_list('participant_id', flat=True))
+    rows = list(CompetitionParticipant.objects.filter(
+        participant_id__in=user_ids
+    ).values_list('participant_id', 'competition_id', 'result'))
+    sizes = Counter(CompetitionParticipant.objects.filter(
+        competition_id__in={competition_id for _, competition_id, _ in rows}
+    ).values_list('competition_id', flat=True))
+
+    aggregates = {}
+    for participant_id, competition_id, position in rows:
+        n = sizes[competition_id]
+        score, count = aggregates.get(participant_id, (0.0, 0))
+        if position and position > 0:
+            score += (n - position + 1) / n * math.log2(n + 1)
+        aggregates[participant_id] = (score, count + 1)
+
+    users = list(UserInfo.objects.filter(pk__in=aggregates.keys()))
+    for user in users:
+        user.rating_score_sum, user.rating_participations = aggregates[user.pk]
+        user.rating = round((user.rating_score_sum / math.sqrt(user.rating_participations + 3)) * 100, 2)
+    UserInfo.objects.bulk_update(
+        users, ['rating_score_sum', 'rating_participations', 'rating'], batch_size=1000
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM win_userdisciplinestats WHERE user_id = ANY(%s)", [list(user_ids)])
+        cursor.execute(REBUILD_STATS, [list(user_ids)])
+        cursor.execute("REFRESH MATERIALIZED VIEW win_leaderboard")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0023_pendingratingupdate'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_participants, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='competitionparticipant',
+            constraint=models.UniqueConstraint(fields=('competition', 'participant'), name='win_participant_unique'),
+        ),
+    ]
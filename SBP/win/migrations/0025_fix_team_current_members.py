@@ -0,0 +1,19 @@
+from django.db import migrations
+
+# Счётчик больше не пересчитывается в Team.save(), поэтому выравниваем его с составом команды
+FIX_COUNTERS = """
+UPDATE win_team t
+SET current_members = (SELECT COUNT(*) FROM win_team_members m WHERE m.team_id = t.id)
+WHERE current_members <> (SELECT COUNT(*) FROM win_team_members m WHERE m.team_id = t.id)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0024_competitionparticipant_unique'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FIX_COUNTERS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+# Таблицы, из которых собирается выгрузка соревнований (win.exports)
+EXPORT_TABLES = [
+    'win_competition', 'win_competitiondate', 'win_competitionparticipant',
+    'win_competitionresult', 'win_team', 'win_team_members', 'win_userinfo',
+    'win_user', 'win_region', 'win_role', 'win_discipline',
+]
+
+# Версия увеличивается один раз за транзакцию и при её фиксации (отложенный триггер):
+# блокировка строки версии держится только на время COMMIT
+BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION win_bump_data_version() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('win.bumped_' || TG_ARGV[0], true) IS DISTINCT FROM '1' THEN
+        INSERT INTO win_dataversion (name, version, updated_at)
+        VALUES (TG_ARGV[0], 1, now())
+        ON CONFLICT (name) DO UPDATE
+        SET version = win_dataversion.version + 1, updated_at = now();
+        PERFORM set_config('win.bumped_' || TG_ARGV[0], '1', true);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+CREATE_TRIGGER = """
+CREATE CONSTRAINT TRIGGER win_{table}_export_version
+AFTER INSERT OR UPDATE OR DELETE ON {table}
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION win_bump_data_version('export')
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS win_{table}_export_version ON {table}"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0026_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(BUMP_FUNCTION, "DROP FUNCTION IF EXISTS win_bump_data_version()"),
+        migrations.RunSQL(
+            [CREATE_TRIGGER.format(table=table) for table in EXPORT_TABLES],
+            [DROP_TRIGGER.format(table=table) for table in EXPORT_TABLES],
+        ),
+    ]
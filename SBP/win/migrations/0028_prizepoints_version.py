@@ -0,0 +1,23 @@
+from django.db import migrations
+
+# Версия таблицы призовых баллов (DataVersion 'prize_points') для кэша в памяти процессов
+# (win.stats.prize_points_table); функция win_bump_data_version - из миграции 0027
+CREATE_TRIGGER = """
+CREATE CONSTRAINT TRIGGER win_prizepoints_version
+AFTER INSERT OR UPDATE OR DELETE ON win_prizepoints
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION win_bump_data_version('prize_points')
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS win_prizepoints_version ON win_prizepoints"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0027_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
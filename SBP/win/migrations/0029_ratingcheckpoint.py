@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0028_prizepoints_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+            ],
+        ),
+    ]
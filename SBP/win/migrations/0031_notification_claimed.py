@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0030_notification_sending'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='win_notification_sending_idx',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('claimed', 'Взято ботом'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('skipped', 'Нет Telegram'), ('failed', 'Ошибка')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('status__in', ['claimed', 'sending'])), fields=['available_at'], name='win_notification_sending_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('win', '0031_notification_claimed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invitation',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='invitations', to='win.userinfo'),
+        ),
+        migrations.AlterField(
+            model_name='teamapplication',
+            name='competition',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='team_applications', to='win.competition'),
+        ),
+        migrations.AlterField(
+            model_name='userapplication',
+            name='competition',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_applications', to='win.competition'),
+        ),
+        migrations.AlterField(
+            model_name='userinfo',
+            name='role',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='users', to='win.role'),
+        ),
+        migrations.AlterField(
+            model_name='vacancyresponse',
+            name='team',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='win.team'),
+        ),
+    ]
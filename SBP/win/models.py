@@ -1,5 +1,6 @@
 
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from django.core.validators import MinValueValidator
@@ -52,19 +53,46 @@ class UserInfo(models.Model):
     name = models.CharField(max_length=100)
     patronymic = models.CharField(max_length=100, blank=True, null=True)
     region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='users')
-    role = models.ForeignKey(Role, on_delete=models.PROTECT, related_name='users')
+    # Индекс - ведущая колонка составного индекса в Meta.indexes
+    role = models.ForeignKey(Role, on_delete=models.PROTECT, related_name='users', db_index=False)
     birthday = models.DateField(null=True)
     tg_username = models.CharField(max_length=30, null=True, blank=True)
 
 
     is_approved = models.BooleanField(default=False)  # Новое поле
     rating = models.FloatField(default=0.0, verbose_name="Рейтинг")  # Добавляем это
+    # Накопленные агрегаты для инкрементального пересчёта рейтинга
+    rating_score_sum = models.FloatField(default=0.0)
+    rating_participations = models.PositiveIntegerField(default=0)
     
     def update_rating(self):
-        """Метод для обновления рейтинга"""
-        from .utils import calculate_user_rating
-        self.rating = calculate_user_rating(self)
-        self.save(update_fields=['rating'])
+        """
+        Полный пересчёт рейтинга и агрегатов по всей истории участий (по требованию).
+        Поправки пользователя в очереди PendingRatingUpdate учтены пересчётом и удаляются
+        в той же транзакции.
+        """
+        from .utils import (
+            absorb_pending_rating_updates, calculate_rating_aggregates, lock_pending_rating_updates,
+            rating_from_aggregates, record_rating_snapshots,
+        )
+        old_rating = self.rating
+        with transaction.atomic():
+            lock_pending_rating_updates([self.pk])
+            self.rating_score_sum, self.rating_participations = calculate_rating_aggregates(self)
+            self.rating = rating_from_aggregates(self.rating_score_sum, self.rating_participations)
+            self.save(update_fields=['rating', 'rating_score_sum', 'rating_participations'])
+            absorb_pending_rating_updates([self.pk])
+            if self.rating != old_rating:
+                record_rating_snapshots([(self.pk, self.rating)])
+
+    class Meta:
+        indexes = [
+            # Рейтинг спортсменов: WHERE role_id = 0 ORDER BY rating DESC
+            models.Index(fields=['role', '-rating'], name='win_userinfo_role_rating_idx'),
+            # Модерация и список региональных представителей
+            models.Index(fields=['role', 'is_approved'], name='win_userinfo_role_appr_idx'),
+        ]
+
     def __str__(self):
         return f"{self.surname} {self.name} ({self.user.nickName})"
 
@@ -83,12 +111,46 @@ class UserDisciplineStats(models.Model):
     class Meta:
         unique_together = ('user', 'discipline')
         verbose_name_plural = 'User discipline statistics'
+        indexes = [
+            # Рейтинг по дисциплине с keyset-пагинацией по (points_count, user_id)
+            models.Index(fields=['discipline', '-points_count', '-user'], name='win_discstats_board_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user} in {self.discipline}: {self.competitions_count} comps, {self.points_count} pts"
 
 
+class Leaderboard(models.Model):
+    """
+    Рейтинг спортсменов (материализованное представление win_leaderboard).
+    Места считаются при обновлении представления, см. leaderboard.refresh_leaderboard.
+    """
+    user = models.OneToOneField(
+        UserInfo, on_delete=models.DO_NOTHING, primary_key=True, related_name='leaderboard'
+    )
+    region = models.ForeignKey(Region, on_delete=models.DO_NOTHING, related_name='+')
+    rating = models.FloatField()
+    rank = models.PositiveIntegerField()
+    region_rank = models.PositiveIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'win_leaderboard'
+
+    def __str__(self):
+        return f"#{self.rank} {self.user_id}: {self.rating}"
+
+
+# Количество регионов в permissions (jsonb_array_length), под него есть индекс
+PERMISSIONS_COUNT = models.Func(
+    models.F('permissions'), function='jsonb_array_length', output_field=models.IntegerField()
+)
+
+
 class Competition(models.Model):
+    # Соревнование, открытое для всех регионов, перечисляет их все в permissions
+    ALL_REGIONS_COUNT = 89
+
     ONLINE = 'online'
     OFFLINE = 'offline'
     COMPETITION_TYPE_CHOICES = [
@@ -115,17 +177,42 @@ class Competition(models.Model):
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     permissions = models.JSONField(default=list, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='win_competition_status_idx'),
+            # Допуск региона: permissions @> '[region_id]'
+            GinIndex(fields=['permissions'], opclasses=['jsonb_path_ops'], name='win_competition_perm_gin'),
+            # Закрытые (0) и открытые для всех регионов соревнования
+            models.Index(PERMISSIONS_COUNT, name='win_competition_perm_len_idx'),
+        ]
+
 
 class CompetitionDate(models.Model):
     competition = models.OneToOneField(Competition, on_delete=models.CASCADE, related_name='dates')
-    start_date = models.DateTimeField()
-    end_date = models.DateTimeField()
-    registration_start = models.DateTimeField()
-    registration_end = models.DateTimeField()
+    start_date = models.DateTimeField(db_index=True)
+    end_date = models.DateTimeField(db_index=True)
+    registration_start = models.DateTimeField(db_index=True)
+    registration_end = models.DateTimeField(db_index=True)
 
     def __str__(self):
         return f"Dates for {self.competition}"
+
+
+class CompetitionStatusTick(models.Model):
+    """Время последнего прохода планировщика статусов соревнований (одна запись)"""
+    last_tick = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Status tick at {self.last_tick}"
    
+class TeamFull(Exception):
+    """В команде нет свободных мест"""
+
+
+class AlreadyTeamMember(Exception):
+    """Пользователь уже состоит в команде"""
+
+
 class Team(models.Model):
     competition = models.ForeignKey(Competition, on_delete=models.CASCADE, related_name='teams')
     name = models.CharField(max_length=100)
@@ -139,11 +226,28 @@ class Team(models.Model):
     def __str__(self):
         return f"{self.name} ({self.competition})"
 
-    def save(self, *args, **kwargs):
-        # Автоматическое обновление current_members при сохранении
-        if self.pk:  # Если объект уже сохранен в БД
-            self.current_members = self.members.count()
-        super().save(*args, **kwargs)
+    def admit(self, user_info):
+        """
+        Добавляет участника в команду.
+
+        Место занимается условным UPDATE (current_members < max_members),
+        который блокирует строку команды до конца транзакции, поэтому
+        параллельные принятия не переполняют команду. Если мест нет -
+        TeamFull, если пользователь уже в команде - AlreadyTeamMember
+        (счётчик в обоих случаях не меняется).
+        """
+        with transaction.atomic():
+            taken = Team.objects.filter(
+                pk=self.pk,
+                current_members__lt=models.F('max_members')
+            ).update(current_members=models.F('current_members') + 1)
+            if not taken:
+                raise TeamFull(self.max_members)
+            # Проверка после UPDATE: строка команды уже заблокирована
+            if self.members.filter(pk=user_info.pk).exists():
+                raise AlreadyTeamMember(user_info.pk)
+            self.members.add(user_info)
+        self.refresh_from_db(fields=['current_members'])
 
     
 class Invitation(models.Model):
@@ -154,20 +258,32 @@ class Invitation(models.Model):
     ]
     
     team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='invitations')
-    user = models.ForeignKey('UserInfo', on_delete=models.CASCADE, related_name='invitations')
+    # Индекс - ведущая колонка составного индекса в Meta.indexes
+    user = models.ForeignKey('UserInfo', on_delete=models.CASCADE, related_name='invitations', db_index=False)
     status = models.CharField(max_length=25, choices=STATUS_CHOICES, default='Ожидает')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status'], name='win_invitation_user_st_idx'),
+        ]
+
     
 class TeamApplication(models.Model):
 
     team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='team_applications')
     status = models.CharField(max_length=25)
-    competition = models.ForeignKey('Competition', on_delete=models.CASCADE, related_name='team_applications')
+    # Индекс - ведущая колонка составного индекса в Meta.indexes
+    competition = models.ForeignKey(
+        'Competition', on_delete=models.CASCADE, related_name='team_applications', db_index=False
+    )
     reason = models.TextField(blank=True, null=True)
 
     class Meta:
         verbose_name = "Team Application"
         verbose_name_plural = "Team Applications"
+        indexes = [
+            models.Index(fields=['competition', 'status'], name='win_teamapp_comp_st_idx'),
+        ]
 
     def __str__(self):
         return f"Application from {self.team.name} - {self.status}"
@@ -180,7 +296,10 @@ class UserApplication(models.Model):
     ]
     
     user = models.ForeignKey('UserInfo', on_delete=models.CASCADE, related_name='user_applications')
-    competition = models.ForeignKey('Competition', on_delete=models.CASCADE, related_name='user_applications')
+    # Индекс - ведущая колонка составного индекса в Meta.indexes
+    competition = models.ForeignKey(
+        'Competition', on_delete=models.CASCADE, related_name='user_applications', db_index=False
+    )
     status = models.CharField(max_length=25, choices=STATUS_CHOICES, default='pending')
     reason = models.TextField(blank=True, null=True)
 
@@ -188,6 +307,9 @@ class UserApplication(models.Model):
         unique_together = ['user', 'competition']  # Одна заявка от пользователя на соревнование
         verbose_name = "User Application"
         verbose_name_plural = "User Applications"
+        indexes = [
+            models.Index(fields=['competition', 'status'], name='win_userapp_comp_st_idx'),
+        ]
 
     def __str__(self):
         return f"Application from {self.user} to {self.competition} - {self.status}"
@@ -209,13 +331,19 @@ class VacancyResponse(models.Model):
         choices=STATUS_CHOICES,
         default=PENDING
     )
-    team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='responses')
+    # Индекс - ведущая колонка составного индекса в Meta.indexes
+    team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='responses', db_index=False)
     user = models.ForeignKey(
         UserInfo,  # Или 'UserInfo' если используете эту модель
         on_delete=models.CASCADE,
         related_name='responses'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', 'status'], name='win_vacancyresp_team_st_idx'),
+        ]
+
     def __str__(self):
         return f"Отклик от {self.user} в команду {self.team.name}"
     
@@ -237,6 +365,21 @@ class CompetitionParticipant(models.Model):
     competition = models.ForeignKey('Competition', on_delete=models.CASCADE, related_name='participants')
     participant = models.ForeignKey('UserInfo', on_delete=models.CASCADE, related_name='competition_participations')
     result = models.PositiveIntegerField(validators=[MinValueValidator(1)], null = True, default=0)
+    points = models.PositiveIntegerField(default=0)  # Начисленные призовые баллы (по PrizePoints)
+
+    class Meta:
+        constraints = [
+            # Повторное зачисление не создаёт дублей (enroll_participants полагается на это)
+            models.UniqueConstraint(fields=['competition', 'participant'], name='win_participant_unique'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные значения, чтобы сигнал рейтинга считал разницу
+        if 'participant_id' in field_names and 'result' in field_names:
+            instance._rated_state = (instance.participant_id, instance.result)
+        return instance
     
 class CompetitionOrganizer(models.Model):
     user = models.ForeignKey(UserInfo, on_delete=models.CASCADE, related_name='organized_competitions')
@@ -288,4 +431,170 @@ class News(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class DataVersion(models.Model):
+    """
+    Версия набора данных: счётчик увеличивается триггерами PostgreSQL
+    при фиксации любой транзакции, изменившей таблицы набора (миграция 0027).
+    Строка создаётся при первом изменении, до этого версия равна 0.
+    """
+    EXPORT = 'export'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка соревнований и участников в файл"""
+    XLSX = 'xlsx'
+    CSV = 'csv'
+    FORMAT_CHOICES = [
+        (XLSX, 'Excel'),
+        (CSV, 'CSV'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE, null=True, blank=True, related_name='export_jobs')
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=XLSX)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    data_version = models.CharField(max_length=64)  # Версия данных (DataVersion) на момент постановки задачи
+    file_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['competition', 'file_format', 'data_version'], name='win_exportjob_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"Export #{self.pk} ({self.file_format}, {self.status})"
+
+
+class RatingSnapshot(models.Model):
+    """
+    История рейтинга: строка на каждое изменение рейтинга пользователя (только добавление).
+    Старые записи прореживаются командой compact_rating_snapshots.
+    """
+    user = models.ForeignKey(UserInfo, on_delete=models.CASCADE, related_name='rating_snapshots')
+    rating = models.FloatField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # История пользователя и рейтинг на момент времени (DISTINCT ON user_id)
+            models.Index(fields=['user', 'created_at'], name='win_ratingsnap_user_time_idx'),
+            # Прореживание старых записей
+            models.Index(fields=['created_at'], name='win_ratingsnap_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.rating} at {self.created_at}"
+
+
+class RatingCheckpoint(models.Model):
+    """
+    Полный срез истории рейтинга: в момент taken_at у каждого пользователя
+    с историей есть запись RatingSnapshot. Рейтинг на момент T ищется только
+    среди записей начиная с последнего среза не позже T (utils.take_rating_checkpoint).
+    """
+    taken_at = models.DateTimeField(unique=True)
+
+    def __str__(self):
+        return f"Rating checkpoint at {self.taken_at}"
+
+
+class PendingRatingUpdate(models.Model):
+    """
+    Очередь отложенного пересчёта рейтинга: одна строка на пользователя,
+    поправки одного пользователя суммируются до обработки очереди.
+    """
+    # Без внешнего ключа в БД: поправка может попасть в очередь при каскадном
+    # удалении самого пользователя, такие строки просто пропускаются при обработке
+    user = models.OneToOneField(
+        UserInfo, on_delete=models.DO_NOTHING, db_constraint=False, related_name='pending_rating_update'
+    )
+    score_delta = models.FloatField(default=0.0)
+    count_delta = models.IntegerField(default=0)
+    enqueued_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Pending rating update for {self.user_id}: {self.score_delta:+}, {self.count_delta:+}"
+
+
+class Notification(models.Model):
+    """
+    Исходящее уведомление пользователю в Telegram (outbox).
+    Создаётся в транзакции вместе с событием; бот забирает ожидающие записи
+    пачками (FOR UPDATE SKIP LOCKED) со статусом 'claimed' и сроком аренды
+    в available_at; непосредственно перед отправкой запись переходит в 'sending',
+    после отправки отмечается результат.
+    """
+    PENDING = 'pending'
+    CLAIMED = 'claimed'
+    SENDING = 'sending'
+    SENT = 'sent'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает отправки'),
+        (CLAIMED, 'Взято ботом'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (SKIPPED, 'Нет Telegram'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    recipient = models.ForeignKey(UserInfo, on_delete=models.CASCADE, related_name='notifications')
+    key = models.CharField(max_length=100)  # Событие, например 'application:15:approved'
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Не отправлять раньше (повтор после ошибки); для 'claimed' и 'sending' - окончание аренды
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            # Одно уведомление о событии на получателя
+            models.UniqueConstraint(fields=['recipient', 'key'], name='win_notification_unique'),
+        ]
+        indexes = [
+            # Очередь бота: только ожидающие отправки
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='win_notification_pending_idx',
+            ),
+            # Записи с истёкшей арендой (бот остановился, не отметив результат)
+            models.Index(
+                fields=['available_at'],
+                condition=models.Q(status__in=['claimed', 'sending']),
+                name='win_notification_sending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification {self.key} for {self.recipient_id} ({self.status})"
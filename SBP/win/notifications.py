@@ -0,0 +1,143 @@
+"""
+Уведомления пользователей в Telegram через таблицу-outbox (Notification).
+
+Записи создаются в транзакции вместе с событием: уведомление появляется,
+только если событие зафиксировано, и не теряется при перезапуске бота.
+Бот (Bot/outbox.py) забирает их пачками и доставляет.
+Ключ события уникален для получателя, поэтому повтор того же события
+(повторный запрос, повторный проход планировщика) второго уведомления не создаёт.
+"""
+from .models import Competition, CompetitionOrganizer, CompetitionParticipant, Notification, UserApplication
+
+STATUS_TEXTS = {
+    'waiting': "регистрация ещё не началась",
+    'registration': "открыта регистрация",
+    'running': "соревнование началось",
+    'finished': "соревнование завершилось",
+}
+
+
+def notify(recipient_ids, key, text):
+    """Ставит уведомление о событии key в очередь для каждого получателя (ID UserInfo)"""
+    Notification.objects.bulk_create(
+        [Notification(recipient_id=recipient_id, key=key, text=text) for recipient_id in dict.fromkeys(recipient_ids)],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def notify_application_decision(application):
+    """Решение организатора по заявке пользователя на соревнование"""
+    competition = application.competition
+    if application.status == 'approved':
+        text = f"Ваша заявка на соревнование «{competition.name}» одобрена."
+    else:
+        text = f"Ваша заявка на соревнование «{competition.name}» отклонена."
+        if application.reason:
+            text += f"\nПричина: {application.reason}"
+    notify([application.user_id], f"application:{application.pk}:{application.status}", text)
+
+
+def notify_applications_approved(competition, applications):
+    """Массовое одобрение заявок: applications - пары (ID заявки, ID пользователя)"""
+    text = f"Ваша заявка на соревнование «{competition.name}» одобрена."
+    Notification.objects.bulk_create(
+        [
+            Notification(recipient_id=user_id, key=f"application:{pk}:approved", text=text)
+            for pk, user_id in applications
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def notify_team_application_decision(application):
+    """Решение по заявке команды - всем участникам команды"""
+    team = application.team
+    if application.status == 'accepted':
+        text = f"Заявка команды «{team.name}» на соревнование «{team.competition.name}» одобрена."
+    else:
+        text = f"Заявка команды «{team.name}» на соревнование «{team.competition.name}» отклонена."
+        if application.reason:
+            text += f"\nПричина: {application.reason}"
+    notify(
+        team.members.values_list('id', flat=True),
+        f"team_application:{application.pk}:{application.status}",
+        text,
+    )
+
+
+def notify_invitation(invitation):
+    """Приглашение в команду"""
+    team = invitation.team
+    notify(
+        [invitation.user_id],
+        f"invitation:{invitation.pk}",
+        f"Вас пригласили в команду «{team.name}» (соревнование «{team.competition.name}»). "
+        f"Ответить на приглашение можно на сайте.",
+    )
+
+
+def notify_status_changes(changes):
+    """
+    Смена статусов соревнований (результат advance_competition_statuses) -
+    участникам и пользователям с действующими заявками
+    """
+    changed = {comp_id: new_status for new_status, ids in changes.items() for comp_id in ids}
+    if not changed:
+        return
+
+    recipients = {}
+    for comp_id, user_id in CompetitionParticipant.objects.filter(
+        competition_id__in=changed
+    ).values_list('competition_id', 'participant_id'):
+        recipients.setdefault(comp_id, set()).add(user_id)
+    for comp_id, user_id in UserApplication.objects.filter(
+        competition_id__in=changed, status__in=['pending', 'approved']
+    ).values_list('competition_id', 'user_id'):
+        recipients.setdefault(comp_id, set()).add(user_id)
+    if not recipients:
+        return
+
+    names = dict(Competition.objects.filter(id__in=recipients).values_list('id', 'name'))
+    notifications = []
+    for comp_id, user_ids in recipients.items():
+        new_status = changed[comp_id]
+        text = f"Соревнование «{names[comp_id]}»: {STATUS_TEXTS.get(new_status, new_status)}."
+        notifications.extend(
+            Notification(recipient_id=user_id, key=f"competition:{comp_id}:status:{new_status}", text=text)
+            for user_id in user_ids
+        )
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True, batch_size=1000)
+
+
+def notify_results(competition, results):
+    """
+    Публикация результатов: results - {ID пользователя: место}.
+    Ключ включает место, поэтому исправленный результат приходит повторно.
+    """
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                recipient_id=user_id,
+                key=f"competition:{competition.pk}:result:{place}",
+                text=f"Опубликованы результаты соревнования «{competition.name}». Ваше место: {place}.",
+            )
+            for user_id, place in results.items()
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def notify_competition_decision(competition, action):
+    """Решение модератора по соревнованию - организаторам (до удаления при отклонении)"""
+    if action == 'accept':
+        text = f"Соревнование «{competition.name}» подтверждено и опубликовано."
+    else:
+        text = f"Соревнование «{competition.name}» отклонено модератором."
+    notify(
+        CompetitionOrganizer.objects.filter(competition=competition).values_list('user_id', flat=True),
+        f"competition:{competition.pk}:{action}",
+        text,
+    )
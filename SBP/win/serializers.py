@@ -2,8 +2,12 @@
 from rest_framework import serializers
 from .models import *
 from rest_framework.exceptions import ValidationError
+from django.db import transaction
+from django.urls import reverse
 from datetime import date
 import logging
+from .enrollment import enroll_participants
+from .notifications import notify_team_application_decision
 
 logger = logging.getLogger(__name__)
 
@@ -178,7 +182,7 @@ class TeamCreateSerializer(serializers.ModelSerializer):
         """
         request = self.context['request']
         try:
-            creator = UserInfo.objects.get(user=request.user)
+            creator = request.user.info
         except UserInfo.DoesNotExist:
             raise serializers.ValidationError(
                 "Профиль пользователя не заполнен. Заполните профиль перед созданием команды."
@@ -219,7 +223,7 @@ class TeamCreateSerializer(serializers.ModelSerializer):
         4. Обновление счетчика участников (current_members)
         """
         request = self.context['request']
-        creator = UserInfo.objects.get(user=request.user)
+        creator = request.user.info
         
         # Определяем капитана
         captain_id = request.data.get('captain_id')
@@ -250,7 +254,7 @@ class TeamCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         request = self.context['request']
-        captain = UserInfo.objects.get(user=request.user)
+        captain = request.user.info
         competition = validated_data['competition']
         
         # Сначала создаем команду без members
@@ -264,9 +268,8 @@ class TeamCreateSerializer(serializers.ModelSerializer):
             current_members=1
         )
         
-        # Затем добавляем капитана в members
+        # Затем добавляем капитана в members (он уже учтён в current_members=1)
         team.members.add(captain)
-        team.save()  # Сохраняем обновленный current_members
         
         return team
         
@@ -419,6 +422,7 @@ class InvitationResponseSerializer(serializers.ModelSerializer):
             )
         return attrs
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Обрабатывает действие с приглашением:
@@ -429,20 +433,17 @@ class InvitationResponseSerializer(serializers.ModelSerializer):
         team = instance.team
         
         if action == 'accept':
-            # Проверка максимального количества участников
-            if team.members.count() >= team.competition.max_participants:
+            # Добавляем пользователя в команду (место занимается атомарно)
+            try:
+                team.admit(instance.user)
+            except TeamFull:
                 raise serializers.ValidationError(
-                    f"Команда уже достигла максимума ({team.competition.max_participants} участников)"
+                    f"Команда уже достигла максимума ({team.max_members} участников)"
                 )
-            
-            # Проверка что пользователь не уже в команде
-            if team.members.filter(id=instance.user.id).exists():
+            except AlreadyTeamMember:
                 raise serializers.ValidationError(
                     "Вы уже состоите в этой команде"
                 )
-            
-            # Добавляем пользователя в команду
-            team.members.add(instance.user)
             instance.status = 'Принято'
         else:
             # Отклоняем приглашение
@@ -570,26 +571,26 @@ class TeamApplicationResponseSerializer(serializers.ModelSerializer):
         
         return attrs
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Обновляет статус заявки и выполняет соответствующие действия"""
         action = validated_data['action']
         
         if action == 'accept':
-            # Добавляем всех участников команды в соревнование
-            for member in instance.team.members.all():
-                CompetitionParticipant.objects.get_or_create(
-                    competition=instance.team.competition,
-                    participant=member
-                )
+            # Добавляем всех участников команды в соревнование одним запросом
+            enroll_participants(
+                instance.team.competition,
+                instance.team.members.values_list('id', flat=True)
+            )
             
             instance.status = 'accepted'
             instance.reason = None
-            instance.team.save()
         else:
             instance.status = 'rejected'
             instance.reason = validated_data['reason']
         
         instance.save()
+        notify_team_application_decision(instance)
         return instance
     
 
@@ -620,8 +621,8 @@ class CompetitionSerializer(serializers.ModelSerializer):
     - Добавляет human-readable поля для типов (competition_type_display, type_display)
     - Включает вычисляемое поле permissions_status:
       * 0 - нет разрешений
-      * 1 - разрешения есть, но не для всех регионов (не 89)
-      * 2 - полный набор разрешений (89 регионов)
+      * 1 - разрешения есть, но не для всех регионов (не Competition.ALL_REGIONS_COUNT)
+      * 2 - полный набор разрешений (Competition.ALL_REGIONS_COUNT регионов)
     - Обрабатывает вложенный объект dates через CompetitionDateSerializer
     
     Методы:
@@ -676,9 +677,9 @@ class CompetitionSerializer(serializers.ModelSerializer):
     def get_permissions_status(self, obj):
         if not obj.permissions:  # Если permissions пустое
             return 0
-        elif len(obj.permissions) != 89:  # Если длина permissions не равна 89
+        elif len(obj.permissions) != Competition.ALL_REGIONS_COUNT:  # Разрешены не все регионы
             return 1
-        else:  # Если длина permissions равна 89
+        else:  # Разрешены все регионы
             return 2
 
     def create(self, validated_data):
@@ -787,7 +788,7 @@ class UserApplicationSerializer(serializers.ModelSerializer):
         
         # Получаем профиль пользователя
         try:
-            user_info = UserInfo.objects.get(user=user)
+            user_info = user.info
         except UserInfo.DoesNotExist:
             raise serializers.ValidationError("Профиль пользователя не найден")
 
@@ -833,7 +834,7 @@ class UserApplicationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Создание заявки с привязкой к пользователю"""
         user = self.context['request'].user
-        user_info = UserInfo.objects.get(user=user)
+        user_info = user.info
         return UserApplication.objects.create(
             user=user_info,
             **validated_data
@@ -1252,4 +1253,84 @@ class UserVacancyResponseSerializer(serializers.ModelSerializer):
         
 class CompetitionDecisionSerializer(serializers.Serializer):
     competition_id = serializers.IntegerField()
-    action = serializers.ChoiceField(choices=['accept', 'reject'])
\ No newline at end of file
+    action = serializers.ChoiceField(choices=['accept', 'reject'])        
+class ExportJobCreateSerializer(serializers.Serializer):
+    """
+    Параметры фоновой выгрузки
+    
+    Поля:
+    - competition_id: ID соревнования (опционально, без него - все соревнования)
+    - format: xlsx или csv
+    """
+    competition_id = serializers.IntegerField(required=False, allow_null=True)
+    format = serializers.ChoiceField(choices=ExportJob.FORMAT_CHOICES, default=ExportJob.XLSX)
+
+    def validate_competition_id(self, value):
+        if value and not Competition.objects.filter(pk=value).exists():
+            raise serializers.ValidationError("Соревнование не найдено")
+        return value
+        
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор состояния фоновой выгрузки
+    
+    Поля:
+    - id, competition, file_format, status, error
+    - created_at, finished_at
+    - download_url: ссылка на файл (только для готовых выгрузок)
+    """
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'competition', 'file_format', 'status', 'error',
+                  'created_at', 'finished_at', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.DONE:
+            return None
+        return reverse('export-job-file', args=[obj.id])
+
+
+class LeaderboardSerializer(serializers.ModelSerializer):
+    """
+    Строка общего или регионального рейтинга:
+    - id, ФИО и никнейм спортсмена
+    - регион, рейтинг
+    - место в общем (rank) и региональном (region_rank) рейтинге
+    """
+    id = serializers.IntegerField(source='user_id')
+    surname = serializers.CharField(source='user.surname')
+    name = serializers.CharField(source='user.name')
+    nickName = serializers.CharField(source='user.user.nickName')
+    region = serializers.IntegerField(source='region_id')
+
+    class Meta:
+        model = Leaderboard
+        fields = ['id', 'surname', 'name', 'nickName', 'region', 'rating', 'rank', 'region_rank']
+
+
+class DisciplineLeaderboardSerializer(serializers.ModelSerializer):
+    """Строка рейтинга по дисциплине: спортсмен, количество соревнований и баллов"""
+    id = serializers.IntegerField(source='user_id')
+    surname = serializers.CharField(source='user.surname')
+    name = serializers.CharField(source='user.name')
+    nickName = serializers.CharField(source='user.user.nickName')
+    region = serializers.IntegerField(source='user.region_id')
+
+    class Meta:
+        model = UserDisciplineStats
+        fields = ['id', 'surname', 'name', 'nickName', 'region', 'competitions_count', 'points_count']
+
+
+class RatingSnapshotLeaderboardSerializer(serializers.ModelSerializer):
+    """Строка рейтинга на момент времени: спортсмен и его рейтинг по последнему снимку"""
+    id = serializers.IntegerField(source='user_id')
+    surname = serializers.CharField(source='user.surname')
+    name = serializers.CharField(source='user.name')
+    nickName = serializers.CharField(source='user.user.nickName')
+
+    class Meta:
+        model = RatingSnapshot
+        fields = ['id', 'surname', 'name', 'nickName', 'rating', 'created_at']
@@ -1,8 +1,167 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models import Count, Q
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from .models import CompetitionParticipant
+from rest_framework.authtoken.models import Token
+from .authentication import get_token_cache, invalidate_tokens, invalidate_user_tokens
+from .leaderboard import request_leaderboard_refresh
+from .models import Competition, CompetitionParticipant, PrizePoints, Region, Role, User, UserInfo
+from .stats import (
+    add_stats_delta, apply_discipline_stats_deltas, invalidate_prize_points,
+    participation_points, prize_points_table, rebuild_discipline_stats,
+)
+from .utils import place_score, add_rating_delta, competition_size_deltas, enqueue_rating_deltas
 
-@receiver([post_save, post_delete], sender=CompetitionParticipant)
-def update_user_rating(sender, instance, **kwargs):
-    """Обновляем рейтинг при изменении участия"""
-    instance.participant.update_rating()
\ No newline at end of file
+def _competition_size(competition_id):
+    return CompetitionParticipant.objects.filter(competition_id=competition_id).count()
+
+
+def _competition_counts(competition_id):
+    """(участников, участников с местом) соревнования одним запросом"""
+    counts = CompetitionParticipant.objects.filter(competition_id=competition_id).aggregate(
+        size=Count('id'),
+        ranked=Count('id', filter=Q(result__gt=0)),
+    )
+    return counts['size'], counts['ranked']
+
+
+def _delete_sizes(origin):
+    """
+    Размеры соревнований до удаления участников, по одной записи на операцию
+    удаления. Хранятся на объекте, у которого вызван delete() (origin), поэтому
+    не переживают его и не попадают в другие удаления, даже если удаление
+    завершилось ошибкой. Без origin (сигнал отправлен вручную) - своя запись на каждый вызов.
+    """
+    if origin is None:
+        return {}
+    return origin.__dict__.setdefault('_participant_sizes_before_delete', {})
+
+
+def _competition_info(competition_id):
+    """(ID дисциплины, формат) соревнования для статистики по дисциплинам"""
+    return Competition.objects.values_list('discipline_id', 'competition_type').get(pk=competition_id)
+
+
+@receiver(post_save, sender=CompetitionParticipant)
+def update_user_rating(sender, instance, created, **kwargs):
+    """Инкрементально обновляем рейтинг и статистику по дисциплине при изменении участия"""
+    size, ranked = _competition_counts(instance.competition_id)
+    discipline_id, competition_type = _competition_info(instance.competition_id)
+    deltas = {}
+    stats_deltas = {}
+
+    # Баллы участия по текущему месту; в статистике учитывается разница с уже начисленными
+    old_points = instance.points
+    new_points = participation_points(prize_points_table(), competition_type, instance.result)
+    if new_points != old_points:
+        CompetitionParticipant.objects.filter(pk=instance.pk).update(points=new_points)
+        instance.points = new_points
+
+    if created:
+        add_rating_delta(deltas, instance.participant_id, place_score(size, instance.result), 1)
+        # Размер соревнования меняет очки остальных участников, только если у них уже есть места
+        # (обычно участники добавляются до распределения мест, и сканирование не нужно)
+        if ranked - (1 if instance.result and instance.result > 0 else 0) > 0:
+            competition_size_deltas(instance.competition_id, size - 1, size, deltas, exclude_pk=instance.pk)
+        add_stats_delta(stats_deltas, instance.participant_id, discipline_id, 1, new_points)
+    else:
+        previous = getattr(instance, '_rated_state', None)
+        if previous is None:
+            # Исходные значения неизвестны - пересчитываем пользователя целиком
+            instance.participant.update_rating()
+            rebuild_discipline_stats([instance.participant_id])
+        else:
+            old_participant_id, old_result = previous
+            if old_participant_id == instance.participant_id:
+                add_rating_delta(
+                    deltas,
+                    instance.participant_id,
+                    place_score(size, instance.result) - place_score(size, old_result)
+                )
+            else:
+                add_rating_delta(deltas, old_participant_id, -place_score(size, old_result), -1)
+                add_rating_delta(deltas, instance.participant_id, place_score(size, instance.result), 1)
+            add_stats_delta(stats_deltas, old_participant_id, discipline_id, -1, -old_points)
+            add_stats_delta(stats_deltas, instance.participant_id, discipline_id, 1, new_points)
+
+    enqueue_rating_deltas(deltas)
+    apply_discipline_stats_deltas(stats_deltas)
+    instance._rated_state = (instance.participant_id, instance.result)
+
+
+@receiver(pre_delete, sender=CompetitionParticipant)
+def remember_competition_size(sender, instance, origin=None, **kwargs):
+    """Запоминаем размер соревнования до удаления (в т.ч. каскадного)"""
+    sizes = _delete_sizes(origin)
+    state = sizes.get(instance.competition_id)
+    # Повторный pre_delete той же записи - новый вызов delete() того же объекта
+    if state is None or instance.pk in state['pks']:
+        state = sizes[instance.competition_id] = {
+            'size': _competition_size(instance.competition_id),
+            'pks': set(),
+            'corrected': False,
+        }
+    state['pks'].add(instance.pk)
+    instance._size_before_delete = state['size']
+
+
+@receiver(post_delete, sender=CompetitionParticipant)
+def update_user_rating_on_delete(sender, instance, origin=None, **kwargs):
+    """Вычитаем удалённое участие из рейтинга и статистики, пересчитываем очки оставшихся участников"""
+    state = _delete_sizes(origin).get(instance.competition_id)
+    old_size = getattr(instance, '_size_before_delete', None)
+    if old_size is None:
+        old_size = _competition_size(instance.competition_id) + 1
+
+    deltas = add_rating_delta({}, instance.participant_id, -place_score(old_size, instance.result), -1)
+    discipline_id, _ = _competition_info(instance.competition_id)
+    apply_discipline_stats_deltas(add_stats_delta({}, instance.participant_id, discipline_id, -1, -instance.points))
+    # Оставшимся участникам поправка применяется один раз на операцию удаления
+    if state is None or not state['corrected']:
+        if state is not None:
+            state['corrected'] = True
+        competition_size_deltas(
+            instance.competition_id, old_size, _competition_size(instance.competition_id), deltas
+        )
+    enqueue_rating_deltas(deltas)
+
+
+@receiver(post_save, sender=UserInfo)
+@receiver(post_delete, sender=UserInfo)
+def mark_leaderboard_dirty(sender, instance, **kwargs):
+    """Новые спортсмены, смена роли/региона и пересчёт рейтинга попадают в рейтинг"""
+    transaction.on_commit(request_leaderboard_refresh)
+
+
+@receiver(post_save, sender=PrizePoints)
+@receiver(post_delete, sender=PrizePoints)
+def invalidate_prize_points_table(sender, instance, **kwargs):
+    """Таблица баллов перечитывается в этом процессе сразу, в остальных - по версии после фиксации"""
+    invalidate_prize_points()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Удалённый токен (в т.ч. при удалении пользователя) сразу перестаёт действовать"""
+    invalidate_tokens([instance.key])
+    transaction.on_commit(lambda: invalidate_tokens([instance.key]))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserInfo)
+@receiver(post_delete, sender=UserInfo)
+def forget_user_tokens(sender, instance, **kwargs):
+    """Закэшированный с токеном пользователь и профиль перечитываются после изменения"""
+    user_id = instance.pk if sender is User else instance.user_id
+    invalidate_user_tokens(user_id)
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id))
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_save, sender=Region)
+def forget_all_tokens(sender, instance, **kwargs):
+    """Роли и регионы закэшированы вместе с профилями всех пользователей"""
+    cache = get_token_cache()
+    if cache is not None:
+        cache.clear()
+        transaction.on_commit(cache.clear)
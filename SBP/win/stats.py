@@ -0,0 +1,174 @@
+"""
+Статистика пользователей по дисциплинам (UserDisciplineStats).
+
+Изменения накапливаются в словаре поправок {(user_id, discipline_id): (соревнования, баллы)}
+и применяются одним INSERT ... ON CONFLICT DO UPDATE с приращением счётчиков.
+Полный пересчёт - rebuild_discipline_stats (команда rebuild_discipline_stats).
+
+Призовые баллы берутся из таблицы PrizePoints, которая целиком держится в памяти
+процесса. Таблица перечитывается, когда меняется её версия в DataVersion
+(увеличивается триггером при фиксации любого изменения win_prizepoints,
+миграция 0028), поэтому изменения видят все процессы.
+"""
+from django.db import connection
+
+from .models import CompetitionParticipant, DataVersion, PrizePoints, UserDisciplineStats
+
+STATS_TABLE = UserDisciplineStats._meta.db_table
+POINTS_VERSION_KEY = 'prize_points'
+
+# (версия, {(формат соревнования, место): баллы}) - заменяется целиком
+_points_cache = None
+
+
+def _points_version():
+    return DataVersion.current(POINTS_VERSION_KEY)
+
+
+def invalidate_prize_points():
+    """
+    Сбрасывает таблицу баллов в этом процессе: версия в базе меняется только
+    при фиксации, а изменения своей транзакции нужны сразу
+    """
+    global _points_cache
+    _points_cache = None
+
+
+def prize_points_table():
+    """Призовые баллы {(формат соревнования, место): баллы}"""
+    global _points_cache
+    version = _points_version()
+    cached = _points_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    table = {}
+    for competition_type, place, points in PrizePoints.objects.values_list('competition_type', 'place', 'points'):
+        key = (competition_type, place)
+        table[key] = max(points, table.get(key, 0))
+    _points_cache = (version, table)
+    return table
+
+
+def participation_points(table, competition_type, place):
+    if not place or place <= 0:
+        return 0
+    return table.get((competition_type, place), 0)
+
+
+def add_stats_delta(deltas, user_id, discipline_id, competitions=0, points=0):
+    """Накапливает изменение статистики пользователя по дисциплине"""
+    key = (user_id, discipline_id)
+    old_competitions, old_points = deltas.get(key, (0, 0))
+    deltas[key] = (old_competitions + competitions, old_points + points)
+    return deltas
+
+
+def award_competition_points(competition):
+    """
+    Начисляет призовые баллы всем участникам соревнования за один проход:
+    один запрос на чтение участников, bulk_update изменившихся баллов и
+    одна поправка статистики по дисциплине. Возвращает число изменённых участий.
+    """
+    table = prize_points_table()
+    participations = CompetitionParticipant.objects.filter(
+        competition_id=competition.id
+    ).only('id', 'participant_id', 'result', 'points')
+
+    changed = []
+    deltas = {}
+    for participation in participations:
+        points = participation_points(table, competition.competition_type, participation.result)
+        if points != participation.points:
+            add_stats_delta(
+                deltas, participation.participant_id, competition.discipline_id,
+                points=points - participation.points
+            )
+            participation.points = points
+            changed.append(participation)
+
+    CompetitionParticipant.objects.bulk_update(changed, ['points'], batch_size=500)
+    apply_discipline_stats_deltas(deltas)
+    return len(changed)
+
+
+def apply_discipline_stats_deltas(deltas):
+    """Применяет накопленные поправки одним запросом (upsert с приращением)"""
+    rows = [
+        (user_id, discipline_id, competitions, points)
+        for (user_id, discipline_id), (competitions, points) in deltas.items()
+        if competitions or points
+    ]
+    if not rows:
+        return 0
+
+    user_ids, discipline_ids, competitions, points = (list(column) for column in zip(*rows))
+    with connection.cursor() as cursor:
+        # Существующие строки обновляются приращением, недостающие вставляются.
+        # Отрицательные значения отсекаются: CHECK (>= 0) проверяется до ON CONFLICT.
+        cursor.execute(
+            f"""
+            WITH d (user_id, discipline_id, competitions, points) AS (
+                SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[], %s::integer[])
+            ),
+            updated AS (
+                UPDATE {STATS_TABLE} s SET
+                    competitions_count = GREATEST(s.competitions_count + d.competitions, 0),
+                    points_count = GREATEST(s.points_count + d.points, 0)
+                FROM d
+                WHERE s.user_id = d.user_id AND s.discipline_id = d.discipline_id
+                RETURNING s.user_id, s.discipline_id
+            )
+            INSERT INTO {STATS_TABLE} AS s (user_id, discipline_id, competitions_count, points_count)
+            SELECT d.user_id, d.discipline_id, GREATEST(d.competitions, 0), GREATEST(d.points, 0)
+            FROM d
+            WHERE (d.competitions > 0 OR d.points > 0)
+              AND NOT EXISTS (
+                  SELECT 1 FROM updated u
+                  WHERE u.user_id = d.user_id AND u.discipline_id = d.discipline_id
+              )
+            ON CONFLICT (user_id, discipline_id) DO UPDATE SET
+                competitions_count = s.competitions_count + EXCLUDED.competitions_count,
+                points_count = s.points_count + EXCLUDED.points_count
+            """,
+            [user_ids, discipline_ids, competitions, points]
+        )
+    return len(rows)
+
+
+def rebuild_discipline_stats(user_ids=None):
+    """
+    Полный пересчёт по истории участий: баллы участий пересчитываются одним
+    UPDATE по таблице PrizePoints, статистика - удалением и одной вставкой
+    с агрегацией. Если переданы user_ids - только для этих пользователей.
+    Возвращает количество записанных строк статистики.
+    """
+    user_filter = "WHERE user_id = ANY(%s)" if user_ids is not None else ""
+    participant_filter = "AND cp.participant_id = ANY(%s)" if user_ids is not None else ""
+    params = [list(user_ids)] if user_ids is not None else []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE win_competitionparticipant cp
+            SET points = COALESCE((
+                SELECT MAX(pp.points) FROM win_prizepoints pp
+                WHERE pp.competition_type = c.competition_type AND pp.place = cp.result AND cp.result > 0
+            ), 0)
+            FROM win_competition c
+            WHERE c.id = cp.competition_id {participant_filter}
+            """,
+            params
+        )
+        cursor.execute(f"DELETE FROM {STATS_TABLE} {user_filter}", params)
+        cursor.execute(
+            f"""
+            INSERT INTO {STATS_TABLE} (user_id, discipline_id, competitions_count, points_count)
+            SELECT cp.participant_id, c.discipline_id, COUNT(*), SUM(cp.points)
+            FROM win_competitionparticipant cp
+            JOIN win_competition c ON c.id = cp.competition_id {participant_filter}
+            GROUP BY cp.participant_id, c.discipline_id
+            """,
+            params
+        )
+        return cursor.rowcount
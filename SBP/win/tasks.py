@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from .exports import render_export_job
+from .leaderboard import refresh_leaderboard, refresh_leaderboard_if_dirty
+from .models import ExportJob
+from .utils import (
+    compact_rating_snapshots, drain_rating_queue, take_rating_checkpoint_if_due, tick_competition_statuses,
+)
+
+
+@shared_task
+def render_export(job_id):
+    """Фоновое формирование файла выгрузки"""
+    job = ExportJob.objects.filter(pk=job_id, status=ExportJob.PENDING).first()
+    if job is not None:
+        render_export_job(job)
+
+
+@shared_task
+def tick_statuses():
+    """Периодическое обновление статусов соревнований (Celery beat)"""
+    changes = tick_competition_statuses()
+    return {new_status: len(ids) for new_status, ids in changes.items()}
+
+
+@shared_task
+def refresh_leaderboard_task():
+    """Обновление рейтинга после изменения рейтингов пользователей"""
+    refresh_leaderboard()
+
+
+@shared_task
+def refresh_leaderboard_periodic():
+    """Периодическое обновление рейтинга, если были изменения (Celery beat)"""
+    return refresh_leaderboard_if_dirty()
+
+
+@shared_task
+def compact_rating_history():
+    """Ежедневное прореживание истории рейтинга (Celery beat)"""
+    before = timezone.now() - timedelta(days=settings.RATING_SNAPSHOT_RETENTION_DAYS)
+    return compact_rating_snapshots(before)
+
+
+@shared_task
+def rating_checkpoint():
+    """Полный срез истории рейтинга раз в RATING_CHECKPOINT_INTERVAL_DAYS (Celery beat)"""
+    return take_rating_checkpoint_if_due()
+
+
+@shared_task
+def drain_rating_updates():
+    """Пересчёт рейтинга по очереди PendingRatingUpdate (после фиксации и по расписанию)"""
+    return drain_rating_queue()
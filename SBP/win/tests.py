@@ -1,3 +1,919 @@
-from django.test import TestCase
+import io
+import tempfile
+import threading
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import pre_delete
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from .authentication import LocalTokenCache, ProfileTokenAuthentication
+from .checks import check_connection_settings, check_token_cache
+from .benchmarks import hot_queries, seed_benchmark_data
+from .exports import export_data_version, iter_export_rows
+from .leaderboard import DIRTY_KEY, refresh_leaderboard, refresh_leaderboard_if_dirty, request_leaderboard_refresh
+from .stats import award_competition_points, invalidate_prize_points, prize_points_table, rebuild_discipline_stats
+from .models import *
+from .utils import (
+    RatingQueueDrain, advance_competition_statuses, calculate_user_rating, compact_rating_snapshots, drain_rating_queue,
+    take_rating_checkpoint, take_rating_checkpoint_if_due, tick_competition_statuses,
+)
+
+
+def make_user(nick, region, role, **extra):
+    user = User.objects.create(nickName=nick, email=f'{nick}@example.com')
+    return UserInfo.objects.create(
+        user=user, surname=nick, name=nick, region=region, role=role, **extra
+    )
+
+
+def make_competition(discipline, name='Соревнование', **extra):
+    fields = dict(
+        max_participants=1000, max_participants_in_team=5, min_age=0, max_age=100,
+        name=name, competition_type=Competition.ONLINE, type=Competition.INDIVIDUAL,
+        discipline=discipline, status='completed',
+    )
+    fields.update(extra)
+    return Competition.objects.create(**fields)
+
+
+class BaseDataMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = Region.objects.create(name='Регион')
+        cls.role = Role.objects.create(id=0, name='Спортсмен')
+        cls.discipline = Discipline.objects.create(name='Продуктовое программирование')
+
+
+class IncrementalRatingTests(BaseDataMixin, TestCase):
+    def assertRatingsConsistent(self, users):
+        for user in users:
+            user.refresh_from_db()
+            self.assertAlmostEqual(user.rating, calculate_user_rating(user), places=2)
+
+    def test_incremental_rating_matches_full_recompute(self):
+        users = [make_user(f'user{i}', self.region, self.role) for i in range(6)]
+        first = make_competition(self.discipline)
+        second = make_competition(self.discipline)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participations = [
+                CompetitionParticipant.objects.create(competition=first, participant=user)
+                for user in users[:5]
+            ]
+            for place, participation in enumerate(participations, 1):
+                participation.result = place
+                participation.save()
+
+            # Новый участник меняет N и очки всех уже получивших места
+            CompetitionParticipant.objects.create(competition=first, participant=users[5], result=6)
+            CompetitionParticipant.objects.create(competition=second, participant=users[1], result=1)
+        self.assertRatingsConsistent(users)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participations[2].delete()
+        self.assertRatingsConsistent(users)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertRatingsConsistent(users)
+
+    def test_failed_delete_does_not_leak_size_into_next_delete(self):
+        users = [make_user(f'user{i}', self.region, self.role) for i in range(5)]
+        competition = make_competition(self.discipline)
+        with self.captureOnCommitCallbacks(execute=True):
+            participations = [
+                CompetitionParticipant.objects.create(competition=competition, participant=user, result=place)
+                for place, user in enumerate(users[:4], 1)
+            ]
+
+        def fail(sender, instance, **kwargs):
+            raise RuntimeError('delete failed')
+
+        pre_delete.connect(fail, sender=CompetitionParticipant)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                participations[0].delete()
+        finally:
+            pre_delete.disconnect(fail, sender=CompetitionParticipant)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CompetitionParticipant.objects.create(competition=competition, participant=users[4], result=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            CompetitionParticipant.objects.get(pk=participations[0].pk).delete()
+        self.assertRatingsConsistent(users)
+
+    def test_changes_in_one_transaction_collapse_into_one_queue_row(self):
+        user = make_user('user', self.region, self.role)
+        competitions = [make_competition(self.discipline) for _ in range(3)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            for competition in competitions:
+                CompetitionParticipant.objects.create(competition=competition, participant=user, result=1)
+
+        queued = PendingRatingUpdate.objects.get(user=user)
+        self.assertEqual(queued.count_delta, 3)
+        self.assertEqual(sum(isinstance(callback, RatingQueueDrain) for callback in callbacks), 1)
+        user.refresh_from_db()
+        self.assertEqual(user.rating, 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(PendingRatingUpdate.objects.exists())
+        user.refresh_from_db()
+        self.assertAlmostEqual(user.rating, calculate_user_rating(user), places=2)
+
+    def test_rolled_back_savepoint_does_not_cancel_later_drain(self):
+        user = make_user('user', self.region, self.role)
+        competitions = [make_competition(self.discipline) for _ in range(2)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                CompetitionParticipant.objects.create(competition=competitions[0], participant=user, result=1)
+                raise RuntimeError('rollback')
+            CompetitionParticipant.objects.create(competition=competitions[1], participant=user, result=1)
+
+        self.assertEqual(sum(isinstance(callback, RatingQueueDrain) for callback in callbacks), 1)
+        for callback in callbacks:
+            callback()
+        self.assertFalse(PendingRatingUpdate.objects.exists())
+        user.refresh_from_db()
+        self.assertAlmostEqual(user.rating, calculate_user_rating(user), places=2)
+
+    def test_rebuild_ratings_command_matches_formula(self):
+        users = [make_user(f'user{i}', self.region, self.role) for i in range(4)]
+        for competition_index in range(3):
+            competition = make_competition(self.discipline)
+            for place, user in enumerate(users[competition_index:], 1):
+                CompetitionParticipant.objects.create(competition=competition, participant=user, result=place)
+        UserInfo.objects.update(rating=0, rating_score_sum=0, rating_participations=0)
+
+        call_command('rebuild_ratings', '--dry-run', stdout=io.StringIO())
+        self.assertFalse(UserInfo.objects.exclude(rating=0).exists())
+
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        # Поправки из очереди учтены пересчётом и не применяются повторно
+        self.assertFalse(PendingRatingUpdate.objects.exists())
+        drain_rating_queue()
+        for user in users:
+            user.refresh_from_db()
+            self.assertAlmostEqual(user.rating, calculate_user_rating(user), places=2)
+            self.assertEqual(user.rating_participations, user.competition_participations.count())
+
+    def test_full_recompute_absorbs_queued_deltas(self):
+        user, other = make_user('user', self.region, self.role), make_user('other', self.region, self.role)
+        competition = make_competition(self.discipline)
+        CompetitionParticipant.objects.create(competition=competition, participant=user, result=1)
+        CompetitionParticipant.objects.create(competition=competition, participant=other, result=2)
+        self.assertEqual(PendingRatingUpdate.objects.count(), 2)
+
+        user.update_rating()
+        self.assertEqual(list(PendingRatingUpdate.objects.values_list('user_id', flat=True)), [other.id])
+        drain_rating_queue()
+        for athlete in (user, other):
+            athlete.refresh_from_db()
+            self.assertAlmostEqual(athlete.rating, calculate_user_rating(athlete), places=2)
+            self.assertEqual(athlete.rating_participations, 1)
+
+
+class DistributeResultsTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', self.region, self.role)
+        self.competition = make_competition(self.discipline)
+        CompetitionOrganizer.objects.create(user=self.organizer, competition=self.competition, rated=False)
+        self.athletes = [make_user(f'athlete{i}', self.region, self.role) for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for athlete in self.athletes:
+                CompetitionParticipant.objects.create(competition=self.competition, participant=athlete)
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer.user)
+
+    def post_results(self, results):
+        return self.client.post('/competitions/distribute-results/', {
+            'competition_id': self.competition.id,
+            'results': results,
+        }, format='json')
+
+    def test_places_written_and_ratings_updated_once(self):
+        results = [{'user_id': a.id, 'result': place} for place, a in enumerate(self.athletes, 1)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_results(results)
+
+        self.assertEqual(response.status_code, 200)
+        for place, athlete in enumerate(self.athletes, 1):
+            athlete.refresh_from_db()
+            self.assertEqual(athlete.competition_participations.get().result, place)
+            self.assertAlmostEqual(athlete.rating, calculate_user_rating(athlete), places=2)
+        self.assertTrue(CompetitionOrganizer.objects.get(user=self.organizer).rated)
+
+    def test_row_errors_reported_without_writes(self):
+        response = self.post_results([
+            {'user_id': self.athletes[0].id, 'result': 1},
+            {'user_id': 999999, 'result': 2},
+            {'user_id': self.athletes[0].id, 'result': 3},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2])
+        self.assertFalse(CompetitionParticipant.objects.filter(result__gt=0).exists())
+
+
+class EnrollmentTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', self.region, self.role)
+        self.competition = make_competition(self.discipline, max_participants=10)
+        CompetitionOrganizer.objects.create(user=self.organizer, competition=self.competition, rated=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer.user)
+
+    def apply(self, athletes):
+        return [
+            UserApplication.objects.create(user=athlete, competition=self.competition)
+            for athlete in athletes
+        ]
+
+    def test_bulk_approve_enrolls_and_keeps_ratings_consistent(self):
+        ranked = make_user('ranked', self.region, self.role)
+        with self.captureOnCommitCallbacks(execute=True):
+            CompetitionParticipant.objects.create(competition=self.competition, participant=ranked, result=1)
+
+        athletes = [make_user(f'athlete{i}', self.region, self.role) for i in range(5)]
+        applications = self.apply(athletes)
+        # Уже зачисленный участник не создаёт дубль
+        with self.captureOnCommitCallbacks(execute=True):
+            CompetitionParticipant.objects.create(competition=self.competition, participant=athletes[0])
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/competitions/{self.competition.id}/applications/approve/', {}, format='json'
+            )
+        approve_queries = len(queries)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['approved']), sorted(a.id for a in applications))
+        self.assertEqual(response.data['enrolled'], 4)
+        self.assertEqual(self.competition.participants.count(), 6)
+        self.assertFalse(UserApplication.objects.exclude(status='approved').exists())
+        for user in [ranked, *athletes]:
+            user.refresh_from_db()
+            self.assertAlmostEqual(user.rating, calculate_user_rating(user), places=2)
+        self.assertEqual(
+            UserDisciplineStats.objects.get(user=athletes[1], discipline=self.discipline).competitions_count, 1
+        )
+
+        # Число запросов не зависит от количества заявок
+        more = [make_user(f'more{i}', self.region, self.role) for i in range(4)]
+        self.apply(more)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.client.post(f'/competitions/{self.competition.id}/applications/approve/', {}, format='json')
+        self.assertEqual(len(queries), approve_queries)
+
+    def test_bulk_approve_checks_organizer_profile_not_user_id(self):
+        def make_account(nick, user_id, info_id):
+            user = User.objects.create(id=user_id, nickName=nick, email=f'{nick}@example.com')
+            return UserInfo.objects.create(
+                id=info_id, user=user, surname=nick, name=nick, region=self.region, role=self.role
+            )
+
+        organizer = make_account('owner', 900001, 900002)
+        # ID учётной записи совпадает с ID профиля организатора
+        stranger = make_account('stranger', 900002, 900003)
+        competition = make_competition(self.discipline, max_participants=10)
+        CompetitionOrganizer.objects.create(user=organizer, competition=competition, rated=False)
+        UserApplication.objects.create(user=make_user('athlete', self.region, self.role), competition=competition)
+        url = f'/competitions/{competition.id}/applications/approve/'
+
+        self.client.force_authenticate(stranger.user)
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 403)
+        self.client.force_authenticate(organizer.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url, {}, format='json').status_code, 200)
+
+    def test_limit_rejects_whole_batch(self):
+        athletes = [make_user(f'athlete{i}', self.region, self.role) for i in range(11)]
+        self.apply(athletes)
+        response = self.client.post(
+            f'/competitions/{self.competition.id}/applications/approve/', {}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.competition.participants.exists())
+        self.assertFalse(UserApplication.objects.exclude(status='pending').exists())
+
+    def test_single_decision_uses_enrollment(self):
+        athlete = make_user('athlete', self.region, self.role)
+        application, = self.apply([athlete])
+        response = self.client.patch(
+            f'/user-applications/{application.id}/response/', {'action': 'accept'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        application.refresh_from_db()
+        self.assertEqual(application.status, 'approved')
+        self.assertTrue(self.competition.participants.filter(participant=athlete).exists())
+
+
+class TeamAdmissionTests(TransactionTestCase):
+    def setUp(self):
+        region = Region.objects.create(name='Регион')
+        role = Role.objects.create(id=0, name='Спортсмен')
+        competition = make_competition(Discipline.objects.create(name='Дисциплина'), type=Competition.TEAM)
+        self.captain = make_user('captain', region, role)
+        self.team = Team.objects.create(competition=competition, name='Команда', captain=self.captain, max_members=3)
+        self.team.members.add(self.captain)
+        self.responses = [
+            VacancyResponse.objects.create(team=self.team, user=make_user(f'athlete{i}', region, role), text='-')
+            for i in range(6)
+        ]
+
+    def test_parallel_accepts_do_not_overfill_team(self):
+        barrier = threading.Barrier(len(self.responses))
+        codes = []
+
+        def accept(response):
+            client = APIClient()
+            client.force_authenticate(self.captain.user)
+            try:
+                barrier.wait()
+                result = client.post('/response-action/', {'response_id': response.id, 'action': 'accept'}, format='json')
+                codes.append(result.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(response,)) for response in self.responses]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.team.refresh_from_db()
+        self.assertEqual(sorted(codes), [200, 200, 400, 400, 400, 400])
+        self.assertEqual(self.team.current_members, 3)
+        self.assertEqual(self.team.members.count(), 3)
+        self.assertEqual(VacancyResponse.objects.filter(status=VacancyResponse.ACCEPTED).count(), 2)
+
+    def test_admit_twice_keeps_counter(self):
+        user = self.responses[0].user
+        self.team.admit(user)
+        with self.assertRaises(AlreadyTeamMember):
+            self.team.admit(user)
+        self.team.save()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.current_members, 2)
+
+
+class ProfileAuthenticationTests(BaseDataMixin, TestCase):
+    def test_profile_loaded_with_token(self):
+        athlete = make_user('athlete', self.region, self.role)
+        token = Token.objects.create(user=athlete.user)
+
+        with self.assertNumQueries(1):
+            user, _ = ProfileTokenAuthentication().authenticate_credentials(token.key)
+        with self.assertNumQueries(0):
+            self.assertEqual((user.info.id, user.info.role.id, user.info.region.name), (athlete.id, 0, 'Регион'))
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(client.get('/user-profile/').status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(client.get('/user-profile/').status_code, 401)
+
+
+@override_settings(AUTH_TOKEN_CACHE='win.authentication.LocalTokenCache')
+class TokenCacheTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        self.athlete = make_user('athlete', self.region, self.role)
+        self.token = Token.objects.create(user=self.athlete.user)
+        self.authenticate = ProfileTokenAuthentication().authenticate_credentials
+
+    def test_cached_token_skips_database_until_invalidated(self):
+        self.authenticate(self.token.key)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(self.token.key)
+            self.assertEqual(user.info.region.name, 'Регион')
+
+        # Изменение профиля сбрасывает запись
+        self.athlete.is_approved = True
+        self.athlete.save()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(self.token.key)
+        self.assertTrue(user.info.is_approved)
+
+    def test_rejected_user_loses_access(self):
+        self.authenticate(self.token.key)
+        moderator = make_user('moderator', self.region, Role.objects.create(id=2, name='ФСП'))
+        client = APIClient()
+        client.force_authenticate(moderator.user)
+        response = client.post('/approvals/', {'user_id': self.athlete.user_id, 'action': 'reject'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.token.key)
+
+    def test_lru_bound_and_ttl(self):
+        cache = LocalTokenCache(maxsize=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, self.token)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('a'))
+
+        expired = LocalTokenCache(maxsize=2, ttl=0)
+        expired.set('a', self.token)
+        self.assertIsNone(expired.get('a'))
+
+
+class ConnectionSettingsCheckTests(TestCase):
+    def test_pool_with_persistent_connections_rejected(self):
+        config = {'default': {'CONN_MAX_AGE': 60, 'OPTIONS': {'pool': True}}}
+        with override_settings(DATABASES=config):
+            ids = {error.id for error in check_connection_settings(None)}
+        self.assertIn('win.E002', ids)
+
+        with override_settings(DATABASES={'default': {'CONN_MAX_AGE': 0, 'OPTIONS': {}}}, DEBUG=False):
+            self.assertEqual([error.id for error in check_connection_settings(None)], ['win.W001'])
+
+
+class TokenCacheCheckTests(TestCase):
+    def test_token_cache_requires_shared_backend(self):
+        self.assertEqual(check_token_cache(None), [])
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(AUTH_TOKEN_CACHE='win.authentication.SharedTokenCache', CACHES=locmem):
+            self.assertEqual([error.id for error in check_token_cache(None)], ['win.E004'])
+
+        database = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(AUTH_TOKEN_CACHE='win.authentication.SharedTokenCache', CACHES=database):
+            self.assertEqual(check_token_cache(None), [])
+
+        with override_settings(AUTH_TOKEN_CACHE='win.authentication.LocalTokenCache', DEBUG=False):
+            self.assertEqual([error.id for error in check_token_cache(None)], ['win.W002'])
+
+
+class StructuredExportQueryTests(BaseDataMixin, TestCase):
+    def seed_competition(self, index):
+        competition = make_competition(self.discipline, name=f'Соревнование {index}')
+        CompetitionDate.objects.create(
+            competition=competition,
+            registration_start=timezone.now(), registration_end=timezone.now(),
+            start_date=timezone.now(), end_date=timezone.now(),
+        )
+        athletes = [make_user(f'c{index}a{i}', self.region, self.role) for i in range(3)]
+        for place, athlete in enumerate(athletes, 1):
+            CompetitionParticipant.objects.create(competition=competition, participant=athlete)
+            CompetitionResult.objects.create(competition=competition, participant=athlete, place=place)
+        team = Team.objects.create(
+            competition=competition, name=f'Команда {index}', captain=athletes[0], max_members=5
+        )
+        team.members.add(*athletes)
+
+    def count_export_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(iter_export_rows(Competition.objects.order_by('id')))
+        self.assertTrue(rows)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_data(self):
+        self.seed_competition(0)
+        baseline = self.count_export_queries()
+
+        for index in range(1, 6):
+            self.seed_competition(index)
+
+        self.assertEqual(self.count_export_queries(), baseline)
+
+
+@override_settings(EXPORT_ROOT=tempfile.mkdtemp())
+class ExportJobTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        self.competition = make_competition(self.discipline)
+        CompetitionParticipant.objects.create(
+            competition=self.competition, participant=make_user('athlete', self.region, self.role)
+        )
+        self.client = APIClient()
+
+    def create_job(self, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/competitions/download/jobs/', params, format='json')
+
+    def test_job_renders_csv_and_is_reused_for_unchanged_data(self):
+        response = self.create_job(competition_id=self.competition.id, format='csv')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+
+        detail = self.client.get(f'/competitions/download/jobs/{job_id}/')
+        self.assertEqual(detail.data['status'], ExportJob.DONE)
+
+        download = self.client.get(detail.data['download_url'])
+        content = b''.join(download.streaming_content).decode('utf-8-sig')
+        self.assertIn('athlete', content)
+
+        again = self.create_job(competition_id=self.competition.id, format='csv')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['id'], job_id)
+
+
+class ExportDataVersionTests(TransactionTestCase):
+    def test_version_bumped_once_per_committed_change_of_rendered_tables(self):
+        region = Region.objects.create(name='Регион')
+        role = Role.objects.create(id=0, name='Спортсмен')
+        version = export_data_version()
+
+        with transaction.atomic():
+            region.name = 'Новое название'
+            region.save()
+            make_user('athlete', region, role)
+            self.assertEqual(export_data_version(), version)
+        self.assertEqual(int(export_data_version()), int(version) + 1)
+
+        version = export_data_version()
+        FAQ.objects.create(question='Вопрос', answer='Ответ')
+        self.assertEqual(export_data_version(), version)
+
+
+class CompetitionStatusTests(BaseDataMixin, TestCase):
+    def make_dated(self, status, registration_start, registration_end, start_date, end_date):
+        competition = make_competition(self.discipline, status=status)
+        CompetitionDate.objects.create(
+            competition=competition,
+            registration_start=registration_start, registration_end=registration_end,
+            start_date=start_date, end_date=end_date,
+        )
+        return competition
+
+    def test_statuses_updated_with_fixed_number_of_queries(self):
+        now = timezone.now()
+        day = timezone.timedelta(days=1)
+        registration = self.make_dated('waiting', now - day, now + day, now + 2 * day, now + 3 * day)
+        running = self.make_dated('registration', now - 3 * day, now - 2 * day, now - day, now + day)
+        finished = self.make_dated('running', now - 4 * day, now - 3 * day, now - 2 * day, now - day)
+        unchanged = self.make_dated('waiting', now + day, now + 2 * day, now + 3 * day, now + 4 * day)
+        pending = self.make_dated('pending', now - day, now + day, now + 2 * day, now + 3 * day)
+
+        moderator = make_user('moderator', self.region, Role.objects.create(id=2, name='ФСП'))
+        client = APIClient()
+        client.force_authenticate(moderator.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/competitions/status/', {'time': now.isoformat()}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changed'], {
+            'registration': [registration.id],
+            'running': [running.id],
+            'finished': [finished.id],
+            'waiting': [],
+        })
+        self.assertEqual(response.data['competitions_updated'], 3)
+        self.assertNotIn('competitions', response.data)
+        self.assertLessEqual(len(queries), 12)
+
+        statuses = dict(Competition.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[unchanged.id], 'waiting')
+        self.assertEqual(statuses[pending.id], 'pending')
+
+    def test_ticker_only_touches_crossed_boundaries(self):
+        now = timezone.now()
+        day = timezone.timedelta(days=1)
+        future = self.make_dated('waiting', now + day, now + 2 * day, now + 3 * day, now + 4 * day)
+        approved = self.make_dated('upcoming', now + day, now + 2 * day, now + 3 * day, now + 4 * day)
+
+        # Первый проход обрабатывает все соревнования
+        self.assertEqual(tick_competition_statuses(now)['waiting'], [approved.id])
+
+        # Граница регистрации ещё не пересечена - ничего не меняется
+        changes = tick_competition_statuses(now + day / 2)
+        self.assertFalse(any(changes.values()))
+
+        changes = tick_competition_statuses(now + day * 3 / 2)
+        self.assertEqual(sorted(changes['registration']), sorted([future.id, approved.id]))
+
+
+class HotQueryIndexTests(TestCase):
+    # Индексы, которыми может обслуживаться каждый запрос из hot_queries
+    # (для db_index=True имя заканчивается хэшем, поэтому сравнивается префикс)
+    ROLE_INDEXES = ('win_userinfo_role_appr_idx', 'win_userinfo_role_rating_idx')
+    EXPECTED_INDEXES = {
+        'competitions_pending': ('win_competition_status_idx',),
+        'competitions_for_region': ('win_competition_perm_gin',),
+        'competitions_closed_or_all_regions': ('win_competition_perm_len_idx',),
+        'competition_dates_window': ('win_competitiondate_start_date_',),
+        'competition_registration_window': ('win_competitiondate_registration_end_',),
+        'user_applications_for_organizer': ('win_userapp_comp_st_idx',),
+        'competition_participants': ('win_userapp_comp_st_idx',),
+        'team_applications_for_organizer': ('win_teamapp_comp_st_idx',),
+        'vacancy_responses_for_captain': ('win_vacancyresp_team_st_idx',),
+        'user_invitations': ('win_invitation_user_st_idx',),
+        'users_rating': ('win_userinfo_role_rating_idx',),
+        'users_pending_approval': ROLE_INDEXES,
+        'region_representatives': ROLE_INDEXES,
+    }
+
+    def test_hot_queries_use_expected_indexes(self):
+        sample = seed_benchmark_data(users=200, competitions=20)
+        with connection.cursor() as cursor:
+            # Свежая статистика, как в benchmark_indexes
+            cursor.execute("ANALYZE")
+            # Последовательное чтение выбирается только если подходящего индекса нет
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        queries = hot_queries(sample)
+        self.assertEqual({name for name, _ in queries}, set(self.EXPECTED_INDEXES))
+        for name, queryset in queries:
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertNotIn('Seq Scan', plan)
+                self.assertTrue(
+                    any(index in plan for index in self.EXPECTED_INDEXES[name]),
+                    f"{name}: нет индекса {self.EXPECTED_INDEXES[name]} в плане\n{plan}"
+                )
+
+    def test_bot_region_filters_use_indexes(self):
+        sample = seed_benchmark_data(users=50, competitions=20)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(
+                "EXPLAIN SELECT id FROM win_competition "
+                "WHERE permissions @> jsonb_build_array(%s::bigint)",
+                [sample['region_id']]
+            )
+            self.assertIn('win_competition_perm_gin', str(cursor.fetchall()))
+            cursor.execute(
+                "EXPLAIN SELECT id FROM win_competition "
+                "WHERE jsonb_array_length(permissions) IN (0, %s)",
+                [Competition.ALL_REGIONS_COUNT]
+            )
+            self.assertIn('win_competition_perm_len_idx', str(cursor.fetchall()))
+
+
+class LeaderboardTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        other_region = Region.objects.create(name='Другой регион')
+        self.athletes = [
+            make_user('first', self.region, self.role, rating=300),
+            make_user('second', other_region, self.role, rating=200),
+            make_user('tied_a', self.region, self.role, rating=100),
+            make_user('tied_b', other_region, self.role, rating=100),
+        ]
+        refresh_leaderboard()
+        self.client = APIClient()
+
+    def test_keyset_pages_cover_board_without_gaps(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 1}
+            if cursor:
+                params['after'] = cursor
+            response = self.client.get('/leaderboard/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [(row['id'], row['rank']) for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+
+        first, second, tied_a, tied_b = self.athletes
+        self.assertEqual(seen, [(first.id, 1), (second.id, 2), (tied_b.id, 3), (tied_a.id, 3)])
+
+        region = self.client.get(f'/leaderboard/region/{self.region.id}/')
+        self.assertEqual([(row['id'], row['region_rank']) for row in region.data['results']],
+                         [(first.id, 1), (tied_a.id, 2)])
+
+    def test_my_rank(self):
+        self.client.force_authenticate(self.athletes[1].user)
+        response = self.client.get('/leaderboard/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['rank'], response.data['region_rank']), (2, 1))
+
+    def test_refresh_throttled_and_dirty_flag_kept_in_database(self):
+        first = self.athletes[0]
+        request_leaderboard_refresh()  # первый запрос в интервале - обновление сразу
+        self.assertFalse(refresh_leaderboard_if_dirty())
+
+        UserInfo.objects.filter(pk=first.pk).update(rating=50)
+        request_leaderboard_refresh()  # в том же интервале - только отметка
+        self.assertEqual(Leaderboard.objects.get(pk=first.pk).rating, 300)
+        self.assertEqual(DataVersion.current(DIRTY_KEY), 1)
+
+        self.assertTrue(refresh_leaderboard_if_dirty())
+        self.assertEqual(Leaderboard.objects.get(pk=first.pk).rating, 50)
+        self.assertFalse(refresh_leaderboard_if_dirty())
+
+    def test_user_list_keyset_pages_and_search(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['after'] = cursor
+            response = self.client.get('/users/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+        first, second, tied_a, tied_b = self.athletes
+        self.assertEqual(seen, [first.id, second.id, tied_b.id, tied_a.id])
+
+        response = self.client.get('/users/', {'search': 'TIED_'})
+        self.assertEqual([row['id'] for row in response.data['results']], [tied_b.id, tied_a.id])
+
+
+class DisciplineStatsTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        # Таблица баллов живёт в памяти процесса, а транзакция теста откатывается
+        invalidate_prize_points()
+        self.addCleanup(invalidate_prize_points)
+
+    def stats(self):
+        return {
+            (user_id, discipline_id): (competitions, points)
+            for user_id, discipline_id, competitions, points in UserDisciplineStats.objects.values_list(
+                'user_id', 'discipline_id', 'competitions_count', 'points_count'
+            )
+            if competitions or points
+        }
+
+    def assertStatsMatchRebuild(self):
+        incremental = self.stats()
+        rebuild_discipline_stats()
+        self.assertEqual(incremental, self.stats())
+        return incremental
+
+    def test_incremental_stats_match_rebuild(self):
+        PrizePoints.objects.create(competition_type=Competition.ONLINE, place=1, points=10)
+        PrizePoints.objects.create(competition_type=Competition.ONLINE, place=2, points=5)
+        organizer = make_user('organizer', self.region, self.role)
+        competition = make_competition(self.discipline)
+        CompetitionOrganizer.objects.create(user=organizer, competition=competition, rated=False)
+        athletes = [make_user(f'athlete{i}', self.region, self.role) for i in range(3)]
+        participations = [
+            CompetitionParticipant.objects.create(competition=competition, participant=athlete)
+            for athlete in athletes
+        ]
+
+        client = APIClient()
+        client.force_authenticate(organizer.user)
+        response = client.post('/competitions/distribute-results/', {
+            'competition_id': competition.id,
+            'results': [{'user_id': a.id, 'result': place} for place, a in enumerate(athletes, 1)],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        stats = self.assertStatsMatchRebuild()
+        self.assertEqual(stats[(athletes[0].id, self.discipline.id)], (1, 10))
+        self.assertEqual(stats[(athletes[2].id, self.discipline.id)], (1, 0))
+
+        participations[0].refresh_from_db()
+        participations[0].delete()
+        self.assertNotIn((athletes[0].id, self.discipline.id), self.assertStatsMatchRebuild())
+
+    def test_points_awarded_in_constant_number_of_queries(self):
+        PrizePoints.objects.create(competition_type=Competition.ONLINE, place=1, points=10)
+        competition = make_competition(self.discipline)
+
+        def add_participants(count, offset):
+            for i in range(count):
+                athlete = make_user(f'athlete{offset + i}', self.region, self.role)
+                CompetitionParticipant.objects.create(competition=competition, participant=athlete)
+            # Места без сигналов: баллы начисляет только award_competition_points
+            CompetitionParticipant.objects.filter(competition=competition, result=0).update(result=1)
+
+        def count_award_queries():
+            prize_points_table()
+            with CaptureQueriesContext(connection) as queries:
+                award_competition_points(competition)
+            return len(queries)
+
+        add_participants(2, 0)
+        baseline = count_award_queries()
+        add_participants(20, 2)
+        self.assertEqual(count_award_queries(), baseline)
+        self.assertEqual(
+            UserDisciplineStats.objects.filter(discipline=self.discipline, points_count=10).count(), 22
+        )
+
+    def test_points_table_follows_changes(self):
+        prize = PrizePoints.objects.create(competition_type=Competition.ONLINE, place=1, points=10)
+        self.assertEqual(prize_points_table()[(Competition.ONLINE, 1)], 10)
+        prize.points = 7
+        prize.save()
+        self.assertEqual(prize_points_table()[(Competition.ONLINE, 1)], 7)
+
+
+class PrizePointsVersionTests(TransactionTestCase):
+    def setUp(self):
+        invalidate_prize_points()
+        self.addCleanup(invalidate_prize_points)
+
+    def test_committed_change_reloads_table_without_signals(self):
+        PrizePoints.objects.create(competition_type=Competition.ONLINE, place=1, points=10)
+        self.assertEqual(prize_points_table()[(Competition.ONLINE, 1)], 10)
+
+        # Изменение из другого процесса: сигналы этого процесса не срабатывают
+        PrizePoints.objects.filter(place=1).update(points=7)
+        self.assertEqual(prize_points_table()[(Competition.ONLINE, 1)], 7)
+
+
+class RatingHistoryTests(BaseDataMixin, TestCase):
+    def test_history_and_leaderboard_at_time(self):
+        first, second = make_user('first', self.region, self.role), make_user('second', self.region, self.role)
+        competition = make_competition(self.discipline)
+        with self.captureOnCommitCallbacks(execute=True):
+            CompetitionParticipant.objects.create(competition=competition, participant=first, result=1)
+        season_end = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            CompetitionParticipant.objects.create(competition=competition, participant=second, result=1)
+
+        client = APIClient()
+        history = client.get(f'/users/{first.id}/rating-history/')
+        self.assertEqual(len(history.data['points']), 2)  # 1 участник, затем пересчёт от N=2
+        first.refresh_from_db()
+        self.assertEqual(history.data['points'][-1]['rating'], first.rating)
+
+        at_season_end = client.get('/leaderboard/at/', {'time': season_end.isoformat()})
+        self.assertEqual([row['id'] for row in at_season_end.data['results']], [first.id])
+        now = client.get('/leaderboard/at/', {'time': timezone.now().isoformat()})
+        self.assertEqual({row['id'] for row in now.data['results']}, {first.id, second.id})
+
+    def test_leaderboard_at_time_reads_snapshots_from_last_checkpoint(self):
+        first, second = make_user('first', self.region, self.role), make_user('second', self.region, self.role)
+        now = timezone.now()
+        hours = lambda count: now - timezone.timedelta(hours=count)
+        for user, created_at, rating in [(first, hours(5), 1.0), (first, hours(4), 2.0), (second, hours(2), 5.0),
+                                         (first, hours(1), 3.0)]:
+            RatingSnapshot.objects.create(user=user, rating=rating, created_at=created_at)
+        self.assertEqual(take_rating_checkpoint(hours(3)), 1)
+        self.assertIsNone(take_rating_checkpoint_if_due(hours(2)))
+
+        def board(moment):
+            response = APIClient().get('/leaderboard/at/', {'time': moment.isoformat()})
+            return [(row['id'], row['rating']) for row in response.data['results']]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(board(now), [(second.id, 5.0), (first.id, 3.0)])
+        self.assertTrue(any('"created_at" >=' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(board(hours(2.5)), [(first.id, 2.0)])
+        self.assertEqual(board(hours(4.5)), [(first.id, 1.0)])
+
+        # Срез переживает прореживание, хотя позже в тот же день есть запись
+        compact_rating_snapshots(now)
+        self.assertTrue(RatingSnapshot.objects.filter(created_at=hours(3)).exists())
+
+    def test_compaction_keeps_last_snapshot_per_day(self):
+        user = make_user('user', self.region, self.role)
+        day = timezone.now().replace(hour=12) - timezone.timedelta(days=10)
+        for minutes, rating in [(0, 1.0), (30, 2.0), (60, 3.0)]:
+            RatingSnapshot.objects.create(user=user, rating=rating, created_at=day + timezone.timedelta(minutes=minutes))
+        recent = RatingSnapshot.objects.create(user=user, rating=4.0)
+
+        self.assertEqual(compact_rating_snapshots(timezone.now() - timezone.timedelta(days=1)), 2)
+        self.assertEqual(
+            list(RatingSnapshot.objects.order_by('created_at').values_list('rating', flat=True)), [3.0, recent.rating]
+        )
+
+
+class NotificationOutboxTests(BaseDataMixin, TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', self.region, self.role)
+        self.competition = make_competition(self.discipline, max_participants=2, status='waiting')
+        CompetitionOrganizer.objects.create(user=self.organizer, competition=self.competition, rated=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer.user)
+
+    def test_events_queue_one_notification_per_recipient(self):
+        athlete = make_user('athlete', self.region, self.role)
+        application = UserApplication.objects.create(user=athlete, competition=self.competition)
+        response = self.client.patch(
+            f'/user-applications/{application.id}/response/', {'action': 'accept'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Notification.objects.values_list('recipient_id', 'key', 'status')),
+            [(athlete.id, f'application:{application.id}:approved', Notification.PENDING)]
+        )
+
+        now = timezone.now()
+        day = timezone.timedelta(days=1)
+        CompetitionDate.objects.create(
+            competition=self.competition, registration_start=now - day, registration_end=now + day,
+            start_date=now + 2 * day, end_date=now + 3 * day,
+        )
+        tick_competition_statuses(now)
+        # Повтор той же смены статуса не дублирует уведомление
+        Competition.objects.filter(pk=self.competition.pk).update(status='waiting')
+        self.assertEqual(advance_competition_statuses(now)['registration'], [self.competition.id])
+        self.assertEqual(
+            list(Notification.objects.filter(key__contains=':status:').values_list('recipient_id', 'key')),
+            [(athlete.id, f'competition:{self.competition.id}:status:registration')]
+        )
+
+    def test_rolled_back_event_queues_nothing(self):
+        athletes = [make_user(f'athlete{i}', self.region, self.role) for i in range(3)]
+        for athlete in athletes:
+            UserApplication.objects.create(user=athlete, competition=self.competition)
+        response = self.client.post(
+            f'/competitions/{self.competition.id}/applications/approve/', {}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Notification.objects.exists())
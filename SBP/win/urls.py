@@ -8,11 +8,20 @@ urlpatterns = [
     
     # Пользователи
     path('users/', UserListView.as_view(), name='users-list'),  # Список всех пользователей
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),  # Общий рейтинг (постранично)
+    path('leaderboard/region/<int:region_id>/', RegionLeaderboardView.as_view(), name='leaderboard-region'),  # Рейтинг региона
+    path('leaderboard/discipline/<int:discipline_id>/', DisciplineLeaderboardView.as_view(), name='leaderboard-discipline'),  # Рейтинг по дисциплине
+    path('leaderboard/me/', MyRankView.as_view(), name='leaderboard-me'),  # Место текущего пользователя
+    path('leaderboard/at/', LeaderboardAtView.as_view(), name='leaderboard-at'),  # Рейтинг на момент времени
+    path('users/<int:user_id>/rating-history/', RatingHistoryView.as_view(), name='rating-history'),  # История рейтинга пользователя
     path('user-profile/', UserProfileView.as_view(), name='profile-actions'),  # Профиль пользователя (CRUD)
     path('approvals/', UserApprovalView.as_view(), name='user-approvals'),  # Одобрение/отклонение регистрации пользователей
     
     # Соревнования
     path('competitions/download/', CompetitionParticipantsStructuredExportAPI.as_view()), # Выгрузка соревнований и их результатов в файл
+    path('competitions/download/jobs/', ExportJobCreateView.as_view(), name='export-job-create'),  # Постановка фоновой выгрузки
+    path('competitions/download/jobs/<int:pk>/', ExportJobDetailView.as_view(), name='export-job-detail'),  # Состояние фоновой выгрузки
+    path('competitions/download/jobs/<int:pk>/file/', ExportJobDownloadView.as_view(), name='export-job-file'),  # Скачивание готовой выгрузки
     path('competitions/create/', CompetitionCreateView.as_view(), name='create-competition'),  # Создание соревнования
     path('competitions/', CompetitionListView.as_view(), name='competition-list'),  # Список всех соревнований
     path('competitions/history/', ParticipationHistoryView.as_view(), name='participation-history'),  # История участий в соревнованиях
@@ -28,6 +37,7 @@ urlpatterns = [
     path('teams/', TeamCreateView.as_view(), name='create-team'),  # Создание команды
     path('teams/public/', PublicTeamsView.as_view(), name='public-teams'),  # Публичные команды
     path('user/teams/', UserTeamsView.as_view(), name='user-teams'),  # Команды пользователя
+    path('user/discipline-stats/', UserDisciplineStatsView.as_view(), name='user-discipline-stats'),  # Статистика по дисциплинам
     
     # Отклики на вакансии
     path('vacancy-responses/', CaptainVacancyResponsesView.as_view(), name='captain-vacancy-responses'),  # Отклики для капитана
@@ -45,6 +55,7 @@ urlpatterns = [
     path('user-applications/<int:pk>/response/', ApplicationDecisionView.as_view(), name='user-application-decision'),  # Решение по заявке пользователя
     path('organizer/user/applications/', OrganizerUserApplicationsListView.as_view(), name='organizer-user-applications'),  # Заявки пользователей для организатора
     path('organizer/team/applications/', OrganizerTeamApplicationsListView.as_view(), name='organizer-team-applications'),  # Заявки команд для организатора
+    path('competitions/<int:competition_id>/applications/approve/', BulkApplicationApproveView.as_view(), name='competition-applications-approve'),  # Массовое одобрение заявок
     
     # Справочники
     path('faq/', FAQListView.as_view(), name='faq-list'),  # Часто задаваемые вопросы
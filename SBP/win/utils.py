@@ -1,33 +1,488 @@
 import math
-from django.db.models import Count
+import weakref
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Case, When, Value, FloatField, IntegerField
+from django.utils import timezone
+from .leaderboard import request_leaderboard_refresh
+
+
+def place_score(total_participants, position):
+    """
+    Вклад одного участия в сумму рейтинга:
+    (N - position + 1) / N * log2(N + 1)
+    Участия без места (0 или None) ничего не добавляют.
+    """
+    n = total_participants
+    if not n or not position or n <= 0 or position <= 0:
+        return 0.0
+    return (n - position + 1) / n * math.log2(n + 1)
+
+
+def rating_from_aggregates(score_sum, participations):
+    """Рейтинг по накопленной сумме очков мест и количеству участий"""
+    if not participations:
+        return 0.0
+    return round((score_sum / math.sqrt(participations + 3)) * 100, 2)
+
+
+def calculate_rating_aggregates(user_info):
+    """
+    Полный пересчёт агрегатов пользователя по всей истории участий.
+    Возвращает (сумма очков мест, количество участий).
+    """
+    participations = user_info.competition_participations.annotate(
+        total_participants=Count('competition__participants')
+    ).values_list('total_participants', 'result')
+
+    total_score = 0.0
+    total_participations = 0
+    for n, position in participations:
+        total_participations += 1
+        total_score += place_score(n, position)
+    return total_score, total_participations
+
 
 def calculate_user_rating(user_info):
     """
-    Формула: Σ[(N - position + 1) * log2(N + 1)] / sqrt(total_participations + 3) * 100
+    Формула: Σ[(N - position + 1) / N * log2(N + 1)] / sqrt(total_participations + 3) * 100
     Где:
     - N = количество участников в соревновании
     - position = занятое место
     """
-    participations = user_info.competition_participations.select_related(
-        'competition'
-    ).annotate(
-        total_participants=Count('competition__participants')
+    return rating_from_aggregates(*calculate_rating_aggregates(user_info))
+
+
+def compute_rating_arrays(participant_ids, competition_ids, places):
+    """
+    Векторизованный расчёт рейтинга по всем участиям сразу (та же формула,
+    что и calculate_user_rating). Размер соревнования N - число его участий.
+    Возвращает (ID пользователей, суммы очков, количество участий, рейтинги).
+    """
+    participant_ids = np.asarray(participant_ids, dtype=np.int64)
+    competition_ids = np.asarray(competition_ids, dtype=np.int64)
+    places = np.asarray(places, dtype=np.float64)
+
+    _, competition_index, sizes = np.unique(competition_ids, return_inverse=True, return_counts=True)
+    n = sizes[competition_index].astype(np.float64)
+    ranked = places > 0
+    scores = np.where(ranked, (n - places + 1) / n * np.log2(n + 1), 0.0)
+
+    user_ids, user_index = np.unique(participant_ids, return_inverse=True)
+    score_sums = np.bincount(user_index, weights=scores, minlength=len(user_ids))
+    counts = np.bincount(user_index, minlength=len(user_ids))
+    ratings = np.round(score_sums / np.sqrt(counts + 3) * 100, 2)
+    return user_ids, score_sums, counts, ratings
+
+
+def add_rating_delta(deltas, user_info_id, score_delta, count_delta=0):
+    """Накапливает изменение агрегатов пользователя в словаре deltas"""
+    score, count = deltas.get(user_info_id, (0.0, 0))
+    deltas[user_info_id] = (score + score_delta, count + count_delta)
+    return deltas
+
+
+def competition_size_deltas(competition_id, old_size, new_size, deltas=None, exclude_pk=None):
+    """
+    Изменение размера соревнования меняет очки всех участников с местами.
+    Возвращает поправки для них (одним запросом по участникам соревнования).
+    """
+    from .models import CompetitionParticipant
+
+    deltas = {} if deltas is None else deltas
+    if old_size == new_size:
+        return deltas
+
+    ranked = CompetitionParticipant.objects.filter(
+        competition_id=competition_id,
+        result__gt=0
     )
-    
-    if not participations.exists():
-        return 0.0
-    
-    total_score = 0.0
-    total_participations = participations.count()
-    
-    for p in participations:
-        n = p.total_participants
-        position = p.result
-        
-        if n > 0 and position > 0:
-            place_score = (n - position + 1) / n
-            size_factor = math.log2(n + 1)
-            total_score += place_score * size_factor
-    
-    normalized_rating = (total_score / math.sqrt(total_participations + 3)) * 100
-    return round(normalized_rating, 2)
\ No newline at end of file
+    if exclude_pk is not None:
+        ranked = ranked.exclude(pk=exclude_pk)
+
+    for participant_id, position in ranked.values_list('participant_id', 'result'):
+        add_rating_delta(
+            deltas,
+            participant_id,
+            place_score(new_size, position) - place_score(old_size, position)
+        )
+    return deltas
+
+
+def apply_rating_deltas(deltas):
+    """
+    Применяет накопленные изменения агрегатов и пересчитывает рейтинг
+    затронутых пользователей. Количество запросов не зависит от числа пользователей.
+    """
+    from .models import UserInfo
+
+    deltas = {
+        pk: (score, count) for pk, (score, count) in deltas.items()
+        if score or count
+    }
+    if not deltas:
+        return []
+
+    UserInfo.objects.filter(pk__in=deltas.keys()).update(
+        rating_score_sum=F('rating_score_sum') + Case(
+            *[When(pk=pk, then=Value(score)) for pk, (score, _) in deltas.items()],
+            default=Value(0.0),
+            output_field=FloatField()
+        ),
+        rating_participations=F('rating_participations') + Case(
+            *[When(pk=pk, then=Value(count)) for pk, (_, count) in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        ),
+    )
+
+    users = list(UserInfo.objects.filter(pk__in=deltas.keys()).only(
+        'id', 'rating', 'rating_score_sum', 'rating_participations'
+    ))
+    changed = []
+    for user in users:
+        rating = rating_from_aggregates(user.rating_score_sum, user.rating_participations)
+        if rating != user.rating:
+            changed.append((user.id, rating))
+        user.rating = rating
+    UserInfo.objects.bulk_update(users, ['rating'])
+    record_rating_snapshots(changed)
+    transaction.on_commit(request_leaderboard_refresh)
+    return users
+
+
+def enqueue_rating_deltas(deltas):
+    """
+    Ставит поправки рейтинга в очередь PendingRatingUpdate одним upsert:
+    поправки одного пользователя складываются в одну строку. Очередь
+    обрабатывается после фиксации транзакции (drain_rating_queue).
+    """
+    from django.db import connection
+    from .models import PendingRatingUpdate
+
+    rows = [(pk, score, count) for pk, (score, count) in deltas.items() if score or count]
+    if not rows:
+        return 0
+
+    table = PendingRatingUpdate._meta.db_table
+    user_ids, scores, counts = (list(column) for column in zip(*rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS q (user_id, score_delta, count_delta, enqueued_at)
+            SELECT user_id, score_delta, count_delta, now()
+            FROM unnest(%s::bigint[], %s::double precision[], %s::integer[])
+                AS d(user_id, score_delta, count_delta)
+            ON CONFLICT (user_id) DO UPDATE SET
+                score_delta = q.score_delta + EXCLUDED.score_delta,
+                count_delta = q.count_delta + EXCLUDED.count_delta
+            """,
+            [user_ids, scores, counts]
+        )
+    schedule_rating_queue_drain()
+    return len(rows)
+
+
+class RatingQueueDrain:
+    """Обработка очереди после фиксации транзакции (callback для on_commit)"""
+
+    def __init__(self):
+        self.done = False
+
+    def __call__(self):
+        from .tasks import drain_rating_updates
+
+        self.done = True
+        drain_rating_updates.delay()
+
+
+def schedule_rating_queue_drain():
+    """Обработка очереди после фиксации - одна задача на транзакцию, сколько бы поправок в ней ни ставилось"""
+    from django.db import connection
+
+    # Запланированная обработка хранится на соединении слабой ссылкой: при откате
+    # транзакции или точки сохранения Django отбрасывает callback, и ссылка пустеет
+    pending = getattr(connection, 'pending_rating_drain', None)
+    drain = pending() if pending is not None else None
+    if connection.in_atomic_block and drain is not None and not drain.done:
+        return
+    drain = RatingQueueDrain()
+    transaction.on_commit(drain)
+    connection.pending_rating_drain = weakref.ref(drain)
+
+
+def lock_pending_rating_updates(user_ids=None):
+    """
+    Перед полным пересчётом рейтинга: блокирует строки очереди пользователей
+    (пустая строка создаётся, если её нет) или, без user_ids, всю очередь до конца транзакции.
+    Поправки уже зафиксированных изменений остаются в строках и удаляются вместе
+    с пересчётом (absorb_pending_rating_updates), а новые ждут его фиксации -
+    так изменения не учитываются дважды.
+    """
+    from django.db import connection
+    from .models import PendingRatingUpdate
+
+    table = PendingRatingUpdate._meta.db_table
+    with connection.cursor() as cursor:
+        if user_ids is None:
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            return
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS q (user_id, score_delta, count_delta, enqueued_at)
+            SELECT user_id, 0, 0, now() FROM unnest(%s::bigint[]) AS u(user_id)
+            ON CONFLICT (user_id) DO UPDATE SET score_delta = q.score_delta
+            """,
+            [sorted(user_ids)]
+        )
+
+
+def absorb_pending_rating_updates(user_ids=None):
+    """Удаляет строки очереди, учтённые полным пересчётом (после lock_pending_rating_updates)"""
+    from .models import PendingRatingUpdate
+
+    queue = PendingRatingUpdate.objects.all()
+    if user_ids is not None:
+        queue = queue.filter(user_id__in=user_ids)
+    return queue.delete()[0]
+
+
+def drain_rating_queue(batch_size=500):
+    """
+    Обрабатывает очередь пересчёта рейтинга пачками. Строки забираются
+    с FOR UPDATE SKIP LOCKED, поэтому несколько обработчиков не мешают друг другу.
+    Возвращает количество обработанных пользователей.
+    """
+    from django.db import connection
+    from .models import PendingRatingUpdate
+
+    table = PendingRatingUpdate._meta.db_table
+    processed = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        ORDER BY enqueued_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING user_id, score_delta, count_delta
+                    """,
+                    [batch_size]
+                )
+                batch = cursor.fetchall()
+            if not batch:
+                return processed
+            apply_rating_deltas({user_id: (score, count) for user_id, score, count in batch})
+        processed += len(batch)
+
+
+def rating_queue_stats():
+    """Глубина очереди пересчёта рейтинга и время ожидания самой старой записи"""
+    from django.db.models import Min
+    from .models import PendingRatingUpdate
+
+    stats = PendingRatingUpdate.objects.aggregate(depth=Count('id'), oldest=Min('enqueued_at'))
+    stats['oldest_age'] = (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0
+    return stats
+
+
+def record_rating_snapshots(ratings, created_at=None):
+    """Добавляет в историю новые значения рейтинга [(ID пользователя, рейтинг)] одной вставкой"""
+    from .models import RatingSnapshot
+
+    created_at = created_at or timezone.now()
+    return RatingSnapshot.objects.bulk_create(
+        [RatingSnapshot(user_id=user_id, rating=rating, created_at=created_at) for user_id, rating in ratings],
+        batch_size=1000
+    )
+
+
+def latest_rating_snapshots(moment):
+    """
+    ID последней записи истории каждого спортсмена не позже moment (для id__in).
+    Просматриваются только записи начиная с последнего полного среза RatingCheckpoint.
+    """
+    from .models import RatingCheckpoint, RatingSnapshot
+
+    snapshots = RatingSnapshot.objects.filter(created_at__lte=moment, user__role_id=0)
+    since = RatingCheckpoint.objects.filter(taken_at__lte=moment).aggregate(since=Max('taken_at'))['since']
+    if since is not None:
+        snapshots = snapshots.filter(created_at__gte=since)
+    return snapshots.order_by('user_id', '-created_at', '-id').distinct('user_id').values('id')
+
+
+def take_rating_checkpoint(moment):
+    """
+    Записывает полный срез истории рейтинга на момент moment: копию последней
+    записи каждого пользователя. Срез строится от предыдущего, поэтому читает
+    только записи после него. Возвращает количество записей среза.
+    """
+    from django.db import connection
+    from .models import RatingCheckpoint, RatingSnapshot
+
+    table = RatingSnapshot._meta.db_table
+    with transaction.atomic():
+        since = RatingCheckpoint.objects.filter(taken_at__lte=moment).aggregate(since=Max('taken_at'))['since']
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (user_id, rating, created_at)
+                SELECT DISTINCT ON (user_id) user_id, rating, %s
+                FROM {table}
+                WHERE created_at <= %s AND (%s::timestamptz IS NULL OR created_at >= %s)
+                ORDER BY user_id, created_at DESC, id DESC
+                """,
+                [moment, moment, since, since]
+            )
+            count = cursor.rowcount
+        RatingCheckpoint.objects.create(taken_at=moment)
+    return count
+
+
+def take_rating_checkpoint_if_due(now=None):
+    """
+    Срез раз в RATING_CHECKPOINT_INTERVAL_DAYS. Момент среза отстаёт от текущего
+    на RATING_CHECKPOINT_LAG: записи истории получают время до фиксации транзакции,
+    и к моменту среза все записи до него уже должны быть видны.
+    Возвращает количество записей среза или None, если срез не нужен.
+    """
+    from django.conf import settings
+    from .models import RatingCheckpoint
+
+    moment = (now or timezone.now()) - timezone.timedelta(seconds=settings.RATING_CHECKPOINT_LAG)
+    last = RatingCheckpoint.objects.aggregate(last=Max('taken_at'))['last']
+    if last is not None and moment - last < timezone.timedelta(days=settings.RATING_CHECKPOINT_INTERVAL_DAYS):
+        return None
+    return take_rating_checkpoint(moment)
+
+
+# Статусы, которые выставляются автоматически по датам соревнования
+REGISTRATION, RUNNING, FINISHED, WAITING = 'registration', 'running', 'finished', 'waiting'
+COMPUTED_STATUSES = [REGISTRATION, RUNNING, FINISHED, WAITING]
+
+
+def competition_status_conditions(moment):
+    """
+    Условия на CompetitionDate для каждого статуса в порядке приоритета:
+    registration -> running -> finished -> waiting
+    """
+    registration = Q(registration_start__lte=moment, registration_end__gte=moment)
+    running = Q(start_date__lte=moment, end_date__gte=moment) & ~registration
+    finished = Q(end_date__lt=moment) & ~registration & ~running
+    waiting = ~registration & ~running & ~finished
+    return [
+        (REGISTRATION, registration),
+        (RUNNING, running),
+        (FINISHED, finished),
+        (WAITING, waiting),
+    ]
+
+
+def advance_competition_statuses(moment, competition_ids=None):
+    """
+    Переводит соревнования в статус, соответствующий моменту времени.
+    Один UPDATE на каждый целевой статус; соревнования в статусе 'pending' не трогаются.
+    Уведомления о смене статуса ставятся в очередь бота в той же транзакции.
+    Возвращает словарь {новый статус: [ID изменённых соревнований]}.
+    """
+    from .models import Competition, CompetitionDate
+    from .notifications import notify_status_changes
+
+    changes = {}
+    with transaction.atomic():
+        for new_status, condition in competition_status_conditions(moment):
+            dates = CompetitionDate.objects.filter(condition)
+            if competition_ids is not None:
+                dates = dates.filter(competition_id__in=competition_ids)
+
+            ids = list(
+                Competition.objects.filter(
+                    id__in=dates.values('competition_id')
+                ).exclude(
+                    status__in=['pending', new_status]
+                ).select_for_update().values_list('id', flat=True)
+            )
+            if ids:
+                Competition.objects.filter(id__in=ids).update(status=new_status)
+            changes[new_status] = ids
+        notify_status_changes(changes)
+    return changes
+
+
+def tick_competition_statuses(now=None):
+    """
+    Проход планировщика статусов. Обрабатываются только соревнования, у которых
+    с прошлого прохода пересечена граница регистрации или проведения, и
+    подтверждённые соревнования со статусом не из вычисляемых (например, 'upcoming').
+    Первый проход обрабатывает все соревнования.
+    """
+    from .models import Competition, CompetitionDate, CompetitionStatusTick
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Блокировка записи не даёт двум планировщикам работать одновременно
+        tick, _ = CompetitionStatusTick.objects.select_for_update().get_or_create(pk=1)
+
+        competition_ids = None
+        if tick.last_tick is not None:
+            window = (tick.last_tick, now)
+            crossed = CompetitionDate.objects.filter(
+                Q(registration_start__range=window) |
+                Q(registration_end__range=window) |
+                Q(start_date__range=window) |
+                Q(end_date__range=window)
+            ).values_list('competition_id', flat=True)
+            stale = Competition.objects.filter(
+                dates__isnull=False
+            ).exclude(
+                status__in=COMPUTED_STATUSES + ['pending']
+            ).values_list('id', flat=True)
+            competition_ids = set(crossed) | set(stale)
+
+        if competition_ids is None or competition_ids:
+            changes = advance_competition_statuses(now, competition_ids)
+        else:
+            changes = {new_status: [] for new_status in COMPUTED_STATUSES}
+
+        tick.last_tick = now
+        tick.save(update_fields=['last_tick'])
+    return changes
+
+
+def compact_rating_snapshots(before, granularity='day'):
+    """
+    Прореживает историю рейтинга старше before: для каждого пользователя
+    остаётся последняя запись в каждом периоде (day/week/month).
+    Записи полных срезов (RatingCheckpoint) не удаляются.
+    Возвращает количество удалённых записей.
+    """
+    from django.db import connection
+    from .models import RatingCheckpoint, RatingSnapshot
+
+    if granularity not in ('day', 'week', 'month'):
+        raise ValueError(f"Неизвестный период: {granularity}")
+
+    table = RatingSnapshot._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {table} s
+            USING (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, date_trunc(%s, created_at)
+                    ORDER BY created_at DESC, id DESC
+                ) AS position
+                FROM {table}
+                WHERE created_at < %s
+            ) old
+            WHERE s.id = old.id AND old.position > 1
+              AND s.created_at NOT IN (SELECT taken_at FROM {RatingCheckpoint._meta.db_table})
+            """,
+            [granularity, before]
+        )
+        return cursor.rowcount
@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from .serializers import *
 from rest_framework.authtoken.models import Token 
-from datetime import datetime
+from datetime import datetime, timezone as dt_timezone
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .models import *
 from rest_framework.exceptions import PermissionDenied, ValidationError
@@ -14,13 +14,27 @@ from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 import logging
-from django.db.models import Count
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment, Border, Side
-from io import BytesIO
+from django.db.models import Count, Q
+from django.http import FileResponse
+import tempfile
+from .exports import (
+    CONTENT_TYPES, XLSX_CONTENT_TYPE, export_competitions, export_data_version,
+    export_filename, iter_export_rows, write_xlsx,
+)
+from .tasks import render_export
+import os
 from django.db.models import Exists, OuterRef
+from .authentication import profile_or_404
+from .enrollment import CompetitionFull, enroll_participants
+from .leaderboard import keyset_page
+from .notifications import (
+    notify_application_decision, notify_applications_approved, notify_competition_decision,
+    notify_invitation, notify_results,
+)
+from .stats import award_competition_points
+from .utils import (
+    place_score, add_rating_delta, enqueue_rating_deltas, advance_competition_statuses, latest_rating_snapshots,
+)
 logger = logging.getLogger(__name__)
 
 class UserApprovalView(APIView):
@@ -243,7 +257,7 @@ class CompetitionCreateView(APIView):
             
             # Получаем UserInfo текущего пользователя
             try:
-                user_info = UserInfo.objects.get(user=request.user)
+                user_info = request.user.info
             except UserInfo.DoesNotExist:
                 return Response(
                     {"error": "User profile not found"},
@@ -380,7 +394,10 @@ class InvitationCreateView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            invitation = serializer.save()
+            # Приглашение и уведомление о нём фиксируются вместе
+            with transaction.atomic():
+                invitation = serializer.save()
+                notify_invitation(invitation)
             return Response({
                 'id': invitation.id,
                 'team_id': invitation.team.id,
@@ -664,6 +681,7 @@ class ApplicationDecisionView(UpdateAPIView):
         
         return application
 
+    @transaction.atomic
     def perform_update(self, serializer):
         """Обрабатывает решение по заявке"""
         application = self.get_object()
@@ -671,24 +689,26 @@ class ApplicationDecisionView(UpdateAPIView):
         reason = serializer.validated_data.get('reason', '')
 
         if action == 'accept':
-            # Проверка лимита участников
-            if application.competition.participants.count() >= application.competition.max_participants:
+            # Добавление участника (лимит проверяется под блокировкой соревнования)
+            try:
+                enroll_participants(
+                    application.competition,
+                    [application.user_id],
+                    limit=application.competition.max_participants
+                )
+            except CompetitionFull:
                 raise ValidationError("Достигнуто максимальное количество участников")
-            
+
             # Принятие заявки
-            application.status = 'accepted'
+            application.status = 'approved'
             application.reason = None
-            # Добавление участника
-            CompetitionParticipant.objects.get_or_create(
-                competition=application.competition,
-                participant=application.user
-            )
         else:
             # Отклонение заявки
             application.status = 'rejected'
             application.reason = reason
         
         application.save()
+        notify_application_decision(application)
         
 class OrganizerUserApplicationsListView(ListAPIView):
     """
@@ -720,23 +740,234 @@ class OrganizerUserApplicationsListView(ListAPIView):
             status='pending'
         ).select_related('user', 'competition')  # Оптимизация запросов
 
-class UserListView(ListAPIView):
+
+class BulkApplicationApproveView(APIView):
     """
-    API для получения списка обычных пользователей (role_id=0)
+    API для массового одобрения заявок пользователей на соревнование
+    
+    Принимает:
+    - ids (опционально): список ID заявок; по умолчанию - все заявки
+      со статусом 'pending' на это соревнование
     
     Возвращает:
-    - Список пользователей с основной информацией
-    - Сортировка по ID
+    - approved: ID одобренных заявок
+    - enrolled: количество впервые зачисленных участников
+    
+    Особенности:
+    - Все заявки одобряются в одной транзакции: участники создаются одним
+      bulk_create, статусы заявок обновляются одним UPDATE
+    - Если участников стало бы больше max_participants, ничего не меняется
+    - Заявки не в статусе 'pending' и заявки на другие соревнования пропускаются
+    
+    Доступ:
+    - Организаторы соревнования и представители ФСП (role.id=2)
+    
+    Ошибки:
+    - 400: Некорректный список ID или превышение лимита участников
+    - 403: Недостаточно прав
+    """
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request, competition_id):
+        competition = get_object_or_404(Competition, pk=competition_id)
+        is_organizer = CompetitionOrganizer.objects.filter(
+            user=request.user.info,
+            competition=competition
+        ).exists()
+        if not is_organizer and request.user.info.role.id != 2:
+            return Response({'error': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
+
+        applications = UserApplication.objects.select_for_update().filter(
+            competition=competition,
+            status='pending'
+        )
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                return Response(
+                    {'error': "Параметр 'ids' должен быть списком ID заявок"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            applications = applications.filter(pk__in=ids)
+
+        rows = list(applications.order_by('id').values_list('id', 'user_id'))
+        try:
+            enrolled = enroll_participants(
+                competition,
+                [user_id for _, user_id in rows],
+                limit=competition.max_participants
+            )
+        except CompetitionFull:
+            return Response(
+                {'error': "Достигнуто максимальное количество участников"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        approved = [pk for pk, _ in rows]
+        UserApplication.objects.filter(pk__in=approved).update(status='approved', reason=None)
+        notify_applications_approved(competition, rows)
+        return Response({
+            'approved': approved,
+            'enrolled': len(enrolled)
+        }, status=status.HTTP_200_OK)
+
+class UserListView(APIView):
+    """
+    API для получения списка обычных пользователей (role_id=0, постранично)
+    
+    Параметры запроса:
+    - limit: размер страницы (по умолчанию 50, максимум 200)
+    - after: курсор "rating,id" из next_cursor предыдущей страницы
+    - search: поиск по фамилии, имени или никнейму
+    
+    Возвращает:
+    - results: пользователи по убыванию рейтинга
+    - next_cursor: курсор следующей страницы (null на последней)
     
     Доступ:
     - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        queryset = UserInfo.objects.filter(role_id=0).select_related('user')
+        search = request.query_params.get('search', '').strip()
+        if search:
+            queryset = queryset.filter(
+                Q(surname__icontains=search) | Q(name__icontains=search) | Q(user__nickName__icontains=search)
+            )
+        try:
+            rows, next_cursor = keyset_page(queryset, request, 'rating', 'id')
+        except ValueError:
+            return Response(
+                {"error": "Некорректные параметры limit/after"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'results': UserInfoSerializer(rows, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class LeaderboardView(APIView):
+    """
+    API общего рейтинга спортсменов (постранично)
     
-    Фильтрация:
-    - Только пользователи с role_id=0 (обычные пользователи)
+    Параметры запроса:
+    - limit: размер страницы (по умолчанию 50, максимум 200)
+    - after: курсор "rating,id" из next_cursor предыдущей страницы
+    
+    Возвращает:
+    - results: спортсмены по убыванию рейтинга с местом в общем и региональном рейтинге
+    - next_cursor: курсор следующей страницы (null на последней)
+    
+    Особенности:
+    - Данные из материализованного представления win_leaderboard
+      (обновляется после изменения рейтингов)
+    - Keyset-пагинация по (rating, id) без OFFSET
+    
+    Доступ:
+    - Без авторизации
     """
-    queryset = UserInfo.objects.filter(role_id=0).order_by('-rating')
-    serializer_class = UserInfoSerializer
     permission_classes = [AllowAny]
+
+    def get_queryset(self, **kwargs):
+        return Leaderboard.objects.select_related('user__user')
+
+    def get(self, request, **kwargs):
+        try:
+            rows, next_cursor = keyset_page(self.get_queryset(**kwargs), request, 'rating', 'user_id')
+        except ValueError:
+            return Response(
+                {"error": "Некорректные параметры limit/after"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'results': LeaderboardSerializer(rows, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class RegionLeaderboardView(LeaderboardView):
+    """
+    API рейтинга спортсменов региона (постранично)
+    
+    Параметры и формат ответа такие же, как у общего рейтинга;
+    место в регионе - поле region_rank.
+    
+    Доступ:
+    - Без авторизации
+    """
+    def get_queryset(self, region_id):
+        return super().get_queryset().filter(region_id=region_id)
+
+
+class DisciplineLeaderboardView(APIView):
+    """
+    API рейтинга по дисциплине (постранично)
+    
+    Параметры запроса:
+    - limit: размер страницы (по умолчанию 50, максимум 200)
+    - after: курсор "points_count,id" из next_cursor предыдущей страницы
+    
+    Возвращает:
+    - results: спортсмены по убыванию баллов в дисциплине
+    - next_cursor: курсор следующей страницы (null на последней)
+    
+    Доступ:
+    - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, discipline_id):
+        stats = UserDisciplineStats.objects.filter(
+            discipline_id=discipline_id
+        ).select_related('user__user')
+        try:
+            rows, next_cursor = keyset_page(stats, request, 'points_count', 'user_id')
+        except ValueError:
+            return Response(
+                {"error": "Некорректные параметры limit/after"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'results': DisciplineLeaderboardSerializer(rows, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class MyRankView(APIView):
+    """
+    API места текущего пользователя в рейтинге
+    
+    Возвращает:
+    - rating, rank: рейтинг и место в общем рейтинге
+    - region, region_rank: регион и место в региональном рейтинге
+    
+    Ошибки:
+    - 404: пользователь не участвует в рейтинге (не спортсмен или рейтинг ещё не обновлён)
+    
+    Доступ:
+    - Только авторизованные пользователи
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Поиск по уникальному индексу представления
+        entry = Leaderboard.objects.filter(user_id=request.user.info.id).first()
+        if entry is None:
+            return Response(
+                {"error": "Пользователь отсутствует в рейтинге"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({
+            'id': entry.user_id,
+            'rating': entry.rating,
+            'rank': entry.rank,
+            'region': entry.region_id,
+            'region_rank': entry.region_rank,
+        })
     
 
 class PublicTeamsView(APIView):
@@ -881,7 +1112,7 @@ class ResponseToPublicView(APIView):
     
     def post(self, request):
         try:
-            user_info = UserInfo.objects.get(user=request.user)
+            user_info = request.user.info
         except UserInfo.DoesNotExist:
             return Response(
                 {"detail": "Профиль пользователя не найден"},
@@ -951,21 +1182,24 @@ class ResponseActionView(APIView):
         action = serializer.validated_data['action']
         
         if action == 'accept':
-            # Проверяем, есть ли место в команде
-            if team.current_members >= team.max_members:
-                return Response(
-                    {"detail": "В команде нет свободных мест"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Добавляем пользователя в команду
-            team.members.add(response.user)
-            team.current_members = team.members.count()
-            team.save()
-            
-            # Обновляем статус заявки
-            response.status = VacancyResponse.ACCEPTED
-            response.save()
+            with transaction.atomic():
+                # Добавляем пользователя в команду (место проверяется атомарно)
+                try:
+                    team.admit(response.user)
+                except TeamFull:
+                    return Response(
+                        {"detail": "В команде нет свободных мест"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                except AlreadyTeamMember:
+                    return Response(
+                        {"detail": "Пользователь уже состоит в команде"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                # Обновляем статус заявки
+                response.status = VacancyResponse.ACCEPTED
+                response.save()
             
             return Response(
                 {"detail": "Заявка принята, пользователь добавлен в команду"},
@@ -1008,7 +1242,7 @@ class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         user = request.user  # Получаем объект пользователя, а не только ID
-        user_info = get_object_or_404(UserInfo, user=user)
+        user_info = profile_or_404(user)
         
         # Сериализуем данные пользователя
         user_serializer = UserUpdateSerializer(user)  # Теперь передаем объект пользователя
@@ -1042,7 +1276,7 @@ class UserProfileView(APIView):
     def patch(self, request):
         # Получаем текущего пользователя и его профиль
         user = request.user
-        user_info = get_object_or_404(UserInfo, user=user.id)
+        user_info = profile_or_404(user)
         
         # Сериализуем данные
         serializer = UserProfileUpdateSerializer(data=request.data)
@@ -1102,7 +1336,7 @@ class ParticipationHistoryView(APIView):
     
     def get(self, request):
         try:
-            user_info = UserInfo.objects.get(user=request.user.id)
+            user_info = request.user.info
         except UserInfo.DoesNotExist:
             return Response(
                 {"detail": "Профиль пользователя не найден"},
@@ -1147,7 +1381,7 @@ class OrganizedCompetitionsView(APIView):
     
     def get(self, request):
         # Получаем UserInfo текущего пользователя
-        user_info = get_object_or_404(UserInfo, user=request.user)
+        user_info = profile_or_404(request.user)
         
         # Получаем все соревнования где пользователь организатор
         organizers = CompetitionOrganizer.objects.filter(
@@ -1176,12 +1410,14 @@ class DistributeResultsView(APIView):
     1. Проверяет валидность данных
     2. Проверяет права доступа (организатор)
     3. Проверяет статус соревнования
-    4. Обновляет результаты участников в транзакции
-    5. Помечает соревнование как оцененное
+    4. Проверяет всех участников одним запросом (ошибки возвращаются по строкам)
+    5. Обновляет результаты через bulk_update в транзакции
+    6. Пересчитывает рейтинг затронутых пользователей один раз после commit
+    7. Помечает соревнование как оцененное
     
     Возвращает:
     - 200: при успешном обновлении
-    - 400: при ошибках валидации или неверном статусе
+    - 400: при ошибках валидации, неверном статусе или ошибках в строках results
     - 403: если пользователь не организатор
     - 404: если соревнование не найдено
     """
@@ -1207,7 +1443,7 @@ class DistributeResultsView(APIView):
             )
         
         # Проверяем что пользователь организатор этого соревнования
-        user_info = get_object_or_404(UserInfo, user=request.user)
+        user_info = profile_or_404(request.user)
         is_organizer = CompetitionOrganizer.objects.filter(
             user=user_info,
             competition=competition
@@ -1219,29 +1455,185 @@ class DistributeResultsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Обновляем результаты участников
-        for result_data in results_data:
-            participant = get_object_or_404(
-                CompetitionParticipant,
-                competition=competition,
-                participant_id=result_data['user']
+        # Проверяем всех участников одним запросом и собираем ошибки по строкам
+        participants = {}
+        for participant in CompetitionParticipant.objects.filter(
+            competition=competition,
+            participant_id__in=[row['user_id'] for row in results_data]
+        ):
+            participants.setdefault(participant.participant_id, []).append(participant)
+
+        errors = []
+        seen = set()
+        for index, row in enumerate(results_data):
+            if row['user_id'] in seen:
+                errors.append({'index': index, 'user_id': row['user_id'], 'error': 'Участник указан несколько раз'})
+            elif row['user_id'] not in participants:
+                errors.append({'index': index, 'user_id': row['user_id'], 'error': 'Участник не найден в соревновании'})
+            seen.add(row['user_id'])
+
+        if errors:
+            return Response(
+                {"detail": "Места не распределены: ошибки в результатах", "errors": errors},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            participant.result = result_data['result']
-            participant.save()
+        
+        # Записываем места одним bulk_update (без сигналов на каждую строку)
+        size = CompetitionParticipant.objects.filter(competition=competition).count()
+        deltas = {}
+        changed = []
+        for row in results_data:
+            for participant in participants[row['user_id']]:
+                add_rating_delta(
+                    deltas,
+                    participant.participant_id,
+                    place_score(size, row['result']) - place_score(size, participant.result)
+                )
+                participant.result = row['result']
+                changed.append(participant)
+        CompetitionParticipant.objects.bulk_update(changed, ['result'], batch_size=500)
+        
+        # Призовые баллы и статистика по дисциплине - одним проходом в той же транзакции
+        award_competition_points(competition)
+        
+        # Рейтинг пересчитывается очередью один раз на пользователя после фиксации транзакции
+        enqueue_rating_deltas(deltas)
+        
+        # Уведомления участникам о местах (outbox, в той же транзакции)
+        notify_results(competition, {row['user_id']: row['result'] for row in results_data})
         
         # Помечаем что организатор оценил соревнование
-        organizer = CompetitionOrganizer.objects.get(
+        CompetitionOrganizer.objects.filter(
             user=user_info,
             competition=competition
-        )
-        organizer.rated = True
-        organizer.save()
+        ).update(rated=True)
         
         return Response(
-            {"detail": "Места успешно распределены"},
+            {"detail": "Места успешно распределены", "updated": len(changed)},
             status=status.HTTP_200_OK
         )
         
+def parse_client_time(value):
+    """ISO 8601 -> datetime с часовым поясом (наивное время считается UTC)"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+
+class RatingHistoryView(APIView):
+    """
+    API истории рейтинга пользователя (для графиков)
+    
+    Параметры запроса (опционально):
+    - since, until: границы периода в ISO 8601
+    
+    Возвращает:
+    - user_id
+    - points: список {rating, created_at} по возрастанию времени
+    
+    Особенности:
+    - Чтение готовых снимков по индексу (user, created_at), без пересчёта истории
+    
+    Доступ:
+    - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, user_id):
+        snapshots = RatingSnapshot.objects.filter(user_id=user_id)
+        try:
+            if request.query_params.get('since'):
+                snapshots = snapshots.filter(created_at__gte=parse_client_time(request.query_params['since']))
+            if request.query_params.get('until'):
+                snapshots = snapshots.filter(created_at__lte=parse_client_time(request.query_params['until']))
+        except ValueError:
+            return Response(
+                {"error": "Неверный формат времени. Используйте ISO 8601 (например, 2025-03-02T21:00:00Z)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'user_id': user_id,
+            'points': [
+                {'rating': rating, 'created_at': created_at}
+                for rating, created_at in snapshots.order_by('created_at', 'id').values_list('rating', 'created_at')
+            ],
+        })
+
+
+class LeaderboardAtView(APIView):
+    """
+    API рейтинга спортсменов на момент времени (например, на конец сезона)
+    
+    Параметры запроса:
+    - time: момент времени в ISO 8601 (обязательный)
+    - limit, after: keyset-пагинация, как у общего рейтинга
+    
+    Возвращает:
+    - results: спортсмены по убыванию рейтинга на момент time
+    - next_cursor: курсор следующей страницы (null на последней)
+    
+    Особенности:
+    - Для каждого пользователя берётся последний снимок не позже time
+      (DISTINCT ON по индексу (user, created_at)) среди снимков начиная
+      с последнего полного среза рейтинга (RatingCheckpoint) не позже time
+    
+    Доступ:
+    - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            moment = parse_client_time(request.query_params.get('time', ''))
+        except ValueError:
+            return Response(
+                {"error": "Параметр 'time' обязателен в формате ISO 8601 (например, 2025-03-02T21:00:00Z)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        snapshots = RatingSnapshot.objects.filter(
+            id__in=latest_rating_snapshots(moment)
+        ).select_related('user__user')
+
+        try:
+            rows, next_cursor = keyset_page(snapshots, request, 'rating', 'user_id')
+        except ValueError:
+            return Response(
+                {"error": "Некорректные параметры limit/after"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'time': moment.isoformat(),
+            'results': RatingSnapshotLeaderboardSerializer(rows, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class UserDisciplineStatsView(APIView):
+    """
+    API статистики достижений пользователя по дисциплинам
+    
+    Возвращает:
+    - Для каждой дисциплины: дисциплину, количество соревнований и баллов
+    
+    Особенности:
+    - Статистика поддерживается инкрементально при изменении участий
+      и распределении мест (пересчёт: команда rebuild_discipline_stats)
+    
+    Доступ:
+    - Только авторизованные пользователи (своя статистика)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        stats = UserDisciplineStats.objects.filter(
+            user_id=request.user.info.id
+        ).select_related('discipline').order_by('-points_count', 'discipline_id')
+        return Response(UserDisciplineStatsSerializer(stats, many=True).data)
+
+
 class UserTeamsView(APIView):
     """
     API для получения списка команд пользователя
@@ -1262,7 +1654,7 @@ class UserTeamsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        user_info = get_object_or_404(UserInfo, user_id=request.user.id)
+        user_info = profile_or_404(request.user)
         
         teams = Team.objects.filter(
             members=user_info.user_id
@@ -1395,7 +1787,7 @@ class CompetitionDecisionView(APIView):
         
         # Проверяем что пользователь имеет право подтверждать соревнования
         try:
-            user_info = UserInfo.objects.get(user=request.user)
+            user_info = request.user.info
             if user_info.role.id != 2:  # Проверка что пользователь модератор
                 return Response(
                     {"detail": "Только представители ФСП могут подтверждать соревнования"},
@@ -1411,6 +1803,7 @@ class CompetitionDecisionView(APIView):
             # Обновляем статус соревнования
             competition.status = 'upcoming'
             competition.save()
+            notify_competition_decision(competition, action)
             
             return Response(
                 {"detail": "Соревнование подтверждено", "competition_id": competition.id},
@@ -1418,6 +1811,9 @@ class CompetitionDecisionView(APIView):
             )
         
         elif action == 'reject':
+            # Уведомляем организаторов до удаления записей о них
+            notify_competition_decision(competition, action)
+            
             # Удаляем записи организаторов
             CompetitionOrganizer.objects.filter(competition=competition).delete()
             
@@ -1512,36 +1908,41 @@ class CompetitionStatusView(APIView):
     API для обновления статусов соревнований на основе текущего времени
     
     Принимает:
-    - Временную метку в ISO 8601 формате (например, "2025-03-02T21:00:00Z")
+    - time: временная метка в ISO 8601 формате (например, "2025-03-02T21:00:00Z")
+    - verbose (опционально): вернуть полный список соревнований, как раньше
     
     Возвращает:
-    - Информацию о каждом соревновании:
-      * ID и название
-      * Старый и новый статус
-      * Флаг изменения статуса
+    - ID измененных соревнований по новым статусам и их количество
     - Общее количество обновленных соревнований
     - Временные метки клиента и сервера
+    - В режиме verbose: информацию о каждом соревновании
+      (ID, название, старый и новый статус, флаг изменения)
     
     Логика работы:
     1. Проверяет корректность переданного времени
-    2. Для каждого соревнования определяет актуальный статус:
+    2. Для каждого целевого статуса одним UPDATE по окнам CompetitionDate:
        - registration: если текущее время в периоде регистрации
        - running: если время проведения соревнования
        - finished: если время окончания прошло
        - waiting: если до начала регистрации
-    3. Обновляет статусы при необходимости
     
     Особенности:
     - Не изменяет статус 'pending' (ожидающие подтверждения)
-    - Использует оптимизированные запросы (select_related, only)
+    - Количество запросов не зависит от числа соревнований
     - Поддерживает временные зоны (UTC)
+    - В штатном режиме статусы обновляет планировщик
+      (команда tick_competition_statuses или задача Celery beat),
+      эндпоинт оставлен для ручного пересчёта
     
     Доступ:
-    - Без авторизации
+    - Только представители ФСП (role.id=2)
     """
-    permission_classes = [AllowAny]
+    permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        if request.user.info.role.id != 2:
+            return Response({'error': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
+        
         # Получаем время из запроса
         client_time_str = request.data.get('time')
         logger.debug(f"Received time: {client_time_str}")
@@ -1557,71 +1958,45 @@ class CompetitionStatusView(APIView):
             client_time = datetime.fromisoformat(client_time_str)
             # Если время наивное (без часового пояса), добавляем UTC
             if client_time.tzinfo is None:
-                client_time = timezone.make_aware(client_time, timezone.utc)
+                client_time = client_time.replace(tzinfo=dt_timezone.utc)
         except ValueError:
             return Response(
                 {"error": "Неверный формат времени. Используйте ISO 8601 (например, 2025-03-02T21:00:00Z)"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Получаем все соревнования с датами
-        competitions = Competition.objects.filter(
-            dates__isnull=False
-        ).select_related('dates').only(
-            'id', 'status', 'name', 'dates__start_date', 
-            'dates__end_date', 'dates__registration_start',
-            'dates__registration_end'
-        )
+        verbose = str(request.data.get('verbose', request.query_params.get('verbose', ''))).lower() in ('1', 'true')
         
-        updated_competitions = []
+        # Исходные статусы нужны только для подробного ответа
+        if verbose:
+            original = list(Competition.objects.filter(
+                dates__isnull=False
+            ).order_by('id').values_list('id', 'name', 'status'))
         
-        for comp in competitions:
-            original_status = comp.status
-            new_status = original_status
-            
-            # Если текущий статус pending - не меняем
-            if original_status == 'pending':
-                updated_competitions.append({
-                    'id': comp.id,
-                    'name': comp.name,
-                    'original_status': original_status,
-                    'new_status': new_status,
-                    'status_changed': False
-                })
-                continue
-            
-            dates = comp.dates
-            
-            # Определяем новый статус
-            if dates.registration_start <= client_time <= dates.registration_end:
-                new_status = 'registration'
-            elif dates.start_date <= client_time <= dates.end_date:
-                new_status = 'running'
-            elif client_time > dates.end_date:
-                new_status = 'finished'
-            else:
-                new_status = 'waiting'
-            
-            # Обновляем если статус изменился
-            status_changed = new_status != original_status
-            if status_changed:
-                comp.status = new_status
-                comp.save(update_fields=['status'])
-            
-            updated_competitions.append({
-                'id': comp.id,
-                'name': comp.name,
-                'original_status': original_status,
-                'new_status': new_status,
-                'status_changed': status_changed
-            })
+        changes = advance_competition_statuses(client_time)
         
-        return Response({
+        response_data = {
             'client_time': client_time_str,
             'server_time': timezone.now().isoformat(),
-            'competitions_updated': len([c for c in updated_competitions if c['status_changed']]),
-            'competitions': updated_competitions
-        })
+            'competitions_updated': sum(len(ids) for ids in changes.values()),
+            'changed': changes,
+            'counts': {new_status: len(ids) for new_status, ids in changes.items()},
+        }
+        
+        if verbose:
+            new_statuses = {comp_id: new_status for new_status, ids in changes.items() for comp_id in ids}
+            response_data['competitions'] = [
+                {
+                    'id': comp_id,
+                    'name': name,
+                    'original_status': original_status,
+                    'new_status': new_statuses.get(comp_id, original_status),
+                    'status_changed': comp_id in new_statuses
+                }
+                for comp_id, name, original_status in original
+            ]
+        
+        return Response(response_data)
         
 class UserVacancyResponsesView(APIView):
     """
@@ -1691,6 +2066,7 @@ class RegionCompetitionsView(APIView):
     - Принимает название региона в теле запроса
     - Находит соответствующий регион в базе данных
     - Фильтрует соревнования по наличию региона в permissions
+      (permissions @> '[region_id]', GIN-индекс jsonb_path_ops)
     - Исключает соревнования в статусах 'pending' и 'finished'
     - Использует оптимизированные запросы (select_related)
     
@@ -1732,7 +2108,7 @@ class RegionCompetitionsView(APIView):
         return Response({
             'region_id': region.id,
             'region_name': region.name,
-            'count': competitions.count(),
+            'count': len(serializer.data),
             'competitions': serializer.data
         })    
 
@@ -1752,7 +2128,8 @@ class CompetitionParticipantsStructuredExportAPI(APIView):
     Особенности:
     - Поддерживает экспорт как одного соревнования, так и всех соревнований
     - Форматирует данные с заголовками, стилями и границами
-    - Автоматически настраивает ширину столбцов
+    - Автоматически настраивает ширину столбцов (по данным, во время записи строк)
+    - Пишет книгу в write-only режиме во временный файл и отдаёт его потоково
     - Оптимизирует запросы к базе данных (select_related, prefetch_related)
     - Группирует участников по типу участия (индивидуальные/командные)
     
@@ -1768,10 +2145,7 @@ class CompetitionParticipantsStructuredExportAPI(APIView):
     def get(self, request, competition_id=None):
         try:
             # Получаем данные из базы
-            if competition_id:
-                competitions = Competition.objects.filter(pk=competition_id)
-            else:
-                competitions = Competition.objects.all().order_by('id')
+            competitions = export_competitions(competition_id)
             
             if not competitions.exists():
                 return Response(
@@ -1779,175 +2153,122 @@ class CompetitionParticipantsStructuredExportAPI(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Создаем Excel файл в памяти
-            output = BytesIO()
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Соревнования и участники"
-
-            # Стили для оформления
-            header_font = Font(bold=True, size=12)
-            comp_header_font = Font(bold=True, size=12, color='003366')
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            center_alignment = Alignment(horizontal='center', vertical='center')
-
-            # Начальная строка
-            current_row = 1
-
-            for comp in competitions:
-                # Заголовок соревнования
-                ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=9)
-                comp_title = f"Соревнование: {comp.name} (ID: {comp.id})"
-                ws.cell(row=current_row, column=1, value=comp_title).font = comp_header_font
-                current_row += 1
-
-                # Основная информация о соревновании
-                comp_data = [
-                    ["Тип", comp.get_type_display()],
-                    ["Формат", comp.get_competition_type_display()],
-                    ["Дисциплина", comp.discipline.name],
-                    ["Статус", comp.status],
-                    ["Макс. участников", comp.max_participants],
-                    ["Описание", comp.description[:200] + "..." if len(comp.description) > 200 else comp.description]
-                ]
-
-                # Добавляем даты, если они есть
-                try:
-                    comp_dates = CompetitionDate.objects.get(competition=comp)
-                    comp_data.extend([
-                        ["Даты проведения", f"{comp_dates.start_date.strftime('%d.%m.%Y %H:%M')} - {comp_dates.end_date.strftime('%d.%m.%Y %H:%M')}"],
-                        ["Даты регистрации", f"{comp_dates.registration_start.strftime('%d.%m.%Y %H:%M')} - {comp_dates.registration_end.strftime('%d.%m.%Y %H:%M')}"]
-                    ])
-                except CompetitionDate.DoesNotExist:
-                    pass
-
-                # Записываем данные о соревновании
-                for row_data in comp_data:
-                    ws.cell(row=current_row, column=1, value=row_data[0]).font = Font(bold=True)
-                    ws.cell(row=current_row, column=2, value=row_data[1])
-                    current_row += 1
-
-                current_row += 1  # Пустая строка после информации о соревновании
-
-                # Заголовки таблицы участников
-                headers = [
-                    "ID участника", "ФИО", "Никнейм", "Регион", 
-                    "Роль", "Рейтинг", "Место", "Результат", "Тип участия"
-                ]
-                
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws.cell(row=current_row, column=col_num, value=header)
-                    cell.font = header_font
-                    cell.border = border
-
-                current_row += 1
-
-                # Участники (индивидуальные)
-                participants = CompetitionParticipant.objects.filter(competition=comp).select_related(
-                    'participant', 'participant__user', 'participant__region', 'participant__role'
-                )
-                
-                for participant in participants:
-                    user_info = participant.participant
-                    result = CompetitionResult.objects.filter(
-                        competition=comp,
-                        participant=user_info
-                    ).first()
-                    
-                    participant_data = [
-                        user_info.user.id,
-                        f"{user_info.surname} {user_info.name} {user_info.patronymic or ''}".strip(),
-                        user_info.user.nickName,
-                        user_info.region.name,
-                        user_info.role.name,
-                        user_info.rating,
-                        result.place if result else "-",
-                        participant.result or "-",
-                        "Индивидуальный"
-                    ]
-                    
-                    for col_num, value in enumerate(participant_data, 1):
-                        cell = ws.cell(row=current_row, column=col_num, value=value)
-                        cell.border = border
-                    current_row += 1
-
-                # Команды
-                teams = Team.objects.filter(competition=comp).prefetch_related(
-                    'members', 'members__user', 'members__region', 'members__role'
-                )
-                
-                for team in teams:
-                    # Заголовок команды
-                    ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=len(headers))
-                    cell = ws.cell(row=current_row, column=1, value=f"Команда: {team.name} (Капитан: {team.captain.user.nickName if team.captain else 'не указан'})")
-                    cell.font = Font(bold=True, italic=True)
-                    current_row += 1
-
-                    for member in team.members.all():
-                        result = CompetitionResult.objects.filter(
-                            competition=comp,
-                            participant=member
-                        ).first()
-                        
-                        member_data = [
-                            member.user.id,
-                            f"{member.surname} {member.name} {member.patronymic or ''}".strip(),
-                            member.user.nickName,
-                            member.region.name,
-                            member.role.name,
-                            member.rating,
-                            result.place if result else "-",
-                            "-",  # Для командных результатов
-                            "Командный"
-                        ]
-                        
-                        for col_num, value in enumerate(member_data, 1):
-                            cell = ws.cell(row=current_row, column=col_num, value=value)
-                            cell.border = border
-                        current_row += 1
-
-                current_row += 3  # Отступ перед следующим соревнованием
-
-            # Настраиваем ширину столбцов (обход объединенных ячеек)
-            for col in range(1, 10):  # У нас 9 столбцов
-                max_length = 0
-                column_letter = get_column_letter(col)
-                
-                # Проверяем только необъединенные ячейки
-                for row in range(1, current_row + 1):
-                    try:
-                        cell = ws.cell(row=row, column=col)
-                        if cell.value and not isinstance(cell, ws.merged_cells):
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                    except:
-                        pass
-                
-                adjusted_width = (max_length + 2) * 1.2
-                ws.column_dimensions[column_letter].width = adjusted_width
-
-            # Сохраняем файл
-            wb.save(output)
+            # Пишем книгу во временный файл и отдаём его потоково
+            output = tempfile.TemporaryFile()
+            write_xlsx(iter_export_rows(competitions), output)
             output.seek(0)
 
-            # Настраиваем HTTP ответ
-            response = HttpResponse(
-                output.getvalue(),
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            return FileResponse(
+                output,
+                as_attachment=True,
+                filename=export_filename(competition_id),
+                content_type=XLSX_CONTENT_TYPE
             )
             
-            filename = 'structured_competitions_participants.xlsx' if not competition_id else f'structured_competition_{competition_id}_participants.xlsx'
-            response['Content-Disposition'] = f'attachment; filename={filename}'
-            
-            return response
-            
         except Exception as e:
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class ExportJobCreateView(APIView):
+    """
+    API для постановки фоновой выгрузки соревнований и участников
+    
+    Параметры запроса:
+    - competition_id (опциональный): ID соревнования
+    - format (опциональный): xlsx (по умолчанию) или csv
+    
+    Логика работы:
+    - Если для тех же параметров уже есть готовый файл и данные с тех пор
+      не менялись, возвращается существующая выгрузка (200)
+    - Если такая же выгрузка уже в очереди, возвращается она (202)
+    - Иначе создается новая задача для фонового воркера (202)
+    
+    Доступ:
+    - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = ExportJobCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        competition_id = serializer.validated_data.get('competition_id') or None
+        file_format = serializer.validated_data['format']
+        data_version = export_data_version()
+
+        existing = ExportJob.objects.filter(
+            competition_id=competition_id,
+            file_format=file_format,
+            data_version=data_version,
+            status__in=[ExportJob.PENDING, ExportJob.RUNNING, ExportJob.DONE]
+        ).order_by('-id').first()
+
+        if existing and existing.status == ExportJob.DONE and os.path.exists(existing.file_path):
+            return Response(ExportJobSerializer(existing).data, status=status.HTTP_200_OK)
+        if existing and existing.status != ExportJob.DONE:
+            return Response(ExportJobSerializer(existing).data, status=status.HTTP_202_ACCEPTED)
+
+        job = ExportJob.objects.create(
+            competition_id=competition_id,
+            file_format=file_format,
+            data_version=data_version
+        )
+        transaction.on_commit(lambda: render_export.delay(job.id))
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetailView(APIView):
+    """
+    API для получения состояния фоновой выгрузки
+    
+    Возвращает:
+    - 200: состояние задачи (status: pending/running/done/failed)
+    - 404: если задача не найдена
+    
+    Доступ:
+    - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk)
+        return Response(ExportJobSerializer(job).data)
+
+
+class ExportJobDownloadView(APIView):
+    """
+    API для скачивания готового файла фоновой выгрузки
+    
+    Возвращает:
+    - 200: файл выгрузки (потоково)
+    - 404: если задача не найдена или файл удален
+    - 409: если выгрузка еще не готова
+    
+    Доступ:
+    - Без авторизации
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk)
+        if job.status != ExportJob.DONE:
+            return Response(
+                {"error": "Выгрузка еще не готова", "status": job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        if not os.path.exists(job.file_path):
+            return Response(
+                {"error": "Файл выгрузки не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return FileResponse(
+            open(job.file_path, 'rb'),
+            as_attachment=True,
+            filename=export_filename(job.competition_id, job.file_format),
+            content_type=CONTENT_TYPES[job.file_format]
+        )